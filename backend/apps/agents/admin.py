@@ -2,7 +2,7 @@
 Django admin interface for Agent models.
 """
 from django.contrib import admin
-from .models import Agent, AgentRun
+from .models import Agent, AgentRun, BatchJob
 
 @admin.register(Agent)
 class AgentAdmin(admin.ModelAdmin):
@@ -23,6 +23,7 @@ class AgentAdmin(admin.ModelAdmin):
                 'max_tokens',
                 'stop_sequences',
                 'weight',
+                'cache_prompt_prefix',
                 'is_active'
             )
         }),
@@ -36,11 +37,12 @@ class AgentAdmin(admin.ModelAdmin):
 class AgentRunAdmin(admin.ModelAdmin):
     list_display = ('id', 'agent', 'session_id', 'started_at', 'completed_at')
     list_filter = ('agent', 'started_at')
-    search_fields = ('session_id', 'error')
+    search_fields = ('session_id', 'request_id', 'error')
     readonly_fields = (
         'id',
         'agent',
         'session_id',
+        'request_id',
         'request_data',
         'response_data',
         'error',
@@ -50,3 +52,22 @@ class AgentRunAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return False  # AgentRun objects should only be created programmatically
+
+@admin.register(BatchJob)
+class BatchJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'llm_model', 'provider_batch_id', 'status', 'request_count', 'submitted_at', 'completed_at')
+    list_filter = ('status', 'llm_model')
+    search_fields = ('provider_batch_id', 'error')
+    readonly_fields = (
+        'id',
+        'llm_model',
+        'provider_batch_id',
+        'status',
+        'request_count',
+        'error',
+        'submitted_at',
+        'completed_at'
+    )
+    
+    def has_add_permission(self, request):
+        return False  # Batch jobs are submitted programmatically
@@ -0,0 +1,240 @@
+"""
+asyncio judgement service for interactive requests.
+
+The service subscribes to the gateway request channels itself and runs every
+agent of a judgement as a coroutine in one event loop, streaming LLM output
+straight back to the gateway. It skips the Celery broker and the per-task
+event loop of the ``tasks.process_request`` path. Agent configuration is read
+from a snapshot refreshed in the background, so requests never wait on the
+database. Celery keeps handling batch and background work.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.db import connection
+
+from apps.llm_providers.models import LLMModel
+from tasks.agent_dispatcher import agent_message, judge_with_agent, redis_client
+from utils.deadlines import DEADLINE_FIELD, expired, shed
+from utils.stream_protocol import stream_ids, stream_open
+from utils.tracing import span
+from utils.voting import JudgementQuorum
+from .models import Agent
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_PATTERN = "gateway:requests:*"
+
+
+class ConfigSnapshot:
+    """
+    Read-only copy of the agents, their LLM models and providers, and the
+    equivalent models of each, loaded with two queries.
+    """
+
+    def __init__(self, agents: Dict[str, Agent], alternates: Dict[str, List[LLMModel]]):
+        self.agents = agents
+        self.alternates = alternates
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls) -> 'ConfigSnapshot':
+        try:
+            agents = {
+                str(agent.id): agent
+                for agent in Agent.objects.select_related('llm_model__provider')
+            }
+            # Same ordering as LLMModel.equivalents()
+            models_by_name = defaultdict(list)
+            for llm_model in LLMModel.objects.filter(
+                is_active=True, is_degraded=False, provider__is_active=True
+            ).select_related(
+                'provider'
+            ).order_by('-provider__priority', '-created_at'):
+                models_by_name[llm_model.model_name].append(llm_model)
+            alternates = {
+                str(agent.llm_model_id): [
+                    llm_model for llm_model in models_by_name[agent.llm_model.model_name]
+                    if llm_model.id != agent.llm_model_id
+                ]
+                for agent in agents.values()
+            }
+            return cls(agents, alternates)
+        finally:
+            # Loaded from a worker thread, whose connection would otherwise stay open
+            connection.close()
+
+    def active_agents(self) -> List[Agent]:
+        return [agent for agent in self.agents.values() if agent.is_active]
+
+
+class JudgementService:
+    """
+    Consume gateway requests and judge them in-process.
+
+    Args:
+        snapshot_ttl: Seconds between reloads of the configuration snapshot
+        max_requests: Maximum requests handled at once
+    """
+
+    def __init__(self, snapshot_ttl: float, max_requests: int):
+        self.snapshot_ttl = snapshot_ttl
+        self.slots = asyncio.Semaphore(max_requests)
+        self.snapshot: Optional[ConfigSnapshot] = None
+        self.in_flight = set()
+        self.client = aioredis.Redis(
+            host=settings.GATEWAY_REDIS_HOST,
+            port=int(settings.GATEWAY_REDIS_PORT),
+            db=int(settings.GATEWAY_REDIS_DB)
+        )
+
+    async def refresh_snapshot(self) -> None:
+        self.snapshot = await asyncio.to_thread(ConfigSnapshot.load)
+        logger.debug(f"Loaded configuration snapshot with {len(self.snapshot.agents)} agents")
+
+    async def refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_ttl)
+            try:
+                await self.refresh_snapshot()
+            except Exception as e:
+                # Keep serving from the previous snapshot
+                logger.error(f"Error refreshing configuration snapshot: {str(e)}")
+
+    async def run(self, drain_timeout: float = 30) -> None:
+        """Serve until cancelled, then give in-flight requests ``drain_timeout`` seconds to finish."""
+        await self.refresh_snapshot()
+        refresher = asyncio.create_task(self.refresh_periodically())
+        pubsub = self.client.pubsub()
+        await pubsub.psubscribe(REQUESTS_PATTERN)
+        logger.info(f"Judgement service subscribed to {REQUESTS_PATTERN}")
+        try:
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                session_id = message['channel'].decode().split(':')[-1]
+                try:
+                    data = json.loads(message['data'])
+                except json.JSONDecodeError as e:
+                    logger.error(f"Failed to decode message: {e}")
+                    continue
+                # Stop reading requests while every slot is busy
+                await self.slots.acquire()
+                task = asyncio.create_task(self.handle(session_id, data))
+                self.in_flight.add(task)
+                task.add_done_callback(self.in_flight.discard)
+        finally:
+            refresher.cancel()
+            await pubsub.punsubscribe()
+            await pubsub.close()
+            if self.in_flight:
+                logger.info(f"Waiting for {len(self.in_flight)} requests to finish")
+                await asyncio.wait(self.in_flight, timeout=drain_timeout)
+            await self.client.close()
+
+    async def handle(self, session_id: str, message: Dict) -> None:
+        channel = f"gateway:responses:{session_id}"
+
+        async def publish(response: Union[Dict, str]):
+            await self.client.publish(channel, response if isinstance(response, str) else json.dumps(response))
+
+        try:
+            with span('judgement_service.handle', message.get('traceparent'), type=message.get('type')):
+                if message.get('type') == 'get_voters':
+                    await publish(self.voters_response(session_id, message))
+                else:
+                    await self.judge(session_id, message, publish)
+        except Exception as e:
+            logger.error(f"Error processing request for session {session_id}: {str(e)}")
+            await publish({
+                "type": "response",
+                "response_type": message.get('type', 'unknown'),
+                "session_id": session_id,
+                "status": "error",
+                "error": str(e),
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        finally:
+            self.slots.release()
+
+    def voters_response(self, session_id: str, message: Dict) -> Dict:
+        if not message.get('user_input', ''):
+            raise ValueError("Missing user_input for get_voters request")
+        return {
+            "type": "get_voters_response",
+            "session_id": session_id,
+            "request_id": message.get('request_id', ''),
+            "status": "success",
+            "voters": [
+                {
+                    "agent_id": str(agent.id),
+                    "name": agent.name,
+                    "description": agent.description
+                }
+                for agent in self.snapshot.active_agents()
+            ],
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    async def judge(self, session_id: str, message: Dict, publish) -> None:
+        request_id = message.get('request_id')
+        agents_data = message.get('agents', [])
+        if not agents_data:
+            raise ValueError("No agents provided in message")
+
+        # Drop requests that waited for a free slot past their client's deadline
+        deadline = message.get(DEADLINE_FIELD)
+        if expired(deadline):
+            await asyncio.to_thread(shed, 'dispatch', session_id, request_id, deadline)
+            await publish({
+                "type": "agent_judgement_response",
+                "session_id": session_id,
+                "request_id": request_id,
+                "status": "expired",
+                "timestamp": datetime.utcnow().isoformat()
+            })
+            return
+
+        snapshot = self.snapshot
+        agents = []
+        for agent_data in agents_data:
+            agent_id = agent_data.get('agent_id')
+            if not agent_id:
+                continue
+            agent = snapshot.agents.get(agent_id)
+            if agent is None:
+                await publish(agent_message(
+                    session_id, request_id, agent_id, "error", error=f"Agent {agent_id} not found in database"
+                ))
+                continue
+            agents.append(agent)
+        if not agents:
+            raise ValueError("No valid agents provided in message")
+
+        # Open the weighted tally so agents can stop as soon as the verdict is fixed
+        quorum = JudgementQuorum(redis_client, session_id, request_id, ttl=settings.JUDGEMENT_QUORUM_TTL)
+        # Every Redis call on this path leaves the event loop, see judge_with_agent
+        await asyncio.to_thread(quorum.open, sum(agent.weight for agent in agents))
+
+        # Declare the delta streams before any agent starts streaming
+        streams = await asyncio.to_thread(
+            stream_ids, redis_client, session_id, message, [str(agent.id) for agent in agents]
+        ) or {}
+        if streams:
+            await publish(stream_open(session_id, request_id, streams))
+
+        # Errors are published to the gateway by judge_with_agent itself
+        await asyncio.gather(*(
+            judge_with_agent(
+                agent, snapshot.alternates[str(agent.llm_model_id)], session_id, request_id,
+                message.get('request', ''), publish, streams.get(str(agent.id)), deadline=deadline
+            )
+            for agent in agents
+        ), return_exceptions=True)
@@ -0,0 +1,219 @@
+"""
+Django management command to run judgements offline over a JSONL dataset.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.agents.models import Agent
+from llm.providers import closing_http_clients
+from llm.watchdog import idle_watchdog
+from tasks.agent_dispatcher import build_llm_client
+from utils.rate_limiter import estimate_tokens, rate_limiter
+from utils.voting import NEGATIVE, POSITIVE, decide, parse_decision
+
+
+class Command(BaseCommand):
+    help = 'Run judgements for every request in a JSONL file without going through the gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='JSONL file with one request per line')
+        parser.add_argument('--output', help='JSONL file for results (default: <input>.results.jsonl)')
+        parser.add_argument('--agents', help='Comma separated agent ids (default: all active agents)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Maximum requests judged at once')
+        parser.add_argument('--no-early-quorum', action='store_true',
+                            help='Run every agent to completion even once the verdict is fixed')
+        parser.add_argument('--batch', action='store_true',
+                            help='Submit provider batch jobs instead of judging live; results arrive as AgentRun rows')
+
+    def read_requests(self, path: str):
+        """
+        Yield (request_id, request text) for every line of the input file.
+        Lines that are not a JSON object are reported, counted and skipped.
+        """
+        self.malformed_lines = 0
+        with open(path) as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                    if not isinstance(data, dict):
+                        raise ValueError("not a JSON object")
+                except ValueError as e:
+                    self.malformed_lines += 1
+                    self.stderr.write(f"Skipping malformed line {line_number}: {str(e)}")
+                    continue
+                request_id = str(data.get('request_id') or line_number)
+                text = data.get('request') or data.get('user_request') or data.get('body') or ''
+                yield request_id, text
+
+    @staticmethod
+    def completed_requests(path: str) -> Set[str]:
+        """Request ids already written to the output file, used to resume a run."""
+        done = set()
+        if not os.path.exists(path):
+            return done
+        with open(path) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['request_id'])
+                except (ValueError, KeyError):
+                    # A partially written last line is simply judged again
+                    continue
+        return done
+
+    def load_agents(self, agent_ids: Optional[str]) -> List[Agent]:
+        queryset = Agent.objects.select_related('llm_model__provider')
+        if agent_ids:
+            ids = [agent_id.strip() for agent_id in agent_ids.split(',') if agent_id.strip()]
+            agents = list(queryset.filter(id__in=ids))
+            missing = set(ids) - {str(agent.id) for agent in agents}
+            if missing:
+                raise CommandError(f"Agents not found: {', '.join(sorted(missing))}")
+            return agents
+        return list(queryset.filter(is_active=True))
+
+    async def run_agent(self, agent: Agent, user_request: str) -> Dict[str, Any]:
+        """Run one agent on one request within the provider limits."""
+        started = time.monotonic()
+        system_prompt, user_prompt = agent.build_prompts(user_request)
+        llm_model = agent.llm_model
+        llm_params = agent.get_llm_parameters()
+        result = {'agent_id': str(agent.id), 'name': agent.name}
+        try:
+            estimated_tokens = estimate_tokens(system_prompt, user_prompt, max_tokens=llm_params.get('max_tokens'))
+            async with rate_limiter.slot(llm_model, estimated_tokens) as lease:
+                llm_client = build_llm_client(llm_model, llm_params)
+                stream = llm_client.stream_chat(system_prompt=system_prompt, user_prompt=user_prompt, **llm_params)
+                chunks = [chunk async for chunk in idle_watchdog(stream, llm_model.get_stream_idle_timeout())]
+                usage = llm_client.usage
+                if usage:
+                    lease.actual_tokens = usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
+            text = ''.join(chunks)
+            result.update(status='completed', decision=parse_decision(text), response=text, usage=usage)
+        except Exception as e:
+            result.update(status='error', decision=NEGATIVE, error=str(e))
+        result['duration'] = round(time.monotonic() - started, 3)
+        return result
+
+    async def judge(self, request_id: str, user_request: str, agents: List[Agent], early_quorum: bool) -> Dict[str, Any]:
+        """Run every agent on a request, stopping the rest once the verdict is fixed."""
+        weights = {str(agent.id): agent.weight for agent in agents}
+        total_weight = sum(weights.values())
+        tasks = {asyncio.ensure_future(self.run_agent(agent, user_request)): agent for agent in agents}
+        results, tally, verdict = [], {}, None
+        try:
+            for next_result in asyncio.as_completed(list(tasks)):
+                result = await next_result
+                results.append(result)
+                tally[result['decision']] = tally.get(result['decision'], 0.0) + weights[result['agent_id']]
+                verdict = decide(tally, total_weight)
+                if verdict and early_quorum:
+                    break
+        finally:
+            for task, agent in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    results.append({'agent_id': str(agent.id), 'name': agent.name, 'status': 'cancelled'})
+        return {
+            'request_id': request_id,
+            'verdict': verdict,
+            'accepted': verdict == POSITIVE,
+            'vote_distribution': tally,
+            'agents': results,
+        }
+
+    async def run(self, input_path: str, output_path: str, agents: List[Agent], concurrency: int, early_quorum: bool):
+        done = self.completed_requests(output_path)
+        if done:
+            self.stdout.write(f"Resuming: {len(done)} requests already judged in {output_path}")
+
+        semaphore = asyncio.Semaphore(concurrency)
+        pending = set()
+        stats = {'judged': 0, 'errors': 0}
+        started = time.monotonic()
+
+        with open(output_path, 'a') as output:
+            async def judge_and_write(request_id, user_request):
+                try:
+                    result = await self.judge(request_id, user_request, agents, early_quorum)
+                    stats['errors'] += sum(1 for agent in result['agents'] if agent['status'] == 'error')
+                    # Each line is flushed as soon as its request is judged, so it doubles as the checkpoint
+                    output.write(json.dumps(result) + '\n')
+                    output.flush()
+                    stats['judged'] += 1
+                    if stats['judged'] % 100 == 0:
+                        rate = stats['judged'] * len(agents) * 3600 / (time.monotonic() - started)
+                        self.stdout.write(f"Judged {stats['judged']} requests ({rate:.0f} evaluations/hour)")
+                finally:
+                    semaphore.release()
+
+            for request_id, user_request in self.read_requests(input_path):
+                if request_id in done:
+                    continue
+                if not user_request:
+                    self.stdout.write(self.style.WARNING(f"Skipping {request_id}: empty request"))
+                    continue
+                # Bound the number of requests in flight, and so the memory used
+                await semaphore.acquire()
+                task = asyncio.ensure_future(judge_and_write(request_id, user_request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending)
+        return stats
+
+    def submit_batch(self, input_path: str, agents: List[Agent]):
+        from tasks.batch_tasks import submit_batch_judgement
+
+        requests = [(request_id, text) for request_id, text in self.read_requests(input_path) if text]
+        session_id = str(uuid.uuid4())
+        jobs = submit_batch_judgement(requests, agents, session_id=session_id)
+        self.stdout.write(self.style.SUCCESS(
+            f"Submitted {len(requests)} requests in {len(jobs)} batch jobs for session {session_id}"
+        ))
+        if self.malformed_lines:
+            self.stdout.write(self.style.WARNING(f"Malformed lines skipped: {self.malformed_lines}"))
+        for job in jobs:
+            self.stdout.write(f"{job.id}: {job.llm_model} ({job.request_count} prompts, batch {job.provider_batch_id})")
+
+    def handle(self, *args, **options):
+        input_path = options['input']
+        if not os.path.exists(input_path):
+            raise CommandError(f"Input file {input_path} does not exist")
+        output_path = options['output'] or f"{input_path}.results.jsonl"
+
+        agents = self.load_agents(options['agents'])
+        if not agents:
+            raise CommandError("No agents to run")
+        if options['batch']:
+            return self.submit_batch(input_path, agents)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Judging {input_path} with {len(agents)} agents, concurrency {options['concurrency']}"
+        ))
+
+        started = time.monotonic()
+        stats = asyncio.run(closing_http_clients(self.run(
+            input_path,
+            output_path,
+            agents,
+            options['concurrency'],
+            early_quorum=not options['no_early_quorum']
+        )))
+        duration = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS("Bulk judgement summary:"))
+        self.stdout.write(f"Requests judged: {stats['judged']}")
+        self.stdout.write(f"Agent errors: {stats['errors']}")
+        self.stdout.write(f"Malformed lines skipped: {self.malformed_lines}")
+        self.stdout.write(f"Duration: {duration:.1f}s")
+        self.stdout.write(f"Results written to {output_path}")
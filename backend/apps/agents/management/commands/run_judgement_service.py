@@ -0,0 +1,42 @@
+"""
+Django management command to run the asyncio judgement service.
+"""
+import asyncio
+import logging
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.agents.judgement_service import JudgementService
+from llm.providers import closing_http_clients
+
+
+class Command(BaseCommand):
+    help = ('Serve interactive gateway requests in-process, without Celery. '
+            'Replaces run_gateway_consumer, the two must not run side by side.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot-ttl', type=float, default=30,
+                            help='Seconds between reloads of the agent configuration')
+        parser.add_argument('--max-requests', type=int, default=256, help='Maximum requests handled at once')
+        parser.add_argument('--drain-timeout', type=float, default=30,
+                            help='Seconds to let in-flight requests finish on shutdown')
+
+    def handle(self, *args, **options):
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s [%(levelname)s] %(message)s',
+        )
+        asyncio.run(closing_http_clients(self.serve(options)))
+        self.stdout.write(self.style.SUCCESS('Judgement service stopped'))
+
+    async def serve(self, options):
+        service = JudgementService(options['snapshot_ttl'], options['max_requests'])
+        main = asyncio.create_task(service.run(options['drain_timeout']))
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, main.cancel)
+        try:
+            await main
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-19 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agent",
+            name="cache_prompt_prefix",
+            field=models.BooleanField(
+                default=False,
+                help_text="Place all static prompt text first as a stable prefix and mark it cacheable",
+            ),
+        ),
+    ]
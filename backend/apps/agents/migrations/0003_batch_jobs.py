@@ -0,0 +1,76 @@
+# Generated by Django 5.0.1 on 2026-10-19 07:59
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0002_cache_prompt_prefix"),
+        ("llm_providers", "0003_stream_idle_timeout"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BatchJob",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("provider_batch_id", models.CharField(max_length=255)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("submitted", "Submitted"),
+                            ("collecting", "Collecting"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                            ("expired", "Expired"),
+                            ("cancelled", "Cancelled"),
+                        ],
+                        default="submitted",
+                        max_length=20,
+                    ),
+                ),
+                ("request_count", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("submitted_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(null=True)),
+                (
+                    "llm_model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="batch_jobs",
+                        to="llm_providers.llmmodel",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-submitted_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="agentrun",
+            name="batch_job",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="runs",
+                to="agents.batchjob",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="batchjob",
+            index=models.Index(fields=["status"], name="agents_batc_status_0e76db_idx"),
+        ),
+    ]
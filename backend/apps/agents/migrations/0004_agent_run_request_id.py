@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0003_batch_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agentrun",
+            name="request_id",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name="agentrun",
+            name="started_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="agentrun",
+            index=models.Index(
+                fields=["request_id"], name="agents_agen_request_a25af5_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+# The conversion is written out here rather than imported from
+# apps.agents.partitions, so later changes to the maintenance code cannot
+# change what this migration did
+TABLE = "agents_agentrun"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def _period_start(day, period):
+    return day if period == "day" else day.replace(day=1)
+
+
+def _next_period(start, period):
+    if period == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _partition_name(start, period):
+    return f"{TABLE}_p{start:%Y_%m_%d}" if period == "day" else f"{TABLE}_p{start:%Y_%m}"
+
+
+def _add_relations(schema_editor, cursor, model):
+    for column, target in (("agent_id", "agents_agent"), ("batch_job_id", "agents_batchjob")):
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_{column}_fk" '
+            f"FOREIGN KEY ({column}) REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(f'CREATE INDEX "{TABLE}_{column}_idx" ON "{TABLE}" ({column})')
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+def partition(apps, schema_editor):
+    # Native range partitioning is only available on Postgres
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    model = apps.get_model("agents", "AgentRun")
+    period = settings.AGENT_RUN_PARTITION_PERIOD
+    new_table = f"{TABLE}_partitioned"
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE "{new_table}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f"PARTITION BY RANGE (started_at)"
+        )
+        # The partition key has to be part of every unique constraint
+        cursor.execute(f'ALTER TABLE "{new_table}" ADD PRIMARY KEY (id, started_at)')
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}_new" PARTITION OF "{new_table}" DEFAULT')
+
+        cursor.execute(f'SELECT MIN(started_at) FROM "{TABLE}"')
+        oldest = cursor.fetchone()[0]
+        today = timezone.now().date()
+        start = _period_start(oldest.date() if oldest else today, period)
+        last = _period_start(today, period)
+        for _ in range(settings.AGENT_RUN_PARTITIONS_AHEAD):
+            last = _next_period(last, period)
+        while start <= last:
+            end = _next_period(start, period)
+            cursor.execute(
+                f'CREATE TABLE "{_partition_name(start, period)}" PARTITION OF "{new_table}" '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            start = end
+
+        cursor.execute(f'INSERT INTO "{new_table}" SELECT * FROM "{TABLE}"')
+        cursor.execute(f'DROP TABLE "{TABLE}"')
+        cursor.execute(f'ALTER TABLE "{new_table}" RENAME TO "{TABLE}"')
+        cursor.execute(f'ALTER TABLE "{DEFAULT_PARTITION}_new" RENAME TO "{DEFAULT_PARTITION}"')
+        _add_relations(schema_editor, cursor, model)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    model = apps.get_model("agents", "AgentRun")
+    plain_table = f"{TABLE}_plain"
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE "{plain_table}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(f'INSERT INTO "{plain_table}" SELECT * FROM "{TABLE}"')
+        cursor.execute(f'DROP TABLE "{TABLE}" CASCADE')
+        cursor.execute(f'ALTER TABLE "{plain_table}" RENAME TO "{TABLE}"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id)')
+        _add_relations(schema_editor, cursor, model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0004_agent_run_request_id"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0005_partition_agent_runs"),
+        ("llm_providers", "0003_stream_idle_timeout"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("value", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AgentStatsRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=10
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("runs", models.PositiveIntegerField(default=0)),
+                ("errors", models.PositiveIntegerField(default=0)),
+                ("cancelled", models.PositiveIntegerField(default=0)),
+                ("positive", models.PositiveIntegerField(default=0)),
+                ("negative", models.PositiveIntegerField(default=0)),
+                ("agreements", models.PositiveIntegerField(default=0)),
+                ("latency_sum", models.FloatField(default=0.0)),
+                ("latency_max", models.FloatField(default=0.0)),
+                ("input_tokens", models.BigIntegerField(default=0)),
+                ("cached_input_tokens", models.BigIntegerField(default=0)),
+                ("output_tokens", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "agent",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats_rollups",
+                        to="agents.agent",
+                    ),
+                ),
+                (
+                    "llm_model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats_rollups",
+                        to="llm_providers.llmmodel",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-bucket_start"],
+                "indexes": [
+                    models.Index(
+                        fields=["period", "bucket_start"],
+                        name="agents_agen_period_c51b5e_idx",
+                    )
+                ],
+                "unique_together": {("agent", "llm_model", "period", "bucket_start")},
+            },
+        ),
+    ]
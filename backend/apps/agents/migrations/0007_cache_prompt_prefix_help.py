@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0006_agent_stats_rollups"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="agent",
+            name="cache_prompt_prefix",
+            field=models.BooleanField(
+                default=False,
+                help_text="Move static text after the request into the system prompt, keeping the prompt prefix stable",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0007_cache_prompt_prefix_help"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="agentrun",
+            name="session_id",
+            field=models.CharField(max_length=255),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0008_agent_run_session_id_char"),
+        ("llm_providers", "0004_health_probes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="agentstatsrollup",
+            name="agents_agen_period_c51b5e_idx",
+        ),
+        migrations.AddIndex(
+            model_name="agentrun",
+            index=models.Index(
+                fields=["-started_at", "-id"], name="agents_agen_started_5e127b_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="agentstatsrollup",
+            index=models.Index(
+                fields=["period", "-bucket_start", "-id"],
+                name="agents_agen_period_5472ad_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agents", "0009_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchjob",
+            name="published_runs",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
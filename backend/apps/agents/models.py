@@ -2,7 +2,11 @@
 Agent models for the MAGI system.
 """
 from django.db import models
+from django.utils import timezone
 import uuid
+from collections import defaultdict
+from string import Formatter
+from typing import Tuple
 from django.contrib.postgres.fields import JSONField
 from apps.llm_providers.models import LLMModel
 
@@ -47,6 +51,10 @@ class Agent(models.Model):
         default=1.0,
         help_text="Weight for this agent's vote in the final decision"
     )
+    cache_prompt_prefix = models.BooleanField(
+        default=False,
+        help_text="Move static text after the request into the system prompt, keeping the prompt prefix stable"
+    )
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -75,6 +83,40 @@ class Agent(models.Model):
             user_request=user_request
         )
     
+    def build_prompts(self, user_request: str) -> Tuple[str, str]:
+        """
+        Build the system and user prompts for a request.
+        
+        With ``cache_prompt_prefix`` enabled, the static instructions that
+        follow the last placeholder of the user prompt template are moved to
+        the end of the system prompt. Everything before the request text is
+        then identical between judgements, so providers can reuse the cached
+        prefix instead of processing it again.
+        
+        Args:
+            user_request: The raw user request
+            
+        Returns:
+            Tuple[str, str]: The system prompt and the user prompt
+        """
+        values = defaultdict(str, {"user_request": user_request})
+        if not self.cache_prompt_prefix:
+            return self.system_prompt, self.user_prompt_template.format_map(values)
+        
+        parts = list(Formatter().parse(self.user_prompt_template))
+        last_field = max((i for i, part in enumerate(parts) if part[1] is not None), default=None)
+        if last_field is None:
+            return self.system_prompt, self.user_prompt_template.format_map(values)
+        
+        static_suffix = ''.join(part[0] for part in parts[last_field + 1:]).strip()
+        dynamic_template = ''.join(
+            literal.replace('{', '{{').replace('}', '}}') + ('{' + field + (f"!{conversion}" if conversion else '') + (f":{spec}" if spec else '') + '}'
+                       if field is not None else '')
+            for literal, field, spec, conversion in parts[:last_field + 1]
+        )
+        system_prompt = f"{self.system_prompt}\n\n{static_suffix}" if static_suffix else self.system_prompt
+        return system_prompt, dynamic_template.format_map(values)
+    
     def get_llm_parameters(self) -> dict:
         """
         Get the parameters for LLM API call.
@@ -96,6 +138,45 @@ class Agent(models.Model):
         return params
 
 
+class BatchJob(models.Model):
+    """
+    A provider batch job running many agent prompts at batch pricing.
+    Results are collected by the ``tasks.poll_batch_jobs`` beat task.
+    """
+    STATUS_CHOICES = [
+        ('submitted', 'Submitted'),
+        ('collecting', 'Collecting'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    llm_model = models.ForeignKey(
+        LLMModel,
+        on_delete=models.PROTECT,
+        related_name='batch_jobs'
+    )
+    provider_batch_id = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='submitted')
+    request_count = models.PositiveIntegerField(default=0)
+    # Runs whose result was published, in id order, so a retried collection resumes after them
+    published_runs = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['status']),
+        ]
+
+    def __str__(self):
+        return f"Batch {self.provider_batch_id} ({self.status})"
+
+
 class AgentRun(models.Model):
     """
     Represents a single run of an agent on a specific request.
@@ -106,19 +187,93 @@ class AgentRun(models.Model):
         on_delete=models.PROTECT,
         related_name='runs'
     )
-    session_id = models.UUIDField()
+    # Gateway session ids, e.g. "session-{appid}-{timestamp}-{hex}"
+    session_id = models.CharField(max_length=255)
+    request_id = models.CharField(max_length=255, null=True, blank=True)
     request_data = models.JSONField()
     response_data = models.JSONField(null=True)
     error = models.TextField(null=True, blank=True)
-    started_at = models.DateTimeField(auto_now_add=True)
+    batch_job = models.ForeignKey(
+        BatchJob,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='runs'
+    )
+    # Set by the worker, runs are written later by the write-behind recorder
+    started_at = models.DateTimeField(default=timezone.now, editable=False)
     completed_at = models.DateTimeField(null=True)
     
     class Meta:
         ordering = ['-started_at']
         indexes = [
             models.Index(fields=['session_id']),
+            models.Index(fields=['request_id']),
             models.Index(fields=['started_at']),
+            # Keyset pagination order
+            models.Index(fields=['-started_at', '-id']),
         ]
     
     def __str__(self):
         return f"Run {self.id} for Agent {self.agent.name}"
+
+
+class AgentStatsRollup(models.Model):
+    """
+    Hourly or daily aggregates of an agent's runs, maintained incrementally
+    by the ``apps.agents.update_agent_stats_rollups`` beat task.
+    """
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    agent = models.ForeignKey(
+        Agent,
+        on_delete=models.CASCADE,
+        related_name='stats_rollups'
+    )
+    llm_model = models.ForeignKey(
+        LLMModel,
+        on_delete=models.CASCADE,
+        related_name='stats_rollups'
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+
+    runs = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    positive = models.PositiveIntegerField(default=0)
+    negative = models.PositiveIntegerField(default=0)
+    # Decisions matching the final weighted verdict of their request
+    agreements = models.PositiveIntegerField(default=0)
+    latency_sum = models.FloatField(default=0.0)
+    latency_max = models.FloatField(default=0.0)
+    input_tokens = models.BigIntegerField(default=0)
+    cached_input_tokens = models.BigIntegerField(default=0)
+    output_tokens = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-bucket_start']
+        unique_together = ['agent', 'llm_model', 'period', 'bucket_start']
+        indexes = [
+            # Keyset pagination order within a period
+            models.Index(fields=['period', '-bucket_start', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.agent_id} {self.period} {self.bucket_start:%Y-%m-%d %H:%M}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Completion time up to which runs have been folded into the rollups.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,134 @@
+"""
+Native Postgres range partitioning of AgentRun by ``started_at``.
+
+The table is converted by migration 0005. Partitions are created ahead of time
+and expired whole by the ``apps.agents.maintain_agent_run_partitions`` beat
+task, so retention never scans or deletes rows. Other database backends keep
+a plain table and every function here is a no-op for them.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'agents_agentrun'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def _period_start(day: date, period: str) -> date:
+    return day if period == 'day' else day.replace(day=1)
+
+
+def _next_period(start: date, period: str) -> date:
+    if period == 'day':
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _partition_name(start: date, period: str) -> str:
+    return f"{TABLE}_p{start:%Y_%m_%d}" if period == 'day' else f"{TABLE}_p{start:%Y_%m}"
+
+
+def _parse_partition_name(name: str) -> Optional[Tuple[date, str]]:
+    """Return the start date and period encoded in a partition name."""
+    suffix = name[len(f"{TABLE}_p"):]
+    for period, fmt in (('day', '%Y_%m_%d'), ('month', '%Y_%m')):
+        try:
+            return datetime.strptime(suffix, fmt).date(), period
+        except ValueError:
+            continue
+    return None
+
+
+def is_partitioned(cursor) -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p')", [TABLE])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(cursor) -> List[str]:
+    """Names of the partitions currently attached to the AgentRun table."""
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        ORDER BY child.relname
+        """,
+        [TABLE]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_partition(cursor, start: date, period: str) -> str:
+    """Create the partition covering the period starting at ``start`` if it does not exist."""
+    name = _partition_name(start, period)
+    end = _next_period(start, period)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" '
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    return name
+
+
+def ensure_partitions(now: Optional[datetime] = None) -> List[str]:
+    """
+    Create the partitions for the current period and the configured number
+    of periods ahead.
+
+    Returns:
+        List[str]: Names of the partitions that now exist for those periods
+    """
+    period = settings.AGENT_RUN_PARTITION_PERIOD
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        start = _period_start((now or timezone.now()).date(), period)
+        names = []
+        for _ in range(settings.AGENT_RUN_PARTITIONS_AHEAD + 1):
+            try:
+                names.append(create_partition(cursor, start, period))
+            except Exception as e:
+                # Fails if rows for this period already landed in the default partition
+                logger.error(f"Error creating AgentRun partition for {start}: {str(e)}")
+            start = _next_period(start, period)
+        return names
+
+
+def expire_partitions(now: Optional[datetime] = None) -> List[str]:
+    """
+    Detach partitions entirely older than the retention window, then drop them
+    or keep them as standalone tables for archiving.
+
+    Returns:
+        List[str]: Names of the expired partitions
+    """
+    retention_days = settings.AGENT_RUN_RETENTION_DAYS
+    if not retention_days:
+        return []
+    cutoff = (now or timezone.now()).date() - timedelta(days=retention_days)
+    expired = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        for name in list_partitions(cursor):
+            parsed = _parse_partition_name(name)
+            if parsed is None:
+                continue
+            start, period = parsed
+            if _next_period(start, period) > cutoff:
+                continue
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            if settings.AGENT_RUN_RETENTION_ACTION == 'drop':
+                cursor.execute(f'DROP TABLE "{name}"')
+            expired.append(name)
+            logger.info(f"Expired AgentRun partition {name} ({settings.AGENT_RUN_RETENTION_ACTION})")
+    return expired
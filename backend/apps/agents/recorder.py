@@ -0,0 +1,202 @@
+"""
+Write-behind persistence of agent runs.
+
+Workers push run start and finish events onto a Redis list instead of writing
+to the database on the request path. The ``apps.agents.tasks.flush_agent_runs``
+beat task drains the list and writes the runs with bulk statements. Events
+that can never be written, e.g. malformed or referencing an unknown agent, are
+moved to the ``agents:run_events:dead`` list for inspection instead of blocking
+the rest of the backlog.
+"""
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from utils.redis_client import redis_client
+from .models import Agent, AgentRun
+
+logger = logging.getLogger(__name__)
+
+RUN_EVENTS_KEY = "agents:run_events"
+# Most recent events that could not be written, newest last
+DEAD_LETTER_SIZE = 10000
+
+
+class RunRecorder:
+    """
+    Buffer AgentRun writes in Redis and flush them in batches.
+    """
+
+    def __init__(self, client=None, key: str = RUN_EVENTS_KEY):
+        self.client = client or redis_client.client
+        self.key = key
+        self.dead_letter_key = f"{key}:dead"
+
+    def _push(self, event: Dict[str, Any]) -> None:
+        try:
+            self.client.rpush(self.key, json.dumps(event, default=str))
+        except Exception as e:
+            # Losing a run record must never fail the judgement itself
+            logger.error(f"Error buffering agent run event {event.get('id')}: {str(e)}")
+
+    def start(self, agent_id: str, session_id: str, request_id: Optional[str], request_data: Dict[str, Any]) -> str:
+        """
+        Record the start of an agent run.
+
+        Returns:
+            str: The id the run will be stored under
+        """
+        run_id = str(uuid.uuid4())
+        self._push({
+            "event": "start",
+            "id": run_id,
+            "agent_id": str(agent_id),
+            "session_id": str(session_id),
+            "request_id": request_id,
+            "request_data": request_data,
+            "started_at": timezone.now().isoformat(),
+        })
+        return run_id
+
+    def finish(self, run_id: str, response_data: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        """Record the outcome of an agent run."""
+        self._push({
+            "event": "finish",
+            "id": run_id,
+            "response_data": response_data,
+            "error": error,
+            "completed_at": timezone.now().isoformat(),
+        })
+
+    def _pop(self, count: int) -> List[str]:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.lrange(self.key, 0, count - 1)
+        pipe.ltrim(self.key, count, -1)
+        events, _ = pipe.execute()
+        return events
+
+    def _requeue(self, events: List[str]) -> None:
+        # Put the batch back at the head of the list, in its original order
+        if events:
+            self.client.lpush(self.key, *reversed(events))
+
+    def _dead_letter(self, events: List[str]) -> None:
+        if events:
+            pipe = self.client.pipeline()
+            pipe.rpush(self.dead_letter_key, *events)
+            pipe.ltrim(self.dead_letter_key, -DEAD_LETTER_SIZE, -1)
+            pipe.execute()
+            logger.error(f"Moved {len(events)} unwritable agent run events to {self.dead_letter_key}")
+
+    @staticmethod
+    def _parse(raw: str) -> Dict[str, Any]:
+        """
+        Decode and validate one event.
+
+        Raises:
+            ValueError, KeyError, TypeError: If the event cannot be written
+        """
+        event = json.loads(raw)
+        uuid.UUID(event["id"])
+        if event["event"] == "start":
+            uuid.UUID(event["agent_id"])
+            session_id = event["session_id"]
+            if not isinstance(session_id, str) or not session_id or len(session_id) > 255:
+                raise ValueError(f"Invalid session id {session_id!r}")
+            event["started_at"] = datetime.fromisoformat(event["started_at"])
+        elif event["event"] == "finish":
+            event["completed_at"] = datetime.fromisoformat(event["completed_at"])
+        else:
+            raise ValueError(f"Unknown event type {event['event']!r}")
+        return event
+
+    def flush(self, batch_size: Optional[int] = None) -> int:
+        """
+        Write one batch of buffered events to the database.
+
+        Runs started and finished within the batch are inserted complete,
+        finishes of runs inserted by an earlier flush become one bulk update.
+        Invalid events go to the dead-letter list, the batch is only put back
+        when the database write itself fails.
+
+        Returns:
+            int: Number of events consumed
+        """
+        batch_size = batch_size or settings.RUN_RECORDER_BATCH_SIZE
+        raw_events = self._pop(batch_size)
+        if not raw_events:
+            return 0
+
+        events = []
+        invalid = []
+        for raw in raw_events:
+            try:
+                events.append((raw, self._parse(raw)))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Invalid agent run event: {str(e)}")
+                invalid.append(raw)
+
+        # Starts of unknown agents would fail the whole bulk insert
+        agent_ids = {event["agent_id"] for _, event in events if event["event"] == "start"}
+        known_agents = {
+            str(agent_id) for agent_id in Agent.objects.filter(id__in=agent_ids).values_list('id', flat=True)
+        } if agent_ids else set()
+
+        started: Dict[str, AgentRun] = {}
+        finished: Dict[str, Dict[str, Any]] = {}
+        rejected = set()
+        for raw, event in events:
+            if event["event"] == "start":
+                if event["agent_id"] not in known_agents:
+                    logger.warning(f"Agent run {event['id']} references unknown agent {event['agent_id']}")
+                    invalid.append(raw)
+                    rejected.add(raw)
+                    continue
+                started[event["id"]] = AgentRun(
+                    id=event["id"],
+                    agent_id=event["agent_id"],
+                    session_id=event["session_id"],
+                    request_id=event.get("request_id"),
+                    request_data=event.get("request_data"),
+                    started_at=event["started_at"],
+                )
+            elif event["id"] in started:
+                run = started[event["id"]]
+                run.response_data = event.get("response_data")
+                run.error = event.get("error")
+                run.completed_at = event["completed_at"]
+            else:
+                finished[event["id"]] = event
+
+        try:
+            if started:
+                AgentRun.objects.bulk_create(list(started.values()), batch_size=500, ignore_conflicts=True)
+            if finished:
+                runs = AgentRun.objects.in_bulk(list(finished))
+                for run_id, run in runs.items():
+                    event = finished[str(run_id)]
+                    run.response_data = event.get("response_data")
+                    run.error = event.get("error")
+                    run.completed_at = event["completed_at"]
+                AgentRun.objects.bulk_update(list(runs.values()), ['response_data', 'error', 'completed_at'], batch_size=500)
+                missing = len(finished) - len(runs)
+                if missing:
+                    logger.warning(f"Dropped {missing} agent run finish events without a recorded start")
+        except Exception:
+            self._requeue([raw for raw, _ in events if raw not in rejected])
+            self._dead_letter(invalid)
+            raise
+        self._dead_letter(invalid)
+        return len(raw_events)
+
+    def backlog(self) -> int:
+        """Number of events waiting to be flushed."""
+        return self.client.llen(self.key)
+
+
+run_recorder = RunRecorder()
@@ -0,0 +1,232 @@
+"""
+Incremental per-agent performance rollups.
+
+Each pass folds the runs completed since the stored watermark into hourly and
+daily AgentStatsRollup buckets. The runs of a pass are aggregated with NumPy
+group-by operations, then added to the existing buckets in one transaction
+together with the watermark, so every run is counted exactly once.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from utils.voting import POSITIVE, NEGATIVE
+from apps.llm_providers.models import LLMModel
+from .models import AgentRun, AgentStatsRollup, RollupWatermark
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'agent_stats'
+PERIOD_SECONDS = {'hour': 3600, 'day': 86400}
+
+# Rollup counters summed per bucket
+SUM_FIELDS = (
+    'runs', 'errors', 'cancelled', 'positive', 'negative', 'agreements',
+    'latency_sum', 'input_tokens', 'cached_input_tokens', 'output_tokens',
+)
+
+
+def _as_array(values, dtype=float) -> np.ndarray:
+    return np.array([value or 0 for value in values], dtype=dtype)
+
+
+def _verdicts(keys) -> Dict:
+    """
+    Final weighted verdict of each (session_id, request_id), using every
+    finished run of the request rather than only those in the current pass.
+    """
+    session_ids = {session_id for session_id, request_id in keys}
+    request_ids = {request_id for session_id, request_id in keys}
+    rows = [
+        row for row in AgentRun.objects.filter(
+            session_id__in=session_ids, request_id__in=request_ids, completed_at__isnull=False
+        ).values_list('session_id', 'request_id', 'agent__weight', 'response_data__decision', 'response_data__status')
+        # Cancelled runs stopped before voting
+        if row[4] != 'cancelled'
+    ]
+    if not rows:
+        return {}
+    session_ids, request_ids, weights, decisions, _ = zip(*rows)
+    request_keys = list(zip(session_ids, request_ids))
+    unique_keys = list(dict.fromkeys(request_keys))
+    index = {key: i for i, key in enumerate(unique_keys)}
+    inverse = np.array([index[key] for key in request_keys])
+    weights = _as_array(weights)
+    # Runs without a decision failed, and failed runs vote NEGATIVE
+    positive = np.array([decision == POSITIVE for decision in decisions])
+
+    total_weight = np.bincount(inverse, weights=weights, minlength=len(unique_keys))
+    positive_weight = np.bincount(inverse, weights=weights * positive, minlength=len(unique_keys))
+    accepted = positive_weight * 2 > total_weight
+    return {key: POSITIVE if accepted[i] else NEGATIVE for key, i in index.items()}
+
+
+def aggregate_runs(rows) -> Dict[str, Dict]:
+    """
+    Aggregate run rows into rollup increments.
+
+    Args:
+        rows: Tuples of (agent_id, llm_model_id, session_id, request_id, started_at,
+              completed_at, error, status, decision, input_tokens, cached_input_tokens, output_tokens)
+
+    Returns:
+        Dict of period to {(agent_id, llm_model_id, bucket_start): {field: increment}}
+    """
+    if not rows:
+        return {period: {} for period in PERIOD_SECONDS}
+    (agent_ids, model_ids, session_ids, request_ids, started, completed, errors,
+     statuses, decisions, input_tokens, cached_tokens, output_tokens) = zip(*rows)
+
+    started = np.array([value.timestamp() for value in started])
+    completed = np.array([value.timestamp() for value in completed])
+    latency = np.maximum(completed - started, 0.0)
+    is_error = np.array([bool(error) for error in errors])
+    is_cancelled = np.array([status == 'cancelled' for status in statuses])
+    is_positive = np.array([decision == POSITIVE for decision in decisions])
+    is_negative = np.array([decision == NEGATIVE for decision in decisions])
+
+    request_keys = list(zip(session_ids, request_ids))
+    verdicts = _verdicts({key for key in request_keys if key[1]})
+    agrees = np.array([
+        decision is not None and verdicts.get(key) == decision
+        for key, decision in zip(request_keys, decisions)
+    ])
+
+    columns = {
+        'runs': np.ones(len(rows)),
+        'errors': is_error,
+        'cancelled': is_cancelled,
+        'positive': is_positive,
+        'negative': is_negative,
+        'agreements': agrees,
+        'latency_sum': latency,
+        'input_tokens': _as_array(input_tokens),
+        'cached_input_tokens': _as_array(cached_tokens),
+        'output_tokens': _as_array(output_tokens),
+    }
+
+    agent_keys, agent_index = np.unique(np.array([str(value) for value in agent_ids]), return_inverse=True)
+    model_keys, model_index = np.unique(np.array([str(value) for value in model_ids]), return_inverse=True)
+
+    increments = {}
+    for period, seconds in PERIOD_SECONDS.items():
+        buckets = (started // seconds * seconds).astype(np.int64)
+        groups, inverse = np.unique(
+            np.stack([agent_index.reshape(-1), model_index.reshape(-1), buckets], axis=1),
+            axis=0, return_inverse=True
+        )
+        inverse = inverse.reshape(-1)
+        sums = {
+            field: np.bincount(inverse, weights=values.astype(float), minlength=len(groups))
+            for field, values in columns.items()
+        }
+        latency_max = np.zeros(len(groups))
+        np.maximum.at(latency_max, inverse, latency)
+
+        period_increments = {}
+        for i, (agent_code, model_code, bucket) in enumerate(groups):
+            key = (
+                agent_keys[agent_code],
+                model_keys[model_code],
+                datetime.fromtimestamp(int(bucket), tz=dt_timezone.utc),
+            )
+            period_increments[key] = {field: sums[field][i] for field in SUM_FIELDS}
+            period_increments[key]['latency_max'] = latency_max[i]
+        increments[period] = period_increments
+    return increments
+
+
+def _apply(period: str, increments: Dict) -> None:
+    if not increments:
+        return
+    existing = {
+        (str(rollup.agent_id), str(rollup.llm_model_id), rollup.bucket_start): rollup
+        for rollup in AgentStatsRollup.objects.select_for_update().filter(
+            period=period,
+            bucket_start__in={key[2] for key in increments},
+            agent_id__in={key[0] for key in increments},
+        )
+    }
+    created, updated = [], []
+    for (agent_id, llm_model_id, bucket_start), values in increments.items():
+        rollup = existing.get((agent_id, llm_model_id, bucket_start))
+        if rollup is None:
+            rollup = AgentStatsRollup(agent_id=agent_id, llm_model_id=llm_model_id, period=period, bucket_start=bucket_start)
+            created.append(rollup)
+        else:
+            updated.append(rollup)
+        for field in SUM_FIELDS:
+            setattr(rollup, field, getattr(rollup, field) + type(getattr(rollup, field))(values[field]))
+        rollup.latency_max = max(rollup.latency_max, float(values['latency_max']))
+    AgentStatsRollup.objects.bulk_create(created, batch_size=500)
+    AgentStatsRollup.objects.bulk_update(updated, list(SUM_FIELDS) + ['latency_max', 'updated_at'], batch_size=500)
+
+
+def _served_rows(rows):
+    """
+    Replace the agent's configured model of each run with the model that served it.
+
+    Runs recorded without a serving model, or whose model has since been
+    deleted, stay under the agent's configured model.
+    """
+    served_ids = {row[1] for row in rows if row[1]}
+    known = {
+        str(model_id) for model_id in LLMModel.objects.filter(id__in=served_ids).values_list('id', flat=True)
+    } if served_ids else set()
+    return [
+        (agent_id, served_id if served_id in known else configured_id, *rest)
+        for agent_id, served_id, configured_id, *rest in rows
+    ]
+
+
+def update_rollups(now: Optional[datetime] = None) -> int:
+    """
+    Fold runs completed since the watermark into the rollups.
+
+    Only runs older than AGENT_STATS_SETTLE_SECONDS are processed, so that
+    buffered run records and the other agents of a request have landed.
+    Work is done in windows of at most AGENT_STATS_WINDOW_SECONDS.
+
+    Returns:
+        int: Number of runs processed
+    """
+    upper_bound = (now or timezone.now()) - timedelta(seconds=settings.AGENT_STATS_SETTLE_SECONDS)
+    watermark = RollupWatermark.objects.filter(name=WATERMARK_NAME).first()
+    if watermark is None:
+        oldest = AgentRun.objects.aggregate(oldest=Min('completed_at'))['oldest']
+        if oldest is None:
+            return 0
+        watermark = RollupWatermark.objects.create(name=WATERMARK_NAME, value=oldest - timedelta(microseconds=1))
+
+    processed = 0
+    while watermark.value < upper_bound:
+        since = watermark.value
+        until = min(upper_bound, since + timedelta(seconds=settings.AGENT_STATS_WINDOW_SECONDS))
+        rows = _served_rows(
+            AgentRun.objects.filter(completed_at__gt=since, completed_at__lte=until).values_list(
+                'agent_id', 'response_data__model_id', 'agent__llm_model_id', 'session_id', 'request_id', 'started_at', 'completed_at',
+                'error', 'response_data__status', 'response_data__decision',
+                'response_data__usage__input_tokens', 'response_data__usage__cached_input_tokens',
+                'response_data__usage__output_tokens'
+            )
+        )
+        increments = aggregate_runs(rows)
+        with transaction.atomic():
+            # Re-read the watermark under lock so concurrent passes never double count
+            locked = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            if locked.value != since:
+                logger.warning("Agent stats watermark moved during the update, stopping this pass")
+                return processed
+            for period, period_increments in increments.items():
+                _apply(period, period_increments)
+            locked.value = until
+            locked.save(update_fields=['value'])
+        watermark = locked
+        processed += len(rows)
+    return processed
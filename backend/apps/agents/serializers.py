@@ -1,8 +1,9 @@
 """
 Serializers for Agent models.
 """
+from django.db.models import F
 from rest_framework import serializers
-from .models import Agent, AgentRun
+from .models import Agent, AgentRun, AgentStatsRollup
 from apps.llm_providers.models import LLMModel
 
 class AgentSerializer(serializers.ModelSerializer):
@@ -26,6 +27,7 @@ class AgentSerializer(serializers.ModelSerializer):
             'stop_sequences',
             'is_active',
             'weight',
+            'cache_prompt_prefix',
             'created_at',
             'updated_at'
         )
@@ -64,6 +66,7 @@ class AgentRunSerializer(serializers.ModelSerializer):
             'agent',
             'agent_name',
             'session_id',
+            'request_id',
             'request_data',
             'response_data',
             'error',
@@ -71,3 +74,77 @@ class AgentRunSerializer(serializers.ModelSerializer):
             'completed_at'
         )
         read_only_fields = fields  # All fields are read-only
+    
+    @classmethod
+    def values(cls, queryset):
+        """
+        Restrict a run queryset to the serialized columns for list endpoints,
+        skipping model instantiation and field-by-field serialization.
+        """
+        return queryset.values(
+            'id', 'agent_id', 'session_id', 'request_id', 'request_data', 'response_data',
+            'error', 'started_at', 'completed_at', agent_name=F('agent__name')
+        )
+    
+    @classmethod
+    def from_values(cls, rows):
+        """Build the serialized representation from rows of ``values()``."""
+        return [{
+            'id': row['id'],
+            'agent': row['agent_id'],
+            'agent_name': row['agent_name'],
+            'session_id': row['session_id'],
+            'request_id': row['request_id'],
+            'request_data': row['request_data'],
+            'response_data': row['response_data'],
+            'error': row['error'],
+            'started_at': row['started_at'],
+            'completed_at': row['completed_at'],
+        } for row in rows]
+
+
+class AgentStatsRollupSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the AgentStatsRollup model, with derived rates.
+    """
+    agent_name = serializers.CharField(source='agent.name', read_only=True)
+    error_rate = serializers.SerializerMethodField()
+    agreement_rate = serializers.SerializerMethodField()
+    avg_latency = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = AgentStatsRollup
+        fields = (
+            'id',
+            'agent',
+            'agent_name',
+            'llm_model',
+            'period',
+            'bucket_start',
+            'runs',
+            'errors',
+            'cancelled',
+            'positive',
+            'negative',
+            'agreements',
+            'latency_sum',
+            'latency_max',
+            'input_tokens',
+            'cached_input_tokens',
+            'output_tokens',
+            'error_rate',
+            'agreement_rate',
+            'avg_latency',
+            'updated_at'
+        )
+        read_only_fields = fields
+    
+    def get_error_rate(self, obj) -> float:
+        return obj.errors / obj.runs if obj.runs else 0.0
+    
+    def get_agreement_rate(self, obj) -> float:
+        decided = obj.positive + obj.negative
+        return obj.agreements / decided if decided else 0.0
+    
+    def get_avg_latency(self, obj) -> float:
+        return obj.latency_sum / obj.runs if obj.runs else 0.0
@@ -0,0 +1,39 @@
+from celery import shared_task
+from django.conf import settings
+
+from .partitions import ensure_partitions, expire_partitions
+from .recorder import run_recorder
+from .rollups import update_rollups
+
+
+@shared_task(name='apps.agents.flush_agent_runs')
+def flush_agent_runs():
+    """
+    Write buffered agent run events to the database in bulk
+    """
+    written = 0
+    for _ in range(settings.RUN_RECORDER_MAX_BATCHES):
+        count = run_recorder.flush()
+        written += count
+        if count < settings.RUN_RECORDER_BATCH_SIZE:
+            break
+    return written
+
+
+@shared_task(name='apps.agents.maintain_agent_run_partitions')
+def maintain_agent_run_partitions():
+    """
+    Create upcoming AgentRun partitions and expire the ones past retention
+    """
+    return {
+        "partitions": ensure_partitions(),
+        "expired": expire_partitions(),
+    }
+
+
+@shared_task(name='apps.agents.update_agent_stats_rollups')
+def update_agent_stats_rollups():
+    """
+    Fold newly completed agent runs into the hourly and daily rollups
+    """
+    return update_rollups()
@@ -0,0 +1,1033 @@
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import fakeredis
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.llm_providers.models import LLMModel, LLMProvider
+from llm.fake_batch_server import FakeBatchServer
+from llm.providers import OpenAIProvider, closing_http_clients
+from llm.batch import BaseBatchBackend, BatchRequest, OpenAIBatchBackend
+from tasks.batch_tasks import collect_batch_results, poll_batch_jobs, submit_batch_judgement
+from tasks.agent_dispatcher import build_llm_client, handle_agent_judgement, judge_with_agent
+from tasks.agent_tasks import push_agent_result
+from tasks.aggregation import finalize_agent_results, open_agent_results
+from utils.llm_stats import llm_call_stats, prompt_cache_stats
+from utils.model_router import ModelRouter
+from utils.payload_store import PayloadMissing, PayloadStore
+from utils.rate_limiter import ProviderRateLimiter, RateLimitTimeout
+from utils.redis_client import redis_client
+from utils.stream_protocol import DeltaStream, stream_ids, stream_open
+from utils.voting import JudgementQuorum
+from .judgement_service import ConfigSnapshot, JudgementService
+from .models import Agent, AgentRun, AgentStatsRollup, BatchJob
+from .recorder import RunRecorder
+from .rollups import update_rollups
+
+
+def create_llm_model(provider_name, provider_type='openai', **fields):
+    provider = LLMProvider.objects.create(name=provider_name, provider_type=provider_type, api_key='test-key')
+    return LLMModel.objects.create(provider=provider, **{'name': 'Fake', 'model_name': 'fake-model', **fields})
+
+
+def create_agent(llm_model, name='judge', **fields):
+    """Create a judge agent, loaded with its model and provider as the dispatcher reads it."""
+    agent = Agent.objects.create(
+        name=name,
+        llm_model=llm_model,
+        system_prompt='Judge the request.',
+        user_prompt_template='Request: {user_request}',
+        **fields
+    )
+    return Agent.objects.select_related('llm_model__provider').get(id=agent.id)
+
+
+class BatchJudgementTests(TestCase):
+    def setUp(self):
+        self.server = FakeBatchServer(
+            responder=lambda system_prompt, user_prompt: (
+                "<decision>NEGATIVE</decision>" if 'bad' in user_prompt else "<decision>POSITIVE</decision>"
+            )
+        ).start()
+        self.addCleanup(self.server.stop)
+
+        for patched in ('redis_client', 'JudgementQuorum', 'record_agent_vote'):
+            patcher = mock.patch(f'tasks.batch_tasks.{patched}')
+            setattr(self, patched, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def create_agent(self, provider_type):
+        provider = LLMProvider.objects.create(
+            name=f'fake-{provider_type}',
+            provider_type=provider_type,
+            base_url=self.server.url,
+            api_key='test-key'
+        )
+        llm_model = LLMModel.objects.create(provider=provider, name='Fake', model_name='fake-model')
+        return create_agent(llm_model, name=f'{provider_type} judge')
+
+    def test_batch_results_fan_into_agent_runs(self):
+        agents = [self.create_agent('openai'), self.create_agent('anthropic')]
+        agents = list(Agent.objects.select_related('llm_model__provider').filter(id__in=[a.id for a in agents]))
+        jobs = submit_batch_judgement([('r1', 'a good request'), ('r2', 'a bad request')], agents)
+
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(AgentRun.objects.filter(batch_job__isnull=False).count(), 4)
+
+        # The fake server reports every batch as running on the first poll
+        self.assertEqual(poll_batch_jobs()['finished'], 0)
+        self.assertEqual(poll_batch_jobs()['finished'], 2)
+        self.assertFalse(BatchJob.objects.exclude(status='completed').exists())
+
+        for run in AgentRun.objects.all():
+            expected = 'NEGATIVE' if run.request_id == 'r2' else 'POSITIVE'
+            self.assertIsNotNone(run.completed_at)
+            self.assertEqual(run.response_data['decision'], expected)
+        self.assertEqual(self.redis_client.publish.call_count, 4)
+        self.assertEqual(self.record_agent_vote.call_count, 4)
+
+    def test_failed_publication_is_resumed_by_the_next_poll(self):
+        agents = [self.create_agent('openai')]
+        agents = list(Agent.objects.select_related('llm_model__provider').filter(id__in=[a.id for a in agents]))
+        job, = submit_batch_judgement([('r1', 'a good request'), ('r2', 'a bad request'), ('r3', 'good')], agents)
+        self.redis_client.publish.side_effect = [None, ConnectionError('refused'), None, None]
+
+        self.assertEqual(poll_batch_jobs()['finished'], 0)
+        self.assertEqual(poll_batch_jobs()['finished'], 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.published_runs, job.error), ('submitted', 1, 'refused'))
+        self.assertFalse(job.runs.filter(completed_at__isnull=True).exists())
+
+        self.assertEqual(poll_batch_jobs()['finished'], 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.published_runs, job.error), ('completed', 3, None))
+        published = [json.loads(call.args[1])['request_id'] for call in self.redis_client.publish.call_args_list]
+        # The next poll starts again with the run whose publication failed
+        self.assertEqual(len(published), 4)
+        self.assertEqual(published[1], published[2])
+        self.assertEqual(set(published), {'r1', 'r2', 'r3'})
+        # Every vote is recorded once
+        self.assertEqual(self.record_agent_vote.call_count, 3)
+
+    def test_large_submissions_are_split_into_several_jobs(self):
+        agents = [self.create_agent('openai')]
+        agents = list(Agent.objects.select_related('llm_model__provider').filter(id__in=[a.id for a in agents]))
+        requests = [(f'r{i}', 'a good request') for i in range(5)]
+        with mock.patch.object(OpenAIBatchBackend, 'MAX_REQUESTS', 2):
+            jobs = submit_batch_judgement(requests, agents)
+
+        self.assertEqual([job.request_count for job in jobs], [2, 2, 1])
+        self.assertEqual(len({job.provider_batch_id for job in jobs}), 3)
+        self.assertEqual([job.runs.count() for job in jobs], [2, 2, 1])
+
+        backend = OpenAIBatchBackend('test-key', 'fake-model')
+        batch_requests = [BatchRequest(str(i), 'system', 'x' * 1000) for i in range(5)]
+        with mock.patch.object(OpenAIBatchBackend, 'MAX_BYTES', 2500):
+            self.assertEqual([len(batch) for batch in backend.split(batch_requests)], [2, 2, 1])
+
+    def test_backends_must_implement_the_batch_api(self):
+        class IncompleteBackend(BaseBatchBackend):
+            def submit(self, requests):
+                return 'batch'
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend('test-key', 'fake-model')
+
+
+class AgentStatsRollupTests(TestCase):
+    def setUp(self):
+        self.llm_model = create_llm_model('rollups')
+        self.agents = [create_agent(self.llm_model, name=f'judge {i}') for i in range(3)]
+        self.session_id = uuid.uuid4()
+        self.started = datetime(2026, 1, 1, 10, 15, tzinfo=timezone.utc)
+
+    def create_run(self, agent, request_id, decision=None, error=None, latency=2.0, offset=0):
+        started = self.started + timedelta(minutes=offset)
+        return AgentRun.objects.create(
+            agent=agent,
+            session_id=self.session_id,
+            request_id=request_id,
+            request_data={'request': 'x'},
+            response_data={'decision': decision, 'usage': {'input_tokens': 100, 'output_tokens': 10}} if decision else None,
+            error=error,
+            started_at=started,
+            completed_at=started + timedelta(seconds=latency)
+        )
+
+    def test_runs_are_folded_in_once(self):
+        first, second, third = self.agents
+        self.create_run(first, 'r1', 'POSITIVE', latency=1.0)
+        self.create_run(second, 'r1', 'POSITIVE', latency=3.0)
+        self.create_run(third, 'r1', 'NEGATIVE')
+        self.create_run(third, 'r2', error='timeout')
+
+        now = self.started + timedelta(minutes=10)
+        self.assertEqual(update_rollups(now=now), 4)
+        self.assertEqual(update_rollups(now=now), 0)
+
+        hourly = {rollup.agent_id: rollup for rollup in AgentStatsRollup.objects.filter(period='hour')}
+        self.assertEqual(hourly[first.id].bucket_start, datetime(2026, 1, 1, 10, tzinfo=timezone.utc))
+        self.assertEqual(hourly[first.id].agreements, 1)
+        self.assertEqual(hourly[first.id].input_tokens, 100)
+        self.assertEqual(hourly[third.id].runs, 2)
+        self.assertEqual(hourly[third.id].errors, 1)
+        self.assertEqual(hourly[third.id].agreements, 0)
+        self.assertEqual(hourly[third.id].latency_max, 2.0)
+        self.assertEqual(AgentStatsRollup.objects.filter(period='day').count(), 3)
+
+        # A later run of the same hour is added to the existing bucket
+        self.create_run(first, 'r3', 'NEGATIVE', latency=5.0, offset=15)
+        self.assertEqual(update_rollups(now=now + timedelta(minutes=20)), 1)
+        rollup = AgentStatsRollup.objects.get(period='hour', agent=first)
+        self.assertEqual(rollup.runs, 2)
+        self.assertEqual(rollup.latency_sum, 6.0)
+        self.assertEqual(rollup.latency_max, 5.0)
+
+    def test_runs_are_credited_to_the_model_that_served_them(self):
+        first, second, _ = self.agents
+        hedge = LLMModel.objects.create(provider=self.llm_model.provider, name='Hedge', model_name='hedge-model')
+        self.create_run(first, 'r1', 'POSITIVE')
+        hedged = self.create_run(second, 'r1', 'POSITIVE', latency=4.0)
+        hedged.response_data['model_id'] = str(hedge.id)
+        hedged.save()
+
+        self.assertEqual(update_rollups(now=self.started + timedelta(minutes=10)), 2)
+        hourly = AgentStatsRollup.objects.filter(period='hour')
+        self.assertEqual(hourly.get(agent=first).llm_model_id, self.llm_model.id)
+        self.assertEqual(hourly.get(agent=second).llm_model_id, hedge.id)
+        self.assertEqual(hourly.get(llm_model=hedge).latency_sum, 4.0)
+
+
+class RunRecorderTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent(create_llm_model('recorder'))
+        self.client = fakeredis.FakeRedis(decode_responses=True)
+        self.recorder = RunRecorder(self.client)
+        # Session ids as generated by the gateway
+        self.session_id = 'session-app1-1767225600-9f86d081'
+
+    def test_runs_with_gateway_session_ids_are_written(self):
+        first = self.recorder.start(self.agent.id, self.session_id, 'r1', {'request': 'x'})
+        self.recorder.finish(first, {'decision': 'POSITIVE'})
+        second = self.recorder.start(self.agent.id, self.session_id, 'r2', {'request': 'y'})
+
+        self.assertEqual(self.recorder.flush(), 3)
+        self.assertEqual(self.recorder.backlog(), 0)
+        self.assertEqual(AgentRun.objects.get(id=first).response_data, {'decision': 'POSITIVE'})
+        self.assertEqual(AgentRun.objects.get(id=second).session_id, self.session_id)
+        self.assertIsNone(AgentRun.objects.get(id=second).completed_at)
+
+        # A finish flushed after its start becomes an update
+        self.recorder.finish(second, error='timeout')
+        self.assertEqual(self.recorder.flush(), 1)
+        run = AgentRun.objects.get(id=second)
+        self.assertEqual(run.error, 'timeout')
+        self.assertIsNotNone(run.completed_at)
+
+    def test_invalid_events_are_dead_lettered(self):
+        run_id = self.recorder.start(self.agent.id, self.session_id, 'r1', {'request': 'x'})
+        self.recorder.start(uuid.uuid4(), self.session_id, 'r1', {'request': 'x'})
+        self.client.rpush(self.recorder.key, 'not json', json.dumps({'event': 'start', 'id': 'x'}))
+
+        self.assertEqual(self.recorder.flush(), 4)
+        self.assertEqual(self.recorder.backlog(), 0)
+        self.assertEqual(self.client.llen(self.recorder.dead_letter_key), 3)
+        self.assertTrue(AgentRun.objects.filter(id=run_id).exists())
+
+    def test_valid_events_are_requeued_when_the_write_fails(self):
+        self.recorder.start(self.agent.id, self.session_id, 'r1', {'request': 'x'})
+        self.client.rpush(self.recorder.key, 'not json')
+
+        with mock.patch.object(AgentRun.objects, 'bulk_create', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                self.recorder.flush()
+        self.assertEqual(self.recorder.backlog(), 1)
+        self.assertEqual(self.client.llen(self.recorder.dead_letter_key), 1)
+
+        self.assertEqual(self.recorder.flush(), 1)
+        self.assertEqual(AgentRun.objects.count(), 1)
+
+
+class AgentRunAPITests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(get_user_model().objects.create_user(username='viewer'))
+        self.agent = create_agent(create_llm_model('runs'))
+        self.started = datetime(2026, 1, 1, 10, tzinfo=timezone.utc)
+
+    def create_runs(self, count, session_id='session-app1-1767225600-9f86d081'):
+        # Pairs of runs share a start time, so pages must break ties on id
+        return AgentRun.objects.bulk_create([
+            AgentRun(
+                agent=self.agent,
+                session_id=session_id,
+                request_id=f'r{i}',
+                request_data={'request': i},
+                response_data={'decision': 'POSITIVE'},
+                started_at=self.started + timedelta(minutes=i // 2),
+                completed_at=self.started + timedelta(minutes=i // 2, seconds=1)
+            )
+            for i in range(count)
+        ])
+
+    def test_cursor_pages_cover_every_run_once(self):
+        runs = self.create_runs(7)
+        expected = [str(run.id) for run in sorted(runs, key=lambda run: (run.started_at, run.id), reverse=True)]
+
+        seen = []
+        url = reverse('agentrun-list') + '?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(set(response.data), {'next', 'results'})
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend(str(run['id']) for run in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_runs_added_between_pages_do_not_shift_the_cursor(self):
+        self.create_runs(4)
+        first = self.client.get(reverse('agentrun-list') + '?page_size=2')
+        newer = AgentRun.objects.create(
+            agent=self.agent, session_id='session-app1-1767225600-9f86d081', request_id='new',
+            request_data={}, started_at=self.started + timedelta(hours=1)
+        )
+        second = self.client.get(first.data['next'])
+
+        ids = [run['id'] for run in first.data['results'] + second.data['results']]
+        self.assertEqual(len(set(ids)), 4)
+        self.assertNotIn(newer.id, ids)
+        self.assertIsNone(second.data['next'])
+
+    def test_filters_apply_to_every_page(self):
+        self.create_runs(3)
+        self.create_runs(2, session_id='session-app2-1767225600-0c1f2e3d')
+        response = self.client.get(reverse('agentrun-list'), {'session_id': 'session-app2-1767225600-0c1f2e3d'})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('not-a-cursor', base64.urlsafe_b64encode(b'2026-01-01T10:00:00+00:00|not-a-uuid').decode()):
+            response = self.client.get(reverse('agentrun-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, cursor)
+
+    def test_csv_export_streams_every_run_oldest_first(self):
+        runs = self.create_runs(5)
+        response = self.client.get(reverse('agentrun-export'), {'output': 'csv'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('agent_runs.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [str(run.id) for run in sorted(runs, key=lambda run: (run.started_at, run.id))]
+        )
+        self.assertEqual(rows[0]['agent_name'], 'judge')
+        self.assertEqual(rows[0]['session_id'], 'session-app1-1767225600-9f86d081')
+        self.assertEqual(json.loads(rows[0]['response_data']), {'decision': 'POSITIVE'})
+        self.assertEqual(rows[0]['error'], '')
+        self.assertEqual(datetime.fromisoformat(rows[0]['started_at']), self.started)
+
+    def test_ndjson_export_applies_the_bounds(self):
+        self.create_runs(6)
+        response = self.client.get(reverse('agentrun-export'), {
+            'started_after': (self.started + timedelta(minutes=1)).isoformat(),
+            'started_before': '2026-01-01T10:02:00',
+        })
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        runs = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(sorted(run['request_id'] for run in runs), ['r2', 'r3'])
+
+        # A date bound is the start of that day
+        response = self.client.get(reverse('agentrun-export'), {'started_before': '2026-01-01'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_export_rejects_bad_parameters(self):
+        for params in (
+            {'output': 'xml'},
+            {'started_after': 'yesterday'},
+            {'started_before': '2026-13-01'},
+            {'started_before': '2026-01-01T25:00:00'},
+        ):
+            response = self.client.get(reverse('agentrun-export'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn('error', response.json())
+
+    def test_stats_reject_bad_bounds(self):
+        for params in ({'since': 'yesterday'}, {'until': '2026-13-01'}):
+            response = self.client.get(reverse('agentstatsrollup-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+        response = self.client.get(reverse('agentstatsrollup-list'), {'since': '2026-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(AGENT_RESULTS_TIMEOUT=300)
+class AgentResultAggregationTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        client = SimpleNamespace(client=self.redis)
+        for target in ('tasks.aggregation.redis_client', 'tasks.agent_tasks.redis_client'):
+            patcher = mock.patch(target, client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(finalize_agent_results, 'apply_async')
+        self.finalize = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stream = 'session:agent_results:session:request'
+
+    def published(self):
+        return [fields for _, fields in self.redis.xrange('session:results:session')]
+
+    def test_the_last_result_publishes_the_verdict(self):
+        open_agent_results('session', 'request', {'a': 1.0, 'b': 1.0, 'c': 1.0})
+        self.finalize.assert_called_once_with(('session', 'request'), countdown=300)
+
+        push_agent_result('session', 'request', 'a', 'POSITIVE', 0.9)
+        push_agent_result('session', 'request', 'b', 'NEGATIVE', 0.5)
+        # A retried task's second result is ignored
+        push_agent_result('session', 'request', 'a', 'NEGATIVE', 1.0)
+        # The running tally is kept next to the stream
+        tally = self.redis.hgetall(f'{self.stream}:tally')
+        self.assertEqual(tally['received'], '2')
+        self.assertAlmostEqual(float(tally['vote:POSITIVE']), 0.9)
+        self.assertEqual(self.redis.xlen(self.stream), 2)
+        push_agent_result('session', 'request', 'c', 'POSITIVE', 0.8)
+
+        published = self.published()
+        self.assertEqual([result['status'] for result in published], ['provisional'] * 3 + ['completed'])
+        self.assertEqual([result['received'] for result in published[:3]], ['1', '2', '3'])
+        # Only the last result makes the verdict final
+        self.assertEqual([result['verdict'] for result in published[:3]], ['', '', 'POSITIVE'])
+        final = json.loads(published[-1]['agent_results'])
+        self.assertEqual([(result['agent_id'], result['vote']) for result in final],
+                         [('a', 'POSITIVE'), ('b', 'NEGATIVE'), ('c', 'POSITIVE')])
+        self.assertEqual(json.loads(published[-1]['aggregated_result'])['winning_vote'], 'POSITIVE')
+        self.assertFalse(self.redis.exists(self.stream, f'{self.stream}:tally'))
+
+        # The scheduled timeout finds the request already finalized
+        finalize_agent_results('session', 'request')
+        self.assertEqual(len(self.published()), 4)
+
+    def test_timeout_publishes_the_partial_verdict_once(self):
+        open_agent_results('session', 'request', {'a': 1.0, 'b': 2.0})
+        push_agent_result('session', 'request', 'a', 'POSITIVE')
+
+        finalize_agent_results('session', 'request')
+        final = self.published()[-1]
+        self.assertEqual(final['status'], 'timeout')
+        self.assertEqual(json.loads(final['aggregated_result'])['missing_agents'], ['b'])
+
+        # A late agent does not publish a second verdict
+        push_agent_result('session', 'request', 'b', 'NEGATIVE')
+        self.assertEqual([result['status'] for result in self.published()], ['provisional', 'timeout'])
+
+
+@override_settings(PAYLOAD_STORE_MIN_SIZE=10)
+class PayloadStoreTests(TestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis(decode_responses=True)
+        self.store = PayloadStore(self.client, ttl=60, cache_size=2)
+
+    def test_large_fields_round_trip_through_a_reference(self):
+        message = {'request_id': 'r1', 'user_request': 'x' * 20}
+        detached = self.store.detach(message, 'user_request')
+
+        self.assertNotIn('user_request', detached)
+        ref = detached['user_request_ref']
+        self.assertEqual(self.client.get(f'payload:{ref}'), 'x' * 20)
+        self.assertEqual(PayloadStore(self.client).attach(detached, 'user_request'), message)
+        # Small fields and messages without a reference pass through
+        self.assertIs(self.store.detach({'user_request': 'short'}, 'user_request')['user_request'], 'short')
+        self.assertEqual(self.store.attach(message, 'user_request'), message)
+
+    def test_storing_again_refreshes_the_ttl(self):
+        ref = self.store.put('payload')
+        self.client.expire(f'payload:{ref}', 1)
+        self.assertEqual(self.store.put('payload'), ref)
+        self.assertGreater(self.client.ttl(f'payload:{ref}'), 1)
+
+        # Stored again even if the key expired in between
+        self.client.delete(f'payload:{ref}')
+        self.store.put('payload')
+        self.assertEqual(self.client.get(f'payload:{ref}'), 'payload')
+
+    def test_reads_are_cached_in_a_bounded_lru(self):
+        refs = [PayloadStore(self.client).put(f'payload {i}') for i in range(3)]
+        for ref in refs[:2]:
+            self.store.get(ref)
+        self.store.get(refs[0])
+        # The least recently used payload is evicted
+        self.store.get(refs[2])
+        self.assertEqual(list(self.store._cache), [refs[0], refs[2]])
+
+        self.client.flushall()
+        self.assertEqual(self.store.get(refs[0]), 'payload 0')
+        with self.assertRaises(PayloadMissing):
+            self.store.get(refs[1])
+
+    def test_attach_fails_once_the_payload_expired(self):
+        detached = self.store.detach({'request': 'y' * 20}, 'request')
+        self.client.flushall()
+        with self.assertRaises(PayloadMissing):
+            PayloadStore(self.client).attach(detached, 'request')
+
+
+class ConfigSnapshotTests(TestCase):
+    def test_snapshot_loads_agents_and_alternates(self):
+        providers = [
+            LLMProvider.objects.create(name=f'provider-{i}', provider_type='openai', api_key='test-key', priority=i)
+            for i in range(3)
+        ]
+        models = [
+            LLMModel.objects.create(provider=provider, name='Shared', model_name='shared-model')
+            for provider in providers
+        ]
+        agent = create_agent(models[0])
+
+        with self.assertNumQueries(2):
+            snapshot = ConfigSnapshot.load()
+        with self.assertNumQueries(0):
+            loaded = snapshot.agents[str(agent.id)]
+            self.assertEqual(loaded.llm_model.provider.name, 'provider-0')
+            alternates = snapshot.alternates[str(models[0].id)]
+        self.assertEqual(alternates, list(models[0].equivalents()))
+
+
+class DeltaStreamTests(TestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+
+    def test_stream_ids_are_unique_within_a_session(self):
+        delta = {'stream_format': 'delta'}
+        self.assertIsNone(stream_ids(self.client, 'session', {}, ['a', 'b']))
+        self.assertEqual(stream_ids(self.client, 'session', delta, ['a', 'b']), {'a': 1, 'b': 2})
+        # A second request in flight on the same session gets its own streams
+        self.assertEqual(stream_ids(self.client, 'session', delta, ['a', 'c']), {'a': 3, 'c': 4})
+        self.assertEqual(stream_ids(self.client, 'other-session', delta, ['a']), {'a': 1})
+        self.assertEqual(stream_ids(self.client, 'session', delta, []), {})
+        self.assertGreater(self.client.ttl('session:stream_ids:session'), 0)
+
+    def test_stream_open_declares_every_stream(self):
+        frame = json.loads(stream_open('session', 'r1', {'a': 3, 'b': 4}))
+        self.assertEqual(frame['type'], 'stream_open')
+        self.assertEqual(frame['request_id'], 'r1')
+        self.assertEqual(frame['streams'], [{'s': 3, 'agent_id': 'a'}, {'s': 4, 'agent_id': 'b'}])
+
+    def test_frames(self):
+        delta = DeltaStream(2)
+        frames = [json.loads(delta.frame(text)) for text in ('say "hi"\n', 'there', 'caf\u00e9')]
+        self.assertEqual(frames, [
+            {'s': 2, 'q': 0, 'd': 'say "hi"\n'}, {'s': 2, 'q': 1, 'd': 'there'}, {'s': 2, 'q': 2, 'd': 'caf\u00e9'}
+        ])
+        self.assertFalse(delta.closed)
+        self.assertEqual(json.loads(delta.close()), {'type': 'stream_close', 's': 2, 'n': 3})
+        self.assertTrue(delta.closed)
+
+
+class SlowStreamClient:
+    usage = {}
+
+    async def stream_chat(self, **kwargs):
+        for chunk in ('<decision>', 'POSITIVE', '</decision>'):
+            await asyncio.sleep(0.2)
+            yield chunk
+
+
+class DeadlineTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent(create_llm_model('deadlines'))
+        self.build_llm_client = mock.MagicMock(return_value=SlowStreamClient())
+        for target, value in (
+            ('tasks.agent_dispatcher.build_llm_client', self.build_llm_client),
+            ('tasks.agent_dispatcher.rate_limiter', mock.MagicMock()),
+            ('tasks.agent_dispatcher.JudgementQuorum', mock.MagicMock(**{'return_value.is_cancelled.return_value': False})),
+            ('tasks.agent_dispatcher.record_agent_vote', mock.MagicMock()),
+            ('tasks.agent_dispatcher.model_router', mock.MagicMock(rank=lambda llm_model, alternates: [llm_model])),
+            ('apps.agents.recorder.run_recorder', mock.MagicMock()),
+            ('utils.deadlines.metrics', mock.MagicMock()),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def judge(self, deadline_in: float):
+        published = []
+
+        async def publish(message):
+            published.append(message)
+
+        deadline = (time.time() + deadline_in) * 1000
+        result = asyncio.run(judge_with_agent(self.agent, [], 'session', 'request', 'judge this', publish,
+                                              deadline=deadline))
+        return result, [message['status'] for message in published]
+
+    def test_expired_agent_is_shed_without_calling_the_llm(self):
+        result, statuses = self.judge(-1)
+
+        self.assertEqual(result['status'], 'expired')
+        self.assertEqual(statuses, ['expired'])
+        self.build_llm_client.assert_not_called()
+
+    def test_stream_is_cut_off_at_the_deadline(self):
+        result, statuses = self.judge(0.3)
+
+        self.assertEqual(result['status'], 'expired')
+        self.assertEqual(statuses[0], 'processing')
+        self.assertEqual(statuses[-1], 'expired')
+        self.assertNotIn('completed', statuses)
+
+    def test_stream_within_the_deadline_completes(self):
+        result, statuses = self.judge(5)
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(statuses[-1], 'completed')
+
+
+class JudgementQuorumTests(TestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+        self.quorum = JudgementQuorum(self.client, 'session', 'request', ttl=60)
+
+    def test_verdict_is_fixed_by_the_deciding_vote(self):
+        self.quorum.open(3.0)
+
+        self.assertEqual(self.quorum.record('POSITIVE', 1.0), (None, {'POSITIVE': 1.0, 'NEGATIVE': 0.0}, False))
+        self.assertFalse(self.quorum.is_cancelled())
+        self.assertEqual(self.quorum.record('POSITIVE', 1.0), ('POSITIVE', {'POSITIVE': 2.0, 'NEGATIVE': 0.0}, True))
+        self.assertTrue(self.quorum.is_cancelled())
+        self.assertLessEqual(self.client.ttl(self.quorum.cancel_key), 60)
+
+        # Later votes are counted but do not decide again
+        verdict, distribution, decided = self.quorum.record('NEGATIVE', 1.0)
+        self.assertEqual((verdict, decided), ('POSITIVE', False))
+        self.assertEqual(distribution['NEGATIVE'], 1.0)
+
+    def test_weighted_tie_is_negative(self):
+        self.quorum.open(4.0)
+        self.quorum.record('POSITIVE', 2.0)
+        self.assertEqual(self.quorum.record('NEGATIVE', 2.0)[0], 'NEGATIVE')
+
+    def test_votes_without_an_open_tally_are_ignored(self):
+        self.assertEqual(self.quorum.record('POSITIVE', 1.0), (None, {}, False))
+        self.assertFalse(self.quorum.is_cancelled())
+
+    def test_reopening_clears_a_previous_verdict(self):
+        self.quorum.open(1.0)
+        self.quorum.record('NEGATIVE', 1.0)
+        self.quorum.open(1.0)
+        self.assertFalse(self.quorum.is_cancelled())
+        self.assertEqual(self.client.hgetall(self.quorum.tally_key), {b'total': b'1.0'})
+
+
+class AgentJudgementDispatchTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent(create_llm_model('dispatch'), weight=2.0)
+        self.redis_client = fakeredis.FakeRedis()
+        for target, value in (
+            ('tasks.agent_dispatcher.redis_client', self.redis_client),
+            ('tasks.agent_dispatcher.agent_task', mock.MagicMock()),
+        ):
+            patcher = mock.patch(target, value)
+            setattr(self, target.rsplit('.', 1)[1], patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_invalid_agent_ids_are_reported_and_skipped(self):
+        message = {
+            'type': 'agent_judgement',
+            'request_id': 'request',
+            'request': 'judge this',
+            'agents': [{'agent_id': 'melchior'}, {'agent_id': str(self.agent.id)}]
+        }
+        with mock.patch.object(self.redis_client, 'publish') as publish:
+            result = handle_agent_judgement('session', message)
+
+        self.assertEqual(result['status'], 'success')
+        self.agent_task.delay.assert_called_once()
+        self.assertEqual(self.agent_task.delay.call_args.kwargs['agent_id'], str(self.agent.id))
+        error = json.loads(publish.call_args.args[1])
+        self.assertEqual((error['agent_id'], error['status']), ('melchior', 'error'))
+        self.assertEqual(self.redis_client.hget('judgement:session:request:tally', 'total'), b'2.0')
+
+    def test_request_without_valid_agents_fails(self):
+        message = {'type': 'agent_judgement', 'request_id': 'request', 'agents': [{'agent_id': 'melchior'}]}
+        with self.assertRaises(ValueError):
+            handle_agent_judgement('session', message)
+        self.agent_task.delay.assert_not_called()
+
+
+class FastStreamClient:
+    usage = {'input_tokens': 10, 'output_tokens': 3}
+
+    async def stream_chat(self, **kwargs):
+        for chunk in ('<decision>', 'POSITIVE', '</decision>'):
+            yield chunk
+
+
+class ProviderLatencyTests(TestCase):
+    def setUp(self):
+        self.agent = create_agent(create_llm_model('latency'))
+
+        @asynccontextmanager
+        async def queued_slot(llm_model, estimated_tokens, timeout=None):
+            # Capacity is only granted after a local queue wait
+            await asyncio.sleep(0.3)
+            yield SimpleNamespace(actual_tokens=None)
+
+        self.stats = {name: mock.MagicMock() for name in ('record_llm_call', 'record_llm_error', 'model_router')}
+        self.stats['model_router'].rank = lambda llm_model, alternates: [llm_model]
+        for target, value in (
+            ('tasks.agent_dispatcher.build_llm_client', mock.MagicMock(return_value=FastStreamClient())),
+            ('tasks.agent_dispatcher.rate_limiter', mock.MagicMock(slot=queued_slot)),
+            ('tasks.agent_dispatcher.JudgementQuorum', mock.MagicMock(**{'return_value.is_cancelled.return_value': False})),
+            ('tasks.agent_dispatcher.record_agent_vote', mock.MagicMock()),
+            ('tasks.agent_dispatcher.record_prompt_cache', mock.MagicMock()),
+            ('apps.agents.recorder.run_recorder', mock.MagicMock()),
+            *((f'tasks.agent_dispatcher.{name}', value) for name, value in self.stats.items()),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_queue_wait_is_not_counted_as_provider_latency(self):
+        async def publish(message):
+            pass
+
+        result = asyncio.run(judge_with_agent(self.agent, [], 'session', 'request', 'judge this', publish))
+
+        self.assertEqual(result['status'], 'success')
+        call = self.stats['record_llm_call'].call_args
+        self.assertLess(call.args[1], 0.1)
+        self.assertLess(call.kwargs['ttft'], 0.1)
+        self.assertLess(self.stats['model_router'].observe.call_args.kwargs['ttft'], 0.1)
+
+    def test_local_capacity_timeout_is_not_a_provider_error(self):
+        @asynccontextmanager
+        async def saturated_slot(llm_model, estimated_tokens, timeout=None):
+            raise RateLimitTimeout('No capacity on latency after 0s (concurrency)')
+            yield
+
+        async def publish(message):
+            pass
+
+        with mock.patch('tasks.agent_dispatcher.rate_limiter', mock.MagicMock(slot=saturated_slot)):
+            with self.assertRaises(RateLimitTimeout):
+                asyncio.run(judge_with_agent(self.agent, [], 'session', 'request', 'judge this', publish))
+
+        self.stats['record_llm_error'].assert_not_called()
+
+
+@override_settings(LLM_HEDGING_ENABLED=False, JUDGEMENT_CANCEL_POLL_INTERVAL=0.01)
+class JudgementServiceTests(TestCase):
+    def setUp(self):
+        llm_model = create_llm_model('service')
+        self.agents = [create_agent(llm_model, name=f'judge {i}') for i in range(2)]
+        self.session_id = 'session-app1-1767225600-9f86d081'
+
+        # Gateway Redis (bytes) and the shared Redis behind the limiter, router, stats and recorder
+        self.gateway_redis = fakeredis.FakeRedis()
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.recorder = RunRecorder(self.redis)
+        self.push_threads = []
+        push = self.recorder._push
+        self.recorder._push = lambda event: (self.push_threads.append(threading.get_ident()), push(event))
+        for patcher in (
+            mock.patch('tasks.agent_dispatcher.redis_client', self.gateway_redis),
+            mock.patch('apps.agents.judgement_service.redis_client', self.gateway_redis),
+            mock.patch.object(redis_client, 'client', self.redis),
+            mock.patch('tasks.agent_dispatcher.rate_limiter', ProviderRateLimiter(self.redis)),
+            mock.patch('tasks.agent_dispatcher.model_router', ModelRouter(self.redis)),
+            mock.patch('apps.agents.recorder.run_recorder', self.recorder),
+            mock.patch('tasks.agent_dispatcher.build_llm_client', mock.MagicMock(return_value=FastStreamClient())),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.service = JudgementService(snapshot_ttl=60, max_requests=4)
+        self.service.snapshot = ConfigSnapshot(
+            {str(agent.id): agent for agent in self.agents}, {str(llm_model.id): []}
+        )
+        self.published = []
+
+        async def publish(channel, message):
+            self.published.append(json.loads(message))
+
+        self.service.client = SimpleNamespace(publish=publish)
+
+    def test_judgement_is_handled_end_to_end(self):
+        verdicts = self.gateway_redis.pubsub()
+        verdicts.subscribe(f'gateway:responses:{self.session_id}')
+        message = {
+            'type': 'agent_judgement',
+            'request_id': 'r1',
+            'request': 'judge this',
+            'agents': [{'agent_id': str(agent.id)} for agent in self.agents],
+        }
+
+        async def handle():
+            await self.service.slots.acquire()
+            await self.service.handle(self.session_id, message)
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(handle())
+
+        statuses = {(message['agent_id'], message['status']) for message in self.published}
+        for agent in self.agents:
+            for status in ('processing', 'streaming', 'completed'):
+                self.assertIn((str(agent.id), status), statuses)
+        completed = [message for message in self.published if message['status'] == 'completed']
+        self.assertEqual([message['decision'] for message in completed], ['POSITIVE', 'POSITIVE'])
+
+        verdict = [
+            json.loads(message['data']) for message in iter(verdicts.get_message, None)
+            if message['type'] == 'message'
+        ]
+        self.assertEqual([message['verdict'] for message in verdict], ['POSITIVE'])
+
+        # The runs, router scores and call stats went through the shared Redis
+        self.assertEqual(self.recorder.flush(), 4)
+        self.assertEqual(AgentRun.objects.filter(session_id=self.session_id).count(), 2)
+        self.assertIn('ttft', self.redis.hgetall(f'llmrouter:{self.agents[0].llm_model_id}'))
+        stats = llm_call_stats([self.agents[0].llm_model])[str(self.agents[0].llm_model_id)]
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(self.redis.zcard(f'ratelimit:model:{self.agents[0].llm_model_id}:queue'), 0)
+        # Blocking Redis calls left the event loop thread
+        self.assertEqual(len(self.push_threads), 4)
+        self.assertNotIn(loop_thread, self.push_threads)
+        self.assertEqual(self.service.slots._value, 4)
+
+    def test_request_without_known_agents_gets_an_error(self):
+        message = {
+            'type': 'agent_judgement',
+            'request_id': 'r1',
+            'request': 'judge this',
+            'agents': [{'agent_id': str(uuid.uuid4())}, {}],
+        }
+
+        async def handle():
+            await self.service.slots.acquire()
+            await self.service.handle(self.session_id, message)
+
+        asyncio.run(handle())
+
+        self.assertEqual([frame['status'] for frame in self.published], ['error', 'error'])
+        self.assertEqual(self.published[-1]['error'], 'No valid agents provided in message')
+        self.assertEqual(self.service.slots._value, 4)
+
+    def test_concurrent_delta_requests_of_a_session_use_distinct_streams(self):
+        def message(request_id):
+            return {
+                'type': 'agent_judgement',
+                'request_id': request_id,
+                'request': 'judge this',
+                'stream_format': 'delta',
+                'agents': [{'agent_id': str(agent.id)} for agent in self.agents],
+            }
+
+        async def handle_both():
+            for _ in range(2):
+                await self.service.slots.acquire()
+            await asyncio.gather(
+                self.service.handle(self.session_id, message('r1')),
+                self.service.handle(self.session_id, message('r2')),
+            )
+
+        asyncio.run(handle_both())
+
+        opened = {
+            frame['request_id']: {stream['s'] for stream in frame['streams']}
+            for frame in self.published if frame.get('type') == 'stream_open'
+        }
+        self.assertEqual(set(opened), {'r1', 'r2'})
+        self.assertFalse(opened['r1'] & opened['r2'])
+        for request_id, streams in opened.items():
+            text = {
+                stream: ''.join(frame['d'] for frame in self.published if frame.get('s') == stream and 'd' in frame)
+                for stream in streams
+            }
+            self.assertEqual(set(text.values()), {'<decision>POSITIVE</decision>'}, request_id)
+
+
+class ScriptedStreamClient:
+    usage = {}
+
+    def __init__(self, first_chunk_delay=0.0, stall=False):
+        self.first_chunk_delay = first_chunk_delay
+        self.stall = stall
+
+    async def stream_chat(self, **kwargs):
+        await asyncio.sleep(self.first_chunk_delay)
+        yield '<decision>'
+        if self.stall:
+            await asyncio.sleep(10)
+        yield 'POSITIVE</decision>'
+
+
+@override_settings(LLM_HEDGING_ENABLED=True, LLM_STALL_MAX_RESTARTS=2)
+class StallWatchdogTests(TestCase):
+    def setUp(self):
+        self.primary, self.hedge = [
+            create_llm_model(name, name='Shared', model_name='shared-model', stream_idle_timeout=0.2)
+            for name in ('slow-provider', 'hedge-provider')
+        ]
+        self.agent = create_agent(self.primary)
+        # The hedge answers first and then stalls, its restart streams normally
+        self.clients = {
+            self.primary.id: [ScriptedStreamClient(first_chunk_delay=1.0)],
+            self.hedge.id: [ScriptedStreamClient(stall=True), ScriptedStreamClient()],
+        }
+        self.metrics = mock.MagicMock()
+        self.recorder = mock.MagicMock()
+        for target, value in (
+            ('tasks.agent_dispatcher.build_llm_client',
+             mock.MagicMock(side_effect=lambda llm_model, *args, **kwargs: self.clients[llm_model.id].pop(0))),
+            ('tasks.agent_dispatcher.rate_limiter', mock.MagicMock()),
+            ('tasks.agent_dispatcher.hedge_budget', mock.MagicMock(**{'try_spend.return_value': True})),
+            ('tasks.agent_dispatcher.metrics', self.metrics),
+            ('tasks.agent_dispatcher.JudgementQuorum', mock.MagicMock(**{'return_value.is_cancelled.return_value': False})),
+            ('tasks.agent_dispatcher.model_router', mock.MagicMock(
+                rank=lambda llm_model, alternates: [llm_model, *alternates], **{'hedge_delay.return_value': 0.05}
+            )),
+            *((f'tasks.agent_dispatcher.{name}', mock.MagicMock()) for name in (
+                'record_agent_vote', 'record_llm_call', 'record_llm_error', 'record_prompt_cache'
+            )),
+            ('apps.agents.recorder.run_recorder', self.recorder),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_stalled_hedge_is_restarted_and_counted_against_its_provider(self):
+        published = []
+
+        async def publish(message):
+            published.append(message)
+
+        result = asyncio.run(judge_with_agent(self.agent, [self.hedge], 'session', 'request', 'judge this', publish))
+
+        self.assertEqual(result['status'], 'success')
+        statuses = [message['status'] for message in published]
+        self.assertIn('restarted', statuses)
+        self.assertEqual(statuses[-1], 'completed')
+        self.assertEqual(published[-1]['decision'], 'POSITIVE')
+        self.metrics.incr.assert_any_call('llm_stream_stalls_total', model='shared-model', provider='hedge-provider')
+        # The run is recorded against the hedge that served it, not the agent's model
+        self.assertEqual(self.recorder.finish.call_args.kwargs['response_data']['model_id'], str(self.hedge.id))
+
+
+class PromptPrefixTests(TestCase):
+    def setUp(self):
+        self.llm_model = create_llm_model('prompts', provider_type='anthropic')
+
+    def agent(self, template, cache_prompt_prefix=True):
+        return Agent(
+            name='judge',
+            llm_model=self.llm_model,
+            system_prompt='You are a judge.',
+            user_prompt_template=template,
+            cache_prompt_prefix=cache_prompt_prefix
+        )
+
+    def test_template_is_used_as_is_without_the_option(self):
+        agent = self.agent('Request: {user_request}\nAnswer with a decision tag.', cache_prompt_prefix=False)
+        self.assertEqual(agent.build_prompts('x'), ('You are a judge.', 'Request: x\nAnswer with a decision tag.'))
+
+    def test_static_suffix_moves_into_the_system_prompt(self):
+        agent = self.agent('Request: {user_request!r:>5}\n\nAnswer with {{decision}} tags. {unknown}Be brief.')
+        system_prompt, user_prompt = agent.build_prompts('x')
+        self.assertEqual(system_prompt, 'You are a judge.\n\nBe brief.')
+        # Literal braces, conversions and format specs survive the rebuilt template, unknown fields are blank
+        self.assertEqual(user_prompt, "Request:   'x'\n\nAnswer with {decision} tags. ")
+
+    def test_templates_without_a_static_suffix_are_unchanged(self):
+        for template in ('No placeholders at all', 'Request: {user_request}'):
+            agent = self.agent(template)
+            self.assertEqual(agent.build_prompts('x'), ('You are a judge.', template.format(user_request='x')))
+
+    def test_provider_keeps_its_prompt_cache_default(self):
+        for cache_prompt_prefix in (True, False):
+            agent = self.agent('Request: {user_request}', cache_prompt_prefix=cache_prompt_prefix)
+            self.assertTrue(build_llm_client(agent.llm_model, agent.get_llm_parameters()).cache_prompt)
+        self.assertFalse(build_llm_client(self.llm_model, {}, cache_prompt=False).cache_prompt)
+
+    @mock.patch('utils.llm_stats.redis_client')
+    def test_cache_stats_are_zero_when_redis_fails(self, redis_client):
+        redis_client.client.hgetall.side_effect = ConnectionError('refused')
+        stats = prompt_cache_stats('agent')
+        self.assertEqual((stats['requests'], stats['hit_rate']), (0, 0.0))
+
+
+class DecidingStreamClient:
+    def __init__(self):
+        self.usage = {}
+
+    async def stream_chat(self, system_prompt, user_prompt, **kwargs):
+        decision = 'NEGATIVE' if 'bad' in user_prompt else 'POSITIVE'
+        yield f'<decision>{decision}</decision>'
+        self.usage = {'input_tokens': 10, 'output_tokens': 4}
+
+
+class BulkJudgeTests(TestCase):
+    def setUp(self):
+        llm_model = create_llm_model('bulk')
+        for i in range(3):
+            create_agent(llm_model, name=f'judge {i}')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.input_path = os.path.join(self.directory.name, 'requests.jsonl')
+        for target, value in (
+            ('apps.agents.management.commands.bulk_judge.build_llm_client',
+             mock.MagicMock(side_effect=lambda *args, **kwargs: DecidingStreamClient())),
+            ('apps.agents.management.commands.bulk_judge.rate_limiter', mock.MagicMock()),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_malformed_lines_are_skipped_and_counted(self):
+        with open(self.input_path, 'w') as f:
+            f.write('{"request_id": "r1", "request": "a good request"}\n')
+            f.write('{"request_id": "r2", "request": \n')
+            f.write('["not", "an", "object"]\n')
+            f.write('{"request_id": "r3", "request": "a bad request"}\n')
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        call_command('bulk_judge', self.input_path, '--no-early-quorum', stdout=stdout, stderr=stderr)
+
+        with open(f'{self.input_path}.results.jsonl') as f:
+            results = {result['request_id']: result for result in map(json.loads, f)}
+        self.assertEqual(set(results), {'r1', 'r3'})
+        self.assertEqual(results['r1']['verdict'], 'POSITIVE')
+        self.assertEqual(results['r3']['verdict'], 'NEGATIVE')
+        self.assertEqual(len(results['r3']['agents']), 3)
+        self.assertIn('Malformed lines skipped: 2', stdout.getvalue())
+        self.assertIn('line 2', stderr.getvalue())
+        self.assertIn('line 3', stderr.getvalue())
+
+    def test_provider_clients_share_pooled_connections(self):
+        async def create_clients():
+            first = OpenAIProvider(api_key='test-key', model='fake-model')
+            second = OpenAIProvider(api_key='test-key', model='fake-model')
+            return first.client._client, second.client._client
+
+        first, second = asyncio.run(closing_http_clients(create_clients()))
+        self.assertIs(first, second)
+        self.assertTrue(first.is_closed)
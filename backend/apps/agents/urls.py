@@ -0,0 +1,12 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from . import views
+
+router = DefaultRouter()
+router.register(r'agents', views.AgentViewSet)
+router.register(r'runs', views.AgentRunViewSet)
+router.register(r'stats', views.AgentStatsRollupViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
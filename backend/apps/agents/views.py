@@ -1,13 +1,26 @@
 """
 API views for Agent management.
 """
+import csv
+from datetime import datetime, time
+from itertools import islice
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Agent, AgentRun
-from .serializers import AgentSerializer, AgentRunSerializer
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Agent, AgentRun, AgentStatsRollup
+from .serializers import AgentSerializer, AgentRunSerializer, AgentStatsRollupSerializer
+from utils.llm_stats import prompt_cache_stats
+from utils.pagination import KeysetPagination
+from utils.renderers import FastJSONRenderer, json_dumps
 
 class AgentViewSet(viewsets.ModelViewSet):
     """
@@ -40,6 +53,18 @@ class AgentViewSet(viewsets.ModelViewSet):
             'id': agent.id,
             'is_active': agent.is_active
         })
+    
+    @action(detail=True)
+    def prompt_cache(self, request, pk=None):
+        """
+        Get provider prompt cache hit statistics for an agent.
+        """
+        agent = self.get_object()
+        return Response({
+            'id': agent.id,
+            'cache_prompt_prefix': agent.cache_prompt_prefix,
+            **prompt_cache_stats(agent.id)
+        })
 
 class AgentRunViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -48,12 +73,18 @@ class AgentRunViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = AgentRun.objects.all()
     serializer_class = AgentRunSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_field = 'started_at'
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     
     def get_queryset(self):
         """
         Optionally filter runs by session_id or agent.
         """
-        queryset = AgentRun.objects.all()
+        queryset = AgentRun.objects.select_related('agent').only(
+            'id', 'agent', 'agent__name', 'session_id', 'request_id', 'request_data',
+            'response_data', 'error', 'started_at', 'completed_at'
+        )
         
         session_id = self.request.query_params.get('session_id', None)
         if session_id:
@@ -65,6 +96,11 @@ class AgentRunViewSet(viewsets.ReadOnlyModelViewSet):
             
         return queryset
     
+    def list(self, request, *args, **kwargs):
+        queryset = AgentRunSerializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(AgentRunSerializer.from_values(page))
+    
     @action(detail=False)
     def by_session(self, request):
         """
@@ -77,6 +113,139 @@ class AgentRunViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        runs = self.get_queryset().filter(session_id=session_id)
-        serializer = self.get_serializer(runs, many=True)
-        return Response(serializer.data)
+        runs = AgentRunSerializer.values(self.get_queryset().filter(session_id=session_id))
+        return Response(AgentRunSerializer.from_values(runs))
+    
+    @action(detail=False)
+    def export(self, request):
+        """
+        Stream runs as NDJSON (default) or CSV with ``?output=csv``.
+        
+        Accepts the session_id and agent_id filters, plus started_after and
+        started_before as ISO dates or datetimes. Rows are read through a
+        server-side cursor and written as they are read, so memory use does
+        not depend on the size of the export.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            return Response(
+                {'error': 'output must be ndjson or csv'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = self.get_queryset()
+        for param, lookup in (('started_after', 'started_at__gte'), ('started_before', 'started_at__lt')):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            parsed = _parse_bound(value)
+            if parsed is None:
+                return Response(
+                    {'error': f'{param} must be an ISO date or datetime'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = queryset.filter(**{lookup: parsed})
+        
+        rows = AgentRunSerializer.values(queryset.order_by('started_at', 'id')).iterator(
+            chunk_size=settings.AGENT_RUN_EXPORT_CHUNK_SIZE
+        )
+        runs = (run for chunk in map(AgentRunSerializer.from_values, _chunked(rows)) for run in chunk)
+        
+        if output == 'csv':
+            content, content_type = _csv_lines(runs), 'text/csv'
+        else:
+            content, content_type = (json_dumps(run) + b'\n' for run in runs), 'application/x-ndjson'
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="agent_runs.{output}"'
+        return response
+
+
+class AgentStatsRollupViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet for viewing hourly and daily agent performance rollups.
+    """
+    queryset = AgentStatsRollup.objects.all()
+    serializer_class = AgentStatsRollupSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_field = 'bucket_start'
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    
+    def get_queryset(self):
+        """
+        Filter rollups by period (hour by default), agent_id, model_id and
+        a since/until bucket range given as ISO dates or datetimes.
+        """
+        queryset = AgentStatsRollup.objects.select_related('agent').filter(
+            period=self.request.query_params.get('period', 'hour')
+        )
+        
+        agent_id = self.request.query_params.get('agent_id', None)
+        if agent_id:
+            queryset = queryset.filter(agent_id=agent_id)
+            
+        model_id = self.request.query_params.get('model_id', None)
+        if model_id:
+            queryset = queryset.filter(llm_model_id=model_id)
+        
+        for param, lookup in (('since', 'bucket_start__gte'), ('until', 'bucket_start__lt')):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            parsed = _parse_bound(value)
+            if parsed is None:
+                raise ValidationError({param: 'Must be an ISO date or datetime'})
+            queryset = queryset.filter(**{lookup: parsed})
+            
+        return queryset
+
+
+EXPORT_CSV_COLUMNS = (
+    'id', 'agent', 'agent_name', 'session_id', 'request_id', 'request_data',
+    'response_data', 'error', 'started_at', 'completed_at'
+)
+
+
+def _parse_bound(value: str):
+    """Parse an ISO date or datetime into an aware datetime."""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _chunked(rows, size: int = 500):
+    """Group an iterator into lists without materialising it."""
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Echo:
+    """File-like object that returns what is written, for streaming csv.writer output."""
+    
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json_dumps(value).decode()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_lines(runs):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_CSV_COLUMNS)
+    for run in runs:
+        yield writer.writerow([_csv_value(run[column]) for column in EXPORT_CSV_COLUMNS])
@@ -0,0 +1,87 @@
+"""
+Django management command to compare single and bulk vote ingestion throughput.
+"""
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.core.models import Task
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure votes per second through the single vote and bulk vote endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=200, help='Tasks per endpoint')
+        parser.add_argument('--voters', type=int, default=5, help='Voters per task')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Votes per bulk request')
+
+    def create_tasks(self, count: int, voters: list) -> list:
+        """Create processing tasks without sending post_save, so no distribution is dispatched."""
+        return Task.objects.bulk_create([
+            Task(
+                request_id=f'benchmark-{uuid.uuid4()}',
+                status='processing',
+                original_request='Benchmark request',
+                generated_content='Benchmark content',
+                voters=voters
+            )
+            for _ in range(count)
+        ])
+
+    def votes(self, tasks: list, voters: list) -> list:
+        return [
+            {'request_id': task.request_id, 'voter_id': voter, 'result': 'pass' if i % 3 else 'fail'}
+            for task in tasks
+            for i, voter in enumerate(voters)
+        ]
+
+    def report(self, name: str, count: int, elapsed: float) -> float:
+        rate = count / elapsed if elapsed else 0.0
+        self.stdout.write(f"{name:<8} {count} votes in {elapsed:.2f}s: {rate:.0f} votes/s")
+        return rate
+
+    def run(self, client: APIClient, options) -> None:
+        voters = [f'voter-{i}' for i in range(options['voters'])]
+
+        votes = self.votes(self.create_tasks(options['tasks'], voters), voters)
+        started = time.perf_counter()
+        for vote in votes:
+            response = client.post(
+                reverse('task-vote', kwargs={'request_id': vote['request_id']}),
+                {'voter_id': vote['voter_id'], 'result': vote['result']},
+                format='json'
+            )
+            assert response.status_code == 201, response.content
+        single = self.report('single', len(votes), time.perf_counter() - started)
+
+        votes = self.votes(self.create_tasks(options['tasks'], voters), voters)
+        started = time.perf_counter()
+        for i in range(0, len(votes), options['batch_size']):
+            response = client.post(reverse('task-bulk-vote'), votes[i:i + options['batch_size']], format='json')
+            assert response.status_code == 201, response.content
+        bulk = self.report('bulk', len(votes), time.perf_counter() - started)
+
+        if single:
+            self.stdout.write(self.style.SUCCESS(f"Bulk ingestion is {bulk / single:.1f}x faster"))
+
+    def handle(self, *args, **options):
+        client = APIClient(SERVER_NAME='localhost')
+        try:
+            # Everything created by the benchmark is rolled back
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(username=f'benchmark-{uuid.uuid4()}')
+                client.force_authenticate(user)
+                self.run(client, options)
+                raise Rollback
+        except Rollback:
+            pass
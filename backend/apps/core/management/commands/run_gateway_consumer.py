@@ -5,6 +5,7 @@ import logging
 import os
 from tasks.agent_dispatcher import process_request
 from utils.redis_channels import RedisChannels
+from utils.tracing import span
 from config.celery import app
 
 logger = logging.getLogger(__name__)
@@ -54,11 +55,12 @@ class Command(BaseCommand):
                         logger.info(f'Received message on channel {channel}')
                         # self.stdout.write(f'Message data: {json.dumps(data, indent=2)}')
                         
-                        # Queue celery task
-                        process_request.delay(
-                            session_id=session_id,
-                            message=data
-                        )
+                        # Queue celery task, the trace context travels in its headers
+                        with span('consumer.dispatch', data.get('traceparent'), session_id=session_id):
+                            process_request.delay(
+                                session_id=session_id,
+                                message=data
+                            )
                         
                         self.stdout.write(f'Queued task for session {session_id}')
                         
@@ -0,0 +1,67 @@
+"""
+Django management command printing per-hop latency percentiles from exported traces.
+"""
+import json
+from collections import defaultdict
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+END_TO_END = 'end_to_end'
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    index = min(len(values) - 1, int(len(values) * pct / 100))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = 'Print latency percentiles per span name from TRACE_EXPORT_PATH files of the gateway and backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='JSON lines trace files')
+        parser.add_argument('--percentiles', default='50,90,99', help='Comma separated percentiles')
+
+    def load(self, paths: List[str]) -> Dict[str, List[Dict]]:
+        traces = defaultdict(list)
+        for path in paths:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        if line.strip():
+                            span = json.loads(line)
+                            traces[span['trace_id']].append(span)
+            except OSError as e:
+                raise CommandError(f"Cannot read {path}: {e}")
+        return traces
+
+    def handle(self, *args, **options):
+        percentiles = [float(pct) for pct in options['percentiles'].split(',')]
+        traces = self.load(options['paths'])
+        if not traces:
+            self.stdout.write("No spans found")
+            return
+
+        durations = defaultdict(list)
+        # Offset of each span from its trace start, to list hops in request order
+        offsets = defaultdict(list)
+        for spans in traces.values():
+            trace_start = min(span['start'] for span in spans)
+            trace_end = max(span['start'] + span['duration_ms'] / 1000 for span in spans)
+            durations[END_TO_END].append((trace_end - trace_start) * 1000)
+            offsets[END_TO_END].append(0)
+            for span in spans:
+                durations[span['name']].append(span['duration_ms'])
+                offsets[span['name']].append(span['start'] - trace_start)
+
+        names = sorted(durations, key=lambda name: sum(offsets[name]) / len(offsets[name]))
+        width = max(len(name) for name in names)
+        header = f"{'span':<{width}} {'count':>7} " + ' '.join(f"{'p' + format(pct, 'g'):>9}" for pct in percentiles)
+        self.stdout.write(f"{len(traces)} traces")
+        self.stdout.write(header + f" {'max':>9}")
+        for name in names:
+            values = sorted(durations[name])
+            columns = ' '.join(f"{percentile(values, pct):>9.1f}" for pct in percentiles)
+            self.stdout.write(f"{name:<{width}} {len(values):>7} {columns} {values[-1]:>9.1f}")
+        self.stdout.write("Durations in milliseconds")
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="core_task_created_a73452_idx"
+            ),
+        ),
+    ]
@@ -25,6 +25,8 @@ class Task(models.Model):
             models.Index(fields=['request_id']),
             models.Index(fields=['status']),
             models.Index(fields=['created_at']),
+            # Keyset pagination order
+            models.Index(fields=['-created_at', '-id']),
         ]
 
     def __str__(self):
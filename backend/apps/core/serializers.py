@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from rest_framework import serializers
 from .models import Task, Vote
 
@@ -17,3 +19,88 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = ['id', 'request_id', 'status', 'original_request', 
                  'generated_content', 'voters', 'votes', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+
+    @classmethod
+    def values(cls, queryset):
+        """Restrict a task queryset to the serialized columns for list endpoints."""
+        return queryset.values(
+            'id', 'request_id', 'status', 'original_request', 'generated_content',
+            'voters', 'created_at', 'updated_at'
+        )
+
+    @classmethod
+    def from_values(cls, rows):
+        """
+        Build the serialized representation from rows of ``values()``,
+        loading the votes of every task with a single query.
+        """
+        votes = defaultdict(list)
+        vote_rows = Vote.objects.filter(task_id__in=[row['id'] for row in rows]).values(
+            'task_id', 'id', 'voter_id', 'result', 'reason', 'created_at'
+        )
+        for vote in vote_rows:
+            task_id = vote.pop('task_id')
+            votes[task_id].append(vote)
+        return [{
+            'id': row['id'],
+            'request_id': row['request_id'],
+            'status': row['status'],
+            'original_request': row['original_request'],
+            'generated_content': row['generated_content'],
+            'voters': row['voters'],
+            'votes': votes[row['id']],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        } for row in rows]
+
+
+class BulkVoteListSerializer(serializers.ListSerializer):
+    """
+    Validates a batch of votes together: the tasks of the batch are loaded
+    with one query and the votes are inserted with one ``bulk_create``.
+    """
+
+    def to_internal_value(self, data):
+        # Errors are reported per vote, in the same shape as field errors
+        attrs = super().to_internal_value(data)
+        request_ids = {vote['request_id'] for vote in attrs}
+        tasks = Task.objects.only('id', 'request_id', 'status', 'voters').in_bulk(request_ids, field_name='request_id')
+
+        errors, seen = [], set()
+        for vote in attrs:
+            task = tasks.get(vote['request_id'])
+            key = (vote['request_id'], vote['voter_id'])
+            if task is None:
+                errors.append({'request_id': 'Task not found'})
+            elif task.status != 'processing':
+                errors.append({'request_id': 'Only allowed for tasks with status "processing"'})
+            elif key in seen:
+                errors.append({'voter_id': 'Duplicate vote in this batch'})
+            else:
+                errors.append({})
+                vote['task'] = task
+            seen.add(key)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        votes = [
+            Vote(task=vote['task'], voter_id=vote['voter_id'], result=vote['result'], reason=vote.get('reason', ''))
+            for vote in validated_data
+        ]
+        # Votes already stored for a voter are skipped rather than failing the batch
+        Vote.objects.bulk_create(votes, batch_size=1000, ignore_conflicts=True)
+        # Ids are generated here, so the skipped votes are the ones whose id was not stored
+        inserted = set(Vote.objects.filter(id__in=[vote.id for vote in votes]).values_list('id', flat=True))
+        return [vote for vote in votes if vote.id in inserted]
+
+
+class BulkVoteSerializer(serializers.Serializer):
+    request_id = serializers.CharField(max_length=255)
+    voter_id = serializers.CharField(max_length=255)
+    result = serializers.ChoiceField(choices=Vote.RESULT_CHOICES)
+    reason = serializers.CharField(required=False, allow_blank=True, default='')
+
+    class Meta:
+        list_serializer_class = BulkVoteListSerializer
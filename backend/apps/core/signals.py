@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import Task, Vote
+from .tally import record_vote
 from .tasks import distribute_task_to_voters, aggregate_voting_results
 
 
@@ -19,7 +20,7 @@ def handle_vote_creation(sender, instance, created, **kwargs):
     Check if results aggregation is needed when a new vote is created
     """
     if created:
-        task = instance.task
-        vote_count = task.votes.count()
-        if vote_count == len(task.voters):
-            aggregate_voting_results.delay(str(task.id))
+        # The Redis tally reports completion to exactly one vote of the task
+        counts = record_vote(instance)
+        if counts is not None:
+            aggregate_voting_results.delay(str(instance.task_id), counts['pass'], counts['fail'])
@@ -0,0 +1,139 @@
+"""
+Atomic per-task vote tally in Redis.
+
+Counting votes in Redis lets every vote be recorded without locking the task
+row, and the completion check inside the same script guarantees that exactly
+one vote triggers the aggregation of a task.
+"""
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db.models import Count
+
+from utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+VOTE_TALLY_KEY = "core:tally:{task_id}"
+VOTE_VOTERS_KEY = "core:tally:{task_id}:voters"
+
+# KEYS[1] = tally hash, KEYS[2] = set of voters already counted
+# ARGV[1] = expected votes, ARGV[2] = ttl, ARGV[3..] = voter id, result pairs
+# Returns {pass, fail, completed_by_these_votes}, or false if the tally needs seeding
+RECORD_VOTES_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+for i = 3, #ARGV, 2 do
+    if redis.call('SADD', KEYS[2], ARGV[i]) == 1 then
+        redis.call('HINCRBY', KEYS[1], ARGV[i + 1], 1)
+    end
+end
+local pass = tonumber(redis.call('HGET', KEYS[1], 'pass') or '0')
+local fail = tonumber(redis.call('HGET', KEYS[1], 'fail') or '0')
+local completed = 0
+if pass + fail >= tonumber(ARGV[1]) and redis.call('HSETNX', KEYS[1], 'completed', 1) == 1 then
+    completed = 1
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[2]))
+return {pass, fail, completed}
+"""
+
+# KEYS[1] = tally hash, KEYS[2] = voters set
+# ARGV[1] = pass, ARGV[2] = fail, ARGV[3] = ttl, ARGV[4..] = voter ids
+# Seeds the tally from the database only if no other worker did it first
+SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'pass', ARGV[1], 'fail', ARGV[2])
+for i = 4, #ARGV do
+    redis.call('SADD', KEYS[2], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[3]))
+return 1
+"""
+
+
+def count_votes(task) -> Dict[str, int]:
+    """Count a task's votes by result with a single grouped query."""
+    counts = {'pass': 0, 'fail': 0}
+    for row in task.votes.order_by().values('result').annotate(count=Count('id')):
+        counts[row['result']] = row['count']
+    return counts
+
+
+class VoteTally:
+    """
+    Redis tally of the votes of one task.
+    """
+
+    def __init__(self, task, client=None, ttl: int = 7 * 24 * 3600):
+        self.task = task
+        self.client = client or redis_client.client
+        self.ttl = ttl
+        self.tally_key = VOTE_TALLY_KEY.format(task_id=task.id)
+        self.voters_key = VOTE_VOTERS_KEY.format(task_id=task.id)
+        self._record_votes = self.client.register_script(RECORD_VOTES_SCRIPT)
+        self._seed = self.client.register_script(SEED_SCRIPT)
+
+    def seed(self) -> None:
+        """Initialise the tally from the votes already stored for the task."""
+        counts = count_votes(self.task)
+        voter_ids = list(self.task.votes.values_list('voter_id', flat=True))
+        self._seed(
+            keys=[self.tally_key, self.voters_key],
+            args=[counts['pass'], counts['fail'], self.ttl, *voter_ids]
+        )
+
+    def record(self, votes: Iterable[Tuple[str, str]]) -> Tuple[int, int, bool]:
+        """
+        Count stored votes. Voters already counted are ignored.
+
+        Args:
+            votes: (voter_id, result) pairs
+
+        Returns:
+            Tuple of (pass votes, fail votes, whether these votes completed the task)
+        """
+        args = [len(self.task.voters or []), self.ttl]
+        for voter_id, result in votes:
+            args.extend([voter_id, result])
+        outcome = self._record_votes(keys=[self.tally_key, self.voters_key], args=args)
+        if not outcome:
+            self.seed()
+            outcome = self._record_votes(keys=[self.tally_key, self.voters_key], args=args)
+        pass_votes, fail_votes, completed = (int(value) for value in outcome)
+        return pass_votes, fail_votes, bool(completed)
+
+
+def record_votes(task, votes) -> Optional[Dict[str, int]]:
+    """
+    Count newly stored votes of a task.
+
+    Returns:
+        The final counts if these votes completed the task, otherwise None.
+        When Redis is unavailable the completion is checked in the database.
+    """
+    if not task.voters:
+        return None
+    try:
+        pass_votes, fail_votes, completed = VoteTally(task).record(
+            (vote.voter_id, vote.result) for vote in votes
+        )
+    except Exception as e:
+        logger.error(f"Error recording vote tally for task {task.id}: {str(e)}")
+        counts = count_votes(task)
+        if sum(counts.values()) == len(task.voters):
+            return counts
+        return None
+    if completed:
+        return {'pass': pass_votes, 'fail': fail_votes}
+    return None
+
+
+def record_vote(vote) -> Optional[Dict[str, int]]:
+    """Count a newly stored vote, see record_votes."""
+    return record_votes(vote.task, [vote])
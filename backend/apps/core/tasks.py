@@ -1,6 +1,7 @@
 from celery import shared_task
-from django.db import transaction
+from django.utils import timezone
 from .models import Task
+from .tally import count_votes
 
 
 @shared_task
@@ -28,36 +29,33 @@ def distribute_task_to_voters(task_id):
 
 
 @shared_task
-def aggregate_voting_results(task_id):
+def aggregate_voting_results(task_id, pass_votes=None, fail_votes=None):
     """
     Aggregate voting results
+    
+    The counts are passed in when the Redis vote tally already has them,
+    otherwise they are read with a single grouped query.
     """
     try:
-        with transaction.atomic():
-            task = Task.objects.select_for_update().get(id=task_id)
-            votes = task.votes.all()
-            
-            # Calculate voting results
-            pass_votes = votes.filter(result='pass').count()
-            fail_votes = votes.filter(result='fail').count()
-            
-            # Determine final result based on minority obeying majority principle
-            total_votes = pass_votes + fail_votes
-            if total_votes > 0:
-                if fail_votes > pass_votes:
-                    task.status = 'failed'
-                else:
-                    task.status = 'completed'
-                task.save()
-            
-            # TODO: Notify result through WebSocket gateway
-            
-            return {
-                'task_id': str(task.id),
-                'status': task.status,
-                'pass_votes': pass_votes,
-                'fail_votes': fail_votes
-            }
+        task = Task.objects.get(id=task_id)
+        if pass_votes is None or fail_votes is None:
+            counts = count_votes(task)
+            pass_votes, fail_votes = counts['pass'], counts['fail']
+        
+        # Determine final result based on minority obeying majority principle
+        total_votes = pass_votes + fail_votes
+        if total_votes > 0:
+            task.status = 'failed' if fail_votes > pass_votes else 'completed'
+            Task.objects.filter(id=task.id).update(status=task.status, updated_at=timezone.now())
+        
+        # TODO: Notify result through WebSocket gateway
+        
+        return {
+            'task_id': str(task.id),
+            'status': task.status,
+            'pass_votes': pass_votes,
+            'fail_votes': fail_votes
+        }
     except Task.DoesNotExist:
         return None
     except Exception as e:
@@ -1,8 +1,25 @@
+import os
+import tempfile
+import zlib
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import fakeredis
+import magi_spans as spans
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from kombu.serialization import dumps, loads, prepare_accept_content
+from config.celery import celeryconfig, serialization
 from .models import Task, Vote
+from utils import tracing
+from .tally import count_votes
+from .tasks import aggregate_voting_results
 
 
 class TaskModelTests(TestCase):
@@ -84,3 +101,202 @@ class TaskAPITests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['task']['request_id'], task.request_id)
+
+
+class VoteTallyTests(TestCase):
+    def setUp(self):
+        with mock.patch('apps.core.signals.distribute_task_to_voters'):
+            self.task = Task.objects.create(
+                request_id='test-request-1',
+                original_request='Test Request',
+                generated_content='Test Content',
+                voters=['voter1', 'voter2']
+            )
+
+    def test_count_votes(self):
+        Vote.objects.bulk_create([
+            Vote(task=self.task, voter_id='voter1', result='pass'),
+            Vote(task=self.task, voter_id='voter2', result='fail'),
+        ])
+        self.assertEqual(count_votes(self.task), {'pass': 1, 'fail': 1})
+
+    def test_aggregation_without_votes_reports_the_task(self):
+        self.assertEqual(aggregate_voting_results(str(self.task.id)), {
+            'task_id': str(self.task.id),
+            'status': 'pending',
+            'pass_votes': 0,
+            'fail_votes': 0
+        })
+
+    @mock.patch('apps.core.signals.aggregate_voting_results')
+    @mock.patch('apps.core.tally.VoteTally.record', side_effect=ConnectionError)
+    def test_completion_falls_back_to_database(self, record, aggregate):
+        Vote.objects.create(task=self.task, voter_id='voter1', result='pass')
+        aggregate.delay.assert_not_called()
+        Vote.objects.create(task=self.task, voter_id='voter2', result='pass')
+        aggregate.delay.assert_called_once_with(str(self.task.id), 2, 0)
+
+
+class BulkVoteAPITests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(get_user_model().objects.create_user(username='voter'))
+        self.tasks = Task.objects.bulk_create([
+            Task(
+                request_id=f'test-request-{i}',
+                status='processing',
+                original_request='Test Request',
+                generated_content='Test Content',
+                voters=['voter1', 'voter2']
+            )
+            for i in range(2)
+        ])
+
+    @mock.patch('apps.core.views.aggregate_voting_results')
+    @mock.patch('apps.core.tally.VoteTally.record', side_effect=ConnectionError)
+    def test_bulk_vote(self, record, aggregate):
+        Vote.objects.create(task=self.tasks[1], voter_id='voter1', result='fail')
+        votes = [
+            {'request_id': 'test-request-0', 'voter_id': 'voter1', 'result': 'pass'},
+            {'request_id': 'test-request-0', 'voter_id': 'voter2', 'result': 'fail'},
+            {'request_id': 'test-request-1', 'voter_id': 'voter1', 'result': 'pass'},
+        ]
+        response = self.client.post(reverse('task-bulk-vote'), votes, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['completed_tasks'], ['test-request-0'])
+        self.assertEqual(response.data['received'], 2)
+        # The existing vote of voter1 on the second task is kept
+        self.assertEqual(Vote.objects.get(task=self.tasks[1]).result, 'fail')
+        aggregate.delay.assert_called_once_with(str(self.tasks[0].id), 1, 1)
+
+    @mock.patch('apps.core.views.aggregate_voting_results')
+    def test_bulk_vote_tally_completes_each_task_once(self, aggregate):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        with mock.patch('apps.core.tally.redis_client', SimpleNamespace(client=redis)):
+            first = [
+                {'request_id': 'test-request-0', 'voter_id': 'voter1', 'result': 'pass'},
+                {'request_id': 'test-request-0', 'voter_id': 'voter2', 'result': 'pass'},
+                {'request_id': 'test-request-1', 'voter_id': 'voter1', 'result': 'fail'},
+            ]
+            response = self.client.post(reverse('task-bulk-vote'), first, format='json')
+            self.assertEqual(response.data, {'received': 3, 'completed_tasks': ['test-request-0']})
+
+            # A repeated vote is neither stored nor counted again
+            second = [
+                {'request_id': 'test-request-0', 'voter_id': 'voter2', 'result': 'fail'},
+                {'request_id': 'test-request-1', 'voter_id': 'voter2', 'result': 'pass'},
+            ]
+            response = self.client.post(reverse('task-bulk-vote'), second, format='json')
+            self.assertEqual(response.data, {'received': 1, 'completed_tasks': ['test-request-1']})
+
+        self.assertEqual(aggregate.delay.call_args_list, [
+            mock.call(str(self.tasks[0].id), 2, 0),
+            mock.call(str(self.tasks[1].id), 1, 1),
+        ])
+        self.assertEqual(redis.hget(f'core:tally:{self.tasks[0].id}', 'pass'), '2')
+
+    def test_bulk_vote_is_validated_together(self):
+        votes = [
+            {'request_id': 'test-request-0', 'voter_id': 'voter1', 'result': 'pass'},
+            {'request_id': 'test-request-0', 'voter_id': 'voter1', 'result': 'pass'},
+            {'request_id': 'missing', 'voter_id': 'voter1', 'result': 'pass'},
+        ]
+        response = self.client.post(reverse('task-bulk-vote'), votes, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('voter_id', response.data[1])
+        self.assertIn('request_id', response.data[2])
+        self.assertEqual(Vote.objects.count(), 0)
+
+
+class TraceReportTests(TestCase):
+    def test_spans_are_exported_and_reported(self):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        exporter = tracing.SpanExporter(path)
+        root = tracing.SpanContext('a' * 32, 'b' * 16)
+
+        with mock.patch.object(spans, 'get_exporter', return_value=exporter):
+            with tracing.span('consumer.dispatch', root.traceparent) as dispatch:
+                self.assertEqual(tracing.current_traceparent(), dispatch.context.traceparent)
+                tracing.record_span('celery.queue_wait', 100.0, 100.25)
+            self.assertIsNone(tracing.current_traceparent())
+            # Untraced requests record nothing
+            with tracing.span('consumer.dispatch', None) as untraced:
+                self.assertIsNone(untraced)
+        exporter.flush()
+
+        out = StringIO()
+        call_command('trace_report', path, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], '1 traces')
+        queue_wait = next(line for line in lines if line.startswith('celery.queue_wait'))
+        self.assertEqual(queue_wait.split()[1:3], ['1', '250.0'])
+        self.assertTrue(any(line.startswith('consumer.dispatch') for line in lines))
+
+    def test_span_format(self):
+        exporter = mock.Mock(service='magi-backend')
+        with mock.patch.object(spans, 'get_exporter', return_value=exporter):
+            tracing.record_span('celery.queue_wait', 100.0, 100.25, '00-' + 'a' * 32 + '-' + 'b' * 16 + '-01',
+                                task='tasks.run_agent')
+        exported = exporter.export.call_args.args[0]
+        self.assertEqual(len(exported.pop('span_id')), 16)
+        self.assertEqual(exported, {
+            'trace_id': 'a' * 32,
+            'parent_id': 'b' * 16,
+            'name': 'celery.queue_wait',
+            'service': 'magi-backend',
+            'start': 100.0,
+            'duration_ms': 250.0,
+            'attributes': {'task': 'tasks.run_agent'},
+        })
+
+        exported['span_id'] = 'c' * 16
+        otlp = tracing.to_otlp([exported], 'magi-backend')['resourceSpans'][0]
+        self.assertEqual(otlp['resource']['attributes'][0]['value']['stringValue'], 'magi-backend')
+        self.assertEqual(otlp['scopeSpans'][0]['spans'], [{
+            'traceId': 'a' * 32,
+            'spanId': 'c' * 16,
+            'parentSpanId': 'b' * 16,
+            'name': 'celery.queue_wait',
+            'kind': 1,
+            'startTimeUnixNano': '100000000000',
+            'endTimeUnixNano': '100250000000',
+            'attributes': [{'key': 'task', 'value': {'stringValue': 'tasks.run_agent'}}],
+        }])
+
+
+class CompressedSerializerTests(TestCase):
+    def round_trip(self, payload):
+        content_type, encoding, body = dumps(payload, serializer=serialization.SERIALIZER_NAME)
+        self.assertEqual(content_type, serialization.CONTENT_TYPE)
+        return body, loads(body, content_type, encoding, accept=prepare_accept_content(celeryconfig.accept_content))
+
+    def test_small_bodies_are_sent_plain(self):
+        payload = {'args': ['session', 'request'], 'kwargs': {}}
+        body, decoded = self.round_trip(payload)
+        self.assertEqual(body[:1], serialization.PLAIN)
+        self.assertEqual(decoded, payload)
+
+    def test_large_bodies_are_compressed(self):
+        payload = {'request': 'judge this ' * 1000}
+        body, decoded = self.round_trip(payload)
+        self.assertIn(body[:1], (serialization.ZLIB, serialization.ZSTD))
+        self.assertLess(len(body), 1000)
+        self.assertEqual(decoded, payload)
+
+    def test_zlib_bodies_decode_whatever_the_local_compressor(self):
+        body = serialization.ZLIB + zlib.compress(b'{"a": 1}')
+        self.assertEqual(serialization.decode(body), {'a': 1})
+        # Transports that hand back text keep the bytes as latin-1
+        self.assertEqual(serialization.decode(body.decode('latin-1')), {'a': 1})
+
+    def test_unknown_header_is_rejected(self):
+        with self.assertRaises(ValueError):
+            serialization.decode(b'\x07{}')
+
+    def test_plain_json_stays_the_default_during_rollout(self):
+        # Workers must accept the compressed format before producers send it
+        self.assertEqual(celeryconfig.task_serializer, 'json')
+        self.assertIn(serialization.SERIALIZER_NAME, celeryconfig.accept_content)
+        self.assertIn('json', celeryconfig.accept_content)
@@ -1,18 +1,34 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import BrowsableAPIRenderer
 from django.shortcuts import get_object_or_404
 from .models import Task, Vote
-from .serializers import TaskSerializer, VoteSerializer
+from .serializers import BulkVoteSerializer, TaskSerializer, VoteSerializer
+from .tally import record_votes
+from .tasks import aggregate_voting_results
+from utils.pagination import KeysetPagination
+from utils.renderers import FastJSONRenderer
 
 
 # Create your views here.
 
 class TaskViewSet(viewsets.ModelViewSet):
-    queryset = Task.objects.all()
+    queryset = Task.objects.prefetch_related('votes')
     serializer_class = TaskSerializer
     lookup_field = 'request_id'
+    pagination_class = KeysetPagination
+    keyset_field = 'created_at'
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        queryset = TaskSerializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(TaskSerializer.from_values(page))
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -34,7 +50,6 @@ class TaskViewSet(viewsets.ModelViewSet):
             )
 
         vote_data = {
-            'task': task.id,
             'voter_id': request.data.get('voter_id'),
             'result': request.data.get('result'),
             'reason': request.data.get('reason', '')
@@ -42,16 +57,37 @@ class TaskViewSet(viewsets.ModelViewSet):
 
         serializer = VoteSerializer(data=vote_data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-
-        # Check if all voters have voted
-        vote_count = task.votes.count()
-        if vote_count == len(task.voters):
-            # TODO: call aggregate_voting_results asynchronously
-            pass
+        # Aggregation is triggered by the vote tally in the post_save signal
+        serializer.save(task=task)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'], url_path='votes/bulk')
+    def bulk_vote(self, request):
+        """
+        Record a batch of votes across many tasks with one insert, then
+        aggregate every task completed by the batch once. ``received`` counts
+        the votes inserted, voters who had already voted are skipped.
+        """
+        serializer = BulkVoteSerializer(
+            data=request.data, many=True, allow_empty=False, max_length=settings.CORE_BULK_VOTE_MAX_SIZE
+        )
+        serializer.is_valid(raise_exception=True)
+        # bulk_create does not send post_save, so the tally is updated here
+        votes = serializer.save()
+
+        votes_by_task = defaultdict(list)
+        for vote in votes:
+            votes_by_task[vote.task].append(vote)
+        completed = []
+        for task, task_votes in votes_by_task.items():
+            counts = record_votes(task, task_votes)
+            if counts is not None:
+                aggregate_voting_results.delay(str(task.id), counts['pass'], counts['fail'])
+                completed.append(task.request_id)
+
+        return Response({'received': len(votes), 'completed_tasks': completed}, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['get'])
     def status(self, request, request_id=None):
         task = self.get_object()
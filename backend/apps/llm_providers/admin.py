@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import LLMProvider, LLMModel
+from .models import LLMProvider, LLMModel, LLMProbe
 
 
 @admin.register(LLMProvider)
@@ -13,8 +13,16 @@ class LLMProviderAdmin(admin.ModelAdmin):
 
 @admin.register(LLMModel)
 class LLMModelAdmin(admin.ModelAdmin):
-    list_display = ('name', 'provider', 'model_name', 'is_active', 'created_at')
-    list_filter = ('provider', 'is_active')
+    list_display = ('name', 'provider', 'model_name', 'is_active', 'is_degraded', 'created_at')
+    list_filter = ('provider', 'is_active', 'is_degraded')
     search_fields = ('name', 'model_name')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(LLMProbe)
+class LLMProbeAdmin(admin.ModelAdmin):
+    list_display = ('llm_model', 'available', 'ttft_ms', 'duration_ms', 'created_at')
+    list_filter = ('available', 'llm_model')
+    ordering = ('-created_at',)
+    readonly_fields = ('llm_model', 'available', 'ttft_ms', 'duration_ms', 'error', 'created_at')
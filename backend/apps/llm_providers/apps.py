@@ -11,3 +11,9 @@ class LLMProvidersConfig(AppConfig):
             import apps.llm_providers.signals  # noqa
         except ImportError:
             pass
+
+        # Export provider saturation alongside the Django metrics
+        from utils import metrics
+        from utils.rate_limiter import saturation_metrics
+        metrics.register_collector()
+        metrics.register_gauge_source(saturation_metrics)
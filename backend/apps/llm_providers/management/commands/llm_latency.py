@@ -0,0 +1,35 @@
+"""
+Django management command to show live per-model latency percentiles.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.llm_providers.models import LLMModel
+from utils.llm_stats import CALL_METRICS, llm_call_stats
+
+
+class Command(BaseCommand):
+    help = 'Show time-decayed TTFT, duration, throughput and error rate of active LLM models on real traffic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--percentiles', default='50,95,99', help='Comma separated percentiles')
+
+    def handle(self, *args, **options):
+        percentiles = [float(pct) for pct in options['percentiles'].split(',')]
+        models = list(LLMModel.objects.filter(is_active=True).select_related('provider').order_by('model_name'))
+        if not models:
+            self.stdout.write(self.style.WARNING("No active LLM models found"))
+            return
+
+        stats = llm_call_stats(models, percentiles)
+        for model in models:
+            model_stats = stats[str(model.id)]
+            self.stdout.write(self.style.SUCCESS(f"{model.model_name} ({model.provider.name})"))
+            self.stdout.write(
+                f"  calls {model_stats['calls']:.1f}, errors {model_stats['errors']:.1f} "
+                f"({model_stats['error_rate']:.1%})"
+            )
+            for metric in CALL_METRICS:
+                values = ', '.join(
+                    f"{name} {value if value is not None else '-'}" for name, value in model_stats[metric].items()
+                )
+                self.stdout.write(f"  {metric:<18} {values}")
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-19 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("llm_providers", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llmmodel",
+            name="max_concurrent_streams",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="llmmodel",
+            name="requests_per_minute",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="llmmodel",
+            name="tokens_per_minute",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="llmprovider",
+            name="max_concurrent_streams",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="llmprovider",
+            name="requests_per_minute",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="llmprovider",
+            name="tokens_per_minute",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-19 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("llm_providers", "0002_capacity_limits"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llmmodel",
+            name="stream_idle_timeout",
+            field=models.FloatField(
+                blank=True,
+                help_text="Idle seconds between streamed chunks before restarting. If null, uses LLM_STREAM_IDLE_TIMEOUT",
+                null=True,
+            ),
+        ),
+    ]
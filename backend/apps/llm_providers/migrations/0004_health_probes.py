@@ -0,0 +1,57 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("llm_providers", "0003_stream_idle_timeout"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="llmmodel",
+            name="is_degraded",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="llmmodel",
+            name="probe_failures",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="LLMProbe",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("available", models.BooleanField()),
+                ("ttft_ms", models.FloatField(blank=True, null=True)),
+                ("duration_ms", models.FloatField()),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "llm_model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="probes",
+                        to="llm_providers.llmmodel",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "LLM Probe",
+                "verbose_name_plural": "LLM Probes",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["llm_model", "-created_at"],
+                        name="llm_provide_llm_mod_c25b8e_idx",
+                    ),
+                    models.Index(
+                        fields=["created_at"], name="llm_provide_created_b7d7e9_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 import uuid
 from django.contrib.postgres.fields import ArrayField
@@ -21,6 +22,12 @@ class LLMProvider(models.Model):
     api_key = models.TextField()  # Will be encrypted
     is_active = models.BooleanField(default=True)
     priority = models.IntegerField(default=1)
+
+    # Capacity limits enforced cluster-wide by utils.rate_limiter, null means unlimited
+    requests_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    tokens_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    max_concurrent_streams = models.PositiveIntegerField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -53,6 +60,23 @@ class LLMModel(models.Model):
     features = models.JSONField(default=dict)  # Store model capabilities and features
     max_tokens = models.IntegerField(default=4096)
     is_active = models.BooleanField(default=True)
+
+    # Per-model capacity limits, applied in addition to the provider's limits
+    requests_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    tokens_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    max_concurrent_streams = models.PositiveIntegerField(null=True, blank=True)
+
+    # Seconds without a streamed chunk before the stream is considered stalled
+    stream_idle_timeout = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Idle seconds between streamed chunks before restarting. If null, uses LLM_STREAM_IDLE_TIMEOUT"
+    )
+
+    # Set by the health probes, dispatch avoids degraded models while an equivalent is available
+    is_degraded = models.BooleanField(default=False)
+    probe_failures = models.PositiveIntegerField(default=0)  # consecutive failed probes
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -68,3 +92,45 @@ class LLMModel(models.Model):
 
     def __str__(self):
         return f"{self.provider.name} - {self.name} ({self.model_name})"
+
+    def equivalents(self):
+        """
+        Other active, healthy models serving the same API model on active
+        providers, highest provider priority first.
+        """
+        return LLMModel.objects.filter(
+            model_name=self.model_name,
+            is_active=True,
+            is_degraded=False,
+            provider__is_active=True
+        ).exclude(id=self.id).select_related('provider').order_by('-provider__priority', '-created_at')
+
+    def get_stream_idle_timeout(self) -> float:
+        """Idle seconds allowed between streamed chunks."""
+        return self.stream_idle_timeout or settings.LLM_STREAM_IDLE_TIMEOUT
+
+
+class LLMProbe(models.Model):
+    """
+    Result of one health probe of an LLM model.
+    """
+    id = models.BigAutoField(primary_key=True)
+    llm_model = models.ForeignKey(LLMModel, on_delete=models.CASCADE, related_name='probes')
+    available = models.BooleanField()
+    ttft_ms = models.FloatField(null=True, blank=True)
+    duration_ms = models.FloatField()
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['llm_model', '-created_at']),
+            models.Index(fields=['created_at'])
+        ]
+        verbose_name = 'LLM Probe'
+        verbose_name_plural = 'LLM Probes'
+
+    def __str__(self):
+        status = 'available' if self.available else 'unavailable'
+        return f"{self.llm_model} {status} at {self.created_at}"
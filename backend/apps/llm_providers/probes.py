@@ -0,0 +1,125 @@
+"""
+Concurrent health probes of LLM models.
+
+Every model is probed with a tiny streamed request through its provider
+client, all at once, so a sweep takes about as long as the slowest probe
+(at most LLM_PROBE_TIMEOUT). Results are kept as LLMProbe history, and a model
+failing LLM_PROBE_FAILURE_THRESHOLD probes in a row is marked degraded until
+a probe succeeds again.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from llm.providers import closing_http_clients, create_provider
+from .models import LLMModel, LLMProbe
+
+logger = logging.getLogger(__name__)
+
+PROBE_SYSTEM_PROMPT = "You are a health check."
+PROBE_USER_PROMPT = "Reply with OK."
+
+
+@dataclass
+class ProbeResult:
+    llm_model: LLMModel
+    duration: float
+    ttft: Optional[float] = None
+    error: str = ''
+
+    @property
+    def available(self) -> bool:
+        return not self.error
+
+
+async def probe_model(llm_model: LLMModel, timeout: float) -> ProbeResult:
+    """Stream a minimal completion from a model, timing the first token and the whole call."""
+    started = time.perf_counter()
+    ttft = None
+    try:
+        async with asyncio.timeout(timeout):
+            provider = llm_model.provider
+            client = create_provider(
+                provider.provider_type,
+                api_key=provider.api_key,
+                model=llm_model.model_name,
+                base_url=provider.base_url
+            )
+            async for _ in client.stream_chat(
+                system_prompt=PROBE_SYSTEM_PROMPT,
+                user_prompt=PROBE_USER_PROMPT,
+                max_tokens=5,
+                temperature=0
+            ):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+        return ProbeResult(llm_model, time.perf_counter() - started, ttft)
+    except TimeoutError:
+        return ProbeResult(llm_model, time.perf_counter() - started, ttft, f"Timed out after {timeout}s")
+    except Exception as e:
+        return ProbeResult(llm_model, time.perf_counter() - started, ttft, str(e) or type(e).__name__)
+
+
+async def probe_models(llm_models: List[LLMModel], timeout: Optional[float] = None) -> List[ProbeResult]:
+    """Probe models concurrently, at most LLM_PROBE_CONCURRENCY at a time."""
+    timeout = timeout or settings.LLM_PROBE_TIMEOUT
+    slots = asyncio.Semaphore(settings.LLM_PROBE_CONCURRENCY)
+
+    async def probe(llm_model):
+        async with slots:
+            return await probe_model(llm_model, timeout)
+
+    return await asyncio.gather(*(probe(llm_model) for llm_model in llm_models))
+
+
+def record_probes(results: List[ProbeResult]) -> None:
+    """
+    Store probe results and update the degraded state of the probed models.
+    """
+    LLMProbe.objects.bulk_create([
+        LLMProbe(
+            llm_model=result.llm_model,
+            available=result.available,
+            ttft_ms=result.ttft * 1000 if result.ttft is not None else None,
+            duration_ms=result.duration * 1000,
+            error=result.error
+        )
+        for result in results
+    ])
+
+    healthy = [result.llm_model.id for result in results if result.available]
+    failed = [result.llm_model.id for result in results if not result.available]
+    if healthy:
+        LLMModel.objects.filter(id__in=healthy).update(probe_failures=0, is_degraded=False)
+    if failed:
+        LLMModel.objects.filter(id__in=failed).update(probe_failures=F('probe_failures') + 1)
+        degraded = LLMModel.objects.filter(
+            id__in=failed, is_degraded=False, probe_failures__gte=settings.LLM_PROBE_FAILURE_THRESHOLD
+        ).update(is_degraded=True)
+        if degraded:
+            logger.warning(f"Marked {degraded} LLM models degraded after failed probes")
+
+
+def run_probes(record: bool = True) -> List[ProbeResult]:
+    """Probe every active model on an active provider and optionally record the results."""
+    llm_models = list(LLMModel.objects.filter(is_active=True, provider__is_active=True).select_related('provider'))
+    if not llm_models:
+        return []
+    results = asyncio.run(closing_http_clients(probe_models(llm_models)))
+    if record:
+        record_probes(results)
+    return results
+
+
+def expire_probes() -> int:
+    """Delete probe history older than LLM_PROBE_RETENTION_DAYS."""
+    cutoff = timezone.now() - timedelta(days=settings.LLM_PROBE_RETENTION_DAYS)
+    deleted, _ = LLMProbe.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -9,8 +9,9 @@ class LLMModelSerializer(serializers.ModelSerializer):
     class Meta:
         model = LLMModel
         fields = ['id', 'name', 'model_name', 'description', 'features',
-                 'max_tokens', 'is_active', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+                 'max_tokens', 'is_active', 'requests_per_minute', 'tokens_per_minute',
+                 'max_concurrent_streams', 'stream_idle_timeout', 'is_degraded', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'is_degraded', 'created_at', 'updated_at']
 
 
 class LLMProviderSerializer(serializers.ModelSerializer):
@@ -22,7 +23,8 @@ class LLMProviderSerializer(serializers.ModelSerializer):
     class Meta:
         model = LLMProvider
         fields = ['id', 'name', 'provider_type', 'base_url', 'is_active',
-                 'priority', 'models', 'created_at', 'updated_at']
+                 'priority', 'requests_per_minute', 'tokens_per_minute',
+                 'max_concurrent_streams', 'models', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     def create(self, validated_data):
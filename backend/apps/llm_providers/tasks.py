@@ -0,0 +1,17 @@
+from celery import shared_task
+
+from .probes import expire_probes, run_probes
+
+
+@shared_task(name='apps.llm_providers.probe_llm_models', ignore_result=True)
+def probe_llm_models():
+    """
+    Probe every active LLM model concurrently, record the results and update
+    which models are degraded
+    """
+    results = run_probes()
+    return {
+        "probed": len(results),
+        "unavailable": sum(1 for result in results if not result.available),
+        "expired": expire_probes(),
+    }
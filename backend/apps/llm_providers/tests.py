@@ -0,0 +1,332 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import fakeredis
+import httpx
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from llm.providers import AnthropicProvider, closing_http_clients
+from llm.providers.http_pool import _http_clients, get_http_client
+from utils import llm_stats
+from .models import LLMModel, LLMProvider
+from .probes import probe_models, record_probes
+from utils.model_router import ModelRouter
+from utils.rate_limiter import ProviderRateLimiter, RateLimitTimeout
+
+
+@override_settings(LLM_STATS_WINDOW=60, LLM_STATS_WINDOWS=3, LLM_STATS_HALF_LIFE=60)
+class LLMCallStatsTests(TestCase):
+    def test_buckets_are_within_five_percent(self):
+        for value in (0.5, 12, 480, 2500, 91000):
+            self.assertAlmostEqual(llm_stats.bucket_value(llm_stats.bucket_index(value)), value, delta=value * 0.05)
+
+    @mock.patch('utils.llm_stats.redis_client')
+    def test_older_windows_are_decayed(self, redis_client):
+        fast, slow = llm_stats.bucket_index(100), llm_stats.bucket_index(1000)
+        # Current window first, the previous one counts half
+        redis_client.client.pipeline.return_value.execute.return_value = [
+            {'calls': '2', f'ttft_ms:{fast}': '2'},
+            {'calls': '6', 'errors': '2', f'ttft_ms:{slow}': '4'},
+            {}
+        ]
+
+        stats = llm_stats.llm_call_stats([SimpleNamespace(id=7)], percentiles=(50, 99))['7']
+
+        self.assertEqual(stats['calls'], 5)
+        self.assertEqual(stats['error_rate'], 0.2)
+        self.assertAlmostEqual(stats['ttft_ms']['p50'], 100, delta=5)
+        self.assertAlmostEqual(stats['ttft_ms']['p99'], 1000, delta=50)
+        self.assertEqual(stats['duration_ms'], {'p50': None, 'p99': None})
+
+
+@override_settings(LLM_ROUTING_ENABLED=True, LLM_ROUTER_DEFAULT_TTFT=1.0, LLM_ROUTER_ERROR_PENALTY=10,
+                   LLM_ROUTER_TIE_TOLERANCE=0.1, LLM_ROUTER_STICKINESS=0.2)
+class LatencyAPITests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(get_user_model().objects.create_user(username='viewer'))
+        self.provider = LLMProvider.objects.create(name='latency', provider_type='openai', api_key='test-key')
+        LLMModel.objects.create(provider=self.provider, name='Fake', model_name='fake-model')
+        patcher = mock.patch.object(llm_stats, 'redis_client', SimpleNamespace(client=fakeredis.FakeRedis(decode_responses=True)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_models_are_filtered_by_provider(self):
+        url = reverse('llm_providers:llmmodel-latency')
+        response = self.client.get(url, {'provider': str(self.provider.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([model['provider'] for model in response.data], ['latency'])
+
+        response = self.client.get(url, {'provider': 'latency'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.json())
+
+
+class ModelRouterTests(TestCase):
+    def setUp(self):
+        self.client = mock.MagicMock()
+        self.router = ModelRouter(client=self.client)
+        self.configured = SimpleNamespace(id=1, provider=SimpleNamespace(priority=1), is_degraded=False)
+        self.alternate = SimpleNamespace(id=2, provider=SimpleNamespace(priority=1), is_degraded=False)
+
+    def rank(self, *stats):
+        self.client.pipeline.return_value.execute.return_value = list(stats)
+        return [llm_model.id for llm_model in self.router.rank(self.configured, [self.alternate])]
+
+    def test_ties_keep_the_configured_model_unless_outranked_by_priority(self):
+        self.assertEqual(self.rank({}, {}), [1, 2])
+        self.alternate.provider.priority = 2
+        self.router = ModelRouter(client=self.client)
+        self.assertEqual(self.rank({'ttft': '1.0'}, {'ttft': '1.05'}), [2, 1])
+
+    def test_traffic_moves_away_from_slow_or_failing_models(self):
+        self.assertEqual(self.rank({'ttft': '3.0'}, {'ttft': '0.5'}), [2, 1])
+        self.assertEqual(self.rank({'ttft': '0.5', 'error_rate': '0.5'}, {'ttft': '2.0'}), [2, 1])
+
+    def test_previous_choice_is_sticky(self):
+        self.assertEqual(self.rank({'ttft': '0.5'}, {'ttft': '1.0'}), [1, 2])
+        # Better, but not by more than the stickiness
+        self.assertEqual(self.rank({'ttft': '1.0'}, {'ttft': '0.85'}), [1, 2])
+        self.assertEqual(self.rank({'ttft': '1.0'}, {'ttft': '0.5'}), [2, 1])
+
+    def test_averages_follow_recent_calls_and_set_the_hedge_delay(self):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        router = ModelRouter(client=redis)
+        with self.settings(LLM_ROUTER_ALPHA=0.5, LLM_ROUTER_STATS_TTL=600, LLM_HEDGE_PERCENTILE=90,
+                           LLM_HEDGE_DEFAULT_DELAY=2.0, LLM_HEDGE_MIN_DELAY=0.1, LLM_HEDGE_MAX_DELAY=10.0):
+            router.observe(self.configured, ttft=1.0)
+            router.observe(self.configured, ttft=3.0)
+            router.observe(self.configured, error=True)
+            stats = redis.hgetall('llmrouter:1')
+            self.assertEqual(float(stats['ttft']), 2.0)
+            self.assertEqual(float(stats['ttft_var']), 1.0)
+            self.assertEqual(float(stats['error_rate']), 0.5)
+            # Too few samples for the model's own distribution
+            self.assertEqual(router.hedge_delay(self.configured), 2.0)
+
+            redis.hset('llmrouter:1', 'samples', 20)
+            self.assertAlmostEqual(router.hedge_delay(self.configured), 2.0 + 1.2816, places=3)
+
+
+class FakeProbeClient:
+    def __init__(self, delay, fail=False):
+        self.delay = delay
+        self.fail = fail
+
+    async def stream_chat(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError('refused')
+        yield 'OK'
+
+
+@override_settings(LLM_PROBE_CONCURRENCY=10, LLM_PROBE_FAILURE_THRESHOLD=2)
+class ProbeTests(TestCase):
+    def setUp(self):
+        provider = LLMProvider.objects.create(name='probes', provider_type='openai', api_key='test-key')
+        self.models = {
+            name: LLMModel.objects.create(provider=provider, name=name, model_name=name)
+            for name in ('fast', 'slow', 'stuck', 'broken')
+        }
+        self.clients = {
+            'fast': FakeProbeClient(0.05),
+            'slow': FakeProbeClient(0.3),
+            'stuck': FakeProbeClient(10),
+            'broken': FakeProbeClient(0, fail=True),
+        }
+
+    def probe(self):
+        with mock.patch('apps.llm_providers.probes.create_provider',
+                        side_effect=lambda *args, model, **kwargs: self.clients[model]):
+            return asyncio.run(probe_models(list(self.models.values()), timeout=0.5))
+
+    def test_sweep_takes_as_long_as_the_slowest_probe(self):
+        started = time.perf_counter()
+        results = {result.llm_model.name: result for result in self.probe()}
+        self.assertLess(time.perf_counter() - started, 0.8)
+
+        self.assertTrue(results['fast'].available)
+        self.assertTrue(results['slow'].available)
+        self.assertGreater(results['slow'].ttft, 0.25)
+        self.assertIn('Timed out', results['stuck'].error)
+        self.assertEqual(results['broken'].error, 'refused')
+
+    def test_repeated_failures_degrade_a_model_until_it_recovers(self):
+        record_probes(self.probe())
+        self.assertFalse(LLMModel.objects.filter(is_degraded=True).exists())
+        record_probes(self.probe())
+        self.assertEqual(
+            set(LLMModel.objects.filter(is_degraded=True).values_list('name', flat=True)), {'stuck', 'broken'}
+        )
+        self.assertEqual(self.models['fast'].probes.count(), 2)
+
+        self.clients['broken'] = FakeProbeClient(0)
+        record_probes(self.probe())
+        self.models['broken'].refresh_from_db()
+        self.assertFalse(self.models['broken'].is_degraded)
+        self.assertEqual(self.models['broken'].probe_failures, 0)
+
+
+def limited_model(model_id, provider, rpm=None, tpm=None, streams=None):
+    return SimpleNamespace(id=model_id, provider=provider, requests_per_minute=rpm, tokens_per_minute=tpm,
+                           max_concurrent_streams=streams)
+
+
+@override_settings(RATE_LIMIT_HEARTBEAT_TTL=10, RATE_LIMIT_LEASE_TTL=900)
+class RateLimiterTests(TestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis(decode_responses=True)
+        self.limiter = ProviderRateLimiter(client=self.client)
+        self.provider = SimpleNamespace(id=1, name='limited', requests_per_minute=None, tokens_per_minute=None,
+                                        max_concurrent_streams=None)
+
+    def acquire(self, llm_model, tokens=0):
+        return asyncio.run(self.limiter.acquire(llm_model, tokens, timeout=0))
+
+    def test_request_bucket(self):
+        llm_model = limited_model(1, self.provider, rpm=2)
+        self.acquire(llm_model)
+        self.acquire(llm_model)
+        with self.assertRaises(RateLimitTimeout):
+            self.acquire(llm_model)
+        # Waiters that give up leave the queue
+        self.assertEqual(self.client.zcard('ratelimit:model:1:queue'), 0)
+
+    def test_token_bucket_is_corrected_with_actual_usage(self):
+        llm_model = limited_model(1, self.provider, tpm=1000)
+        lease = self.acquire(llm_model, tokens=800)
+        lease.actual_tokens = 200
+        self.limiter.release(lease)
+        # The 600 unused tokens are returned to the bucket
+        self.acquire(llm_model, tokens=700)
+        with self.assertRaises(RateLimitTimeout):
+            self.acquire(llm_model, tokens=400)
+
+    def test_stream_semaphore(self):
+        self.provider.max_concurrent_streams = 1
+        first, second = limited_model(1, self.provider), limited_model(2, self.provider)
+        lease = self.acquire(first)
+        with self.assertRaises(RateLimitTimeout):
+            self.acquire(second)
+        self.limiter.release(lease)
+        self.acquire(second)
+
+    def test_expired_waiters_are_dropped_from_the_queue(self):
+        llm_model = limited_model(1, self.provider)
+        now = int(time.time() * 1000)
+        self.client.zadd('ratelimit:model:1:queue', {'stale': now - 5000})
+        self.client.zadd('ratelimit:model:1:waiters', {'stale': now - 1000})
+        self.acquire(llm_model)
+        self.assertEqual(self.client.zcard('ratelimit:model:1:queue'), 0)
+
+        # A waiter that still polls keeps its place
+        self.client.zadd('ratelimit:model:1:queue', {'live': now - 5000})
+        self.client.zadd('ratelimit:model:1:waiters', {'live': now + 10000})
+        with self.assertRaises(RateLimitTimeout):
+            self.acquire(llm_model)
+
+    def test_saturated_model_does_not_block_its_provider(self):
+        saturated, other = limited_model(1, self.provider, streams=1), limited_model(2, self.provider)
+        self.acquire(saturated)
+
+        async def acquire_while_a_waiter_is_queued():
+            waiter = asyncio.ensure_future(self.limiter.acquire(saturated, timeout=5))
+            await asyncio.sleep(0.05)
+            try:
+                return await self.limiter.acquire(other, timeout=0)
+            finally:
+                waiter.cancel()
+
+        self.assertIsNotNone(asyncio.run(acquire_while_a_waiter_is_queued()))
+
+
+class HedgeBudgetTests(TestCase):
+    def setUp(self):
+        client = fakeredis.FakeRedis(decode_responses=True)
+        for target, value in (
+            ('utils.llm_stats.redis_client', SimpleNamespace(client=client)),
+            ('utils.llm_stats._try_hedge', client.register_script(llm_stats.TRY_HEDGE_SCRIPT)),
+            # One budget window for the whole test
+            ('utils.llm_stats.HedgeBudget._key', staticmethod(lambda: 'hedge_budget')),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_low_traffic_may_hedge_up_to_the_burst(self):
+        budget = llm_stats.HedgeBudget(0.1, burst=2)
+        budget.record_request()
+        self.assertTrue(budget.try_spend())
+        self.assertTrue(budget.try_spend())
+        self.assertFalse(budget.try_spend())
+
+    def test_busy_traffic_hedges_up_to_the_ratio(self):
+        budget = llm_stats.HedgeBudget(0.1, burst=1)
+        for _ in range(30):
+            budget.record_request()
+        self.assertEqual(sum(budget.try_spend() for _ in range(5)), 3)
+
+
+def sse(*events):
+    """Encode (event type, data lines) pairs as a server-sent event body."""
+    body = ''
+    for event_type, *data_lines in events:
+        body += f"event: {event_type}\n" + ''.join(f"data: {line}\n" for line in data_lines) + "\n"
+    return body.encode()
+
+
+class AnthropicStreamTests(TestCase):
+    def stream(self, body):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body)))
+        provider = AnthropicProvider(api_key='test-key', model='claude-test')
+
+        async def collect():
+            async with client:
+                with mock.patch('llm.providers.anthropic_provider.get_http_client', return_value=client):
+                    return [chunk async for chunk in provider.stream_chat('Judge the request.', 'Request: x')]
+
+        return asyncio.run(collect()), provider.usage
+
+    def test_text_and_usage(self):
+        chunks, usage = self.stream(sse(
+            ('message_start', '{"type": "message_start", "message": {"usage": {"input_tokens": 12, '
+                              '"cache_read_input_tokens": 100, "cache_creation_input_tokens": 0, "output_tokens": 1}}}'),
+            ('ping', '{"type": "ping"}'),
+            # One event may spread its JSON over several data lines
+            ('content_block_delta', '{"type": "content_block_delta",', '"delta": {"type": "text_delta", "text": "<decision>"}}'),
+            ('ping', '{"type": "ping"}'),
+            ('content_block_delta', '{"type": "content_block_delta", "delta": {"type": "text_delta", "text": "POSITIVE"}}'),
+            ('message_delta', '{"type": "message_delta", "usage": {"output_tokens": 2}}'),
+            ('message_delta', '{"type": "message_delta", "usage": {"output_tokens": 7}}'),
+            ('message_stop', '{"type": "message_stop"}'),
+        ))
+
+        self.assertEqual(chunks, ['<decision>', 'POSITIVE'])
+        self.assertEqual(usage, {
+            'input_tokens': 112, 'cached_input_tokens': 100, 'cache_write_input_tokens': 0, 'output_tokens': 7
+        })
+
+    def test_error_event(self):
+        body = sse(
+            ('message_start', '{"type": "message_start", "message": {"usage": {"input_tokens": 12}}}'),
+            ('error', '{"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}'),
+        )
+        with self.assertRaisesRegex(RuntimeError, 'overloaded_error'):
+            self.stream(body)
+
+    def test_pooled_clients_are_closed_with_their_loop(self):
+        async def use_client():
+            return get_http_client('https://api.example.com')
+
+        async def main():
+            client = await closing_http_clients(use_client())
+            return client, asyncio.get_running_loop() in _http_clients
+
+        client, pooled = asyncio.run(main())
+        self.assertTrue(client.is_closed)
+        self.assertFalse(pooled)
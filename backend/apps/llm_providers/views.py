@@ -1,7 +1,9 @@
+import uuid
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from utils.llm_stats import llm_call_stats
 from .models import LLMProvider, LLMModel
 from .serializers import LLMProviderSerializer, LLMModelSerializer
 
@@ -70,3 +72,31 @@ class LLMModelViewSet(viewsets.ModelViewSet):
         model.is_active = not model.is_active
         model.save()
         return Response({'status': 'success', 'is_active': model.is_active})
+
+    @action(detail=False)
+    def latency(self, request):
+        """
+        Get live time-decayed latency, throughput and error statistics of the
+        active models, measured on real agent calls.
+        """
+        models = LLMModel.objects.filter(is_active=True).select_related('provider')
+        provider = request.query_params.get('provider')
+        if provider:
+            try:
+                models = models.filter(provider_id=uuid.UUID(provider))
+            except ValueError:
+                return Response(
+                    {'error': 'provider must be a provider id'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        stats = llm_call_stats(models)
+        return Response([
+            {
+                'id': str(model.id),
+                'name': model.name,
+                'model_name': model.model_name,
+                'provider': model.provider.name,
+                **stats[str(model.id)]
+            }
+            for model in models
+        ])
@@ -1,13 +1,21 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from utils.tracing import connect_celery_signals
+from .serialization import register_serializer
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
+# The serializer must be registered before the configuration refers to it
+register_serializer()
+
 # Create the celery application
 app = Celery('magisys')
 
+# Carry trace context from publishers to workers
+connect_celery_signals()
+
 # Load task modules from all registered Django apps.
 # app.config_from_object('django.conf:settings', namespace='CELERY')
 app.config_from_object('config.celery.celeryconfig')
@@ -17,7 +25,11 @@ app.autodiscover_tasks([
     'tasks.agent_dispatcher',  # include specific task module
     'tasks.dispatcher',  
     'tasks.agent_tasks',
+    'tasks.aggregation',
+    'tasks.batch_tasks',
     'apps.core',
+    'apps.agents',
+    'apps.llm_providers',
     'apps.users',
 ])
 
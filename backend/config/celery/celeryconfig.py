@@ -5,9 +5,13 @@ broker_url = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/1')
 result_backend = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
 
 # Task settings
-task_serializer = 'json'
-result_serializer = 'json'
-accept_content = ['json']
+# 'json-compressed' compresses bodies above CELERY_COMPRESSION_THRESHOLD, see
+# serialization.py. Workers that predate it reject its messages, so roll out
+# in two steps: deploy everything with the default 'json' (which already
+# accepts both), then set CELERY_SERIALIZER=json-compressed
+task_serializer = os.getenv('CELERY_SERIALIZER', 'json')
+result_serializer = os.getenv('CELERY_SERIALIZER', 'json')
+accept_content = ['json', 'json-compressed']
 timezone = 'UTC'
 enable_utc = True
 
@@ -41,6 +45,30 @@ task_routes = {
     'tasks.*': {'queue': 'default'},
 }
 
+# Periodic tasks
+beat_schedule = {
+    'poll-batch-jobs': {
+        'task': 'tasks.poll_batch_jobs',
+        'schedule': float(os.getenv('LLM_BATCH_POLL_INTERVAL', '300')),
+    },
+    'flush-agent-runs': {
+        'task': 'apps.agents.flush_agent_runs',
+        'schedule': float(os.getenv('RUN_RECORDER_FLUSH_INTERVAL', '5')),
+    },
+    'maintain-agent-run-partitions': {
+        'task': 'apps.agents.maintain_agent_run_partitions',
+        'schedule': float(os.getenv('AGENT_RUN_PARTITION_INTERVAL', '21600')),  # 6 hours
+    },
+    'update-agent-stats-rollups': {
+        'task': 'apps.agents.update_agent_stats_rollups',
+        'schedule': float(os.getenv('AGENT_STATS_INTERVAL', '60')),
+    },
+    'probe-llm-models': {
+        'task': 'apps.llm_providers.probe_llm_models',
+        'schedule': float(os.getenv('LLM_PROBE_INTERVAL', '60')),
+    },
+}
+
 # Worker settings
 worker_prefetch_multiplier = 1
 worker_max_tasks_per_child = 100
@@ -0,0 +1,64 @@
+"""
+JSON serializer that compresses large Celery messages and results.
+
+Bodies of at least ``CELERY_COMPRESSION_THRESHOLD`` bytes are compressed with
+zstd when the ``zstandard`` package is installed, otherwise with zlib. Smaller
+bodies are sent as plain JSON, so short messages only pay for a one byte
+header. The header records how the body was encoded, so a consumer decodes
+messages from producers with either compressor.
+
+It is only used for sending once ``CELERY_SERIALIZER`` selects it, which must
+wait until every worker runs a release that accepts it (see celeryconfig).
+"""
+import os
+import zlib
+
+from kombu.serialization import register
+from kombu.utils.json import dumps, loads
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+SERIALIZER_NAME = 'json-compressed'
+CONTENT_TYPE = 'application/x-magi-json-compressed'
+
+PLAIN = b'\x00'
+ZLIB = b'\x01'
+ZSTD = b'\x02'
+
+COMPRESSION_THRESHOLD = int(os.getenv('CELERY_COMPRESSION_THRESHOLD', '1024'))  # bytes
+COMPRESSION_LEVEL = int(os.getenv('CELERY_COMPRESSION_LEVEL', '3'))
+
+if zstandard is not None:
+    _zstd_compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+
+
+def encode(obj) -> bytes:
+    body = dumps(obj).encode()
+    if len(body) < COMPRESSION_THRESHOLD:
+        return PLAIN + body
+    if zstandard is not None:
+        return ZSTD + _zstd_compressor.compress(body)
+    return ZLIB + zlib.compress(body, COMPRESSION_LEVEL)
+
+
+def decode(data):
+    if isinstance(data, str):
+        data = data.encode('latin-1')
+    header, body = data[:1], data[1:]
+    if header == ZSTD:
+        if zstandard is None:
+            raise ValueError("Received a zstd compressed message but zstandard is not installed")
+        body = _zstd_decompressor.decompress(body)
+    elif header == ZLIB:
+        body = zlib.decompress(body)
+    elif header != PLAIN:
+        raise ValueError(f"Unknown {SERIALIZER_NAME} header {header!r}")
+    return loads(body)
+
+
+def register_serializer() -> None:
+    register(SERIALIZER_NAME, encode, decode, content_type=CONTENT_TYPE, content_encoding='binary')
@@ -204,4 +204,82 @@ if SENTRY_DSN:
 
 GATEWAY_REDIS_HOST = os.getenv('GATEWAY_REDIS_HOST', 'localhost')
 GATEWAY_REDIS_PORT = os.getenv('GATEWAY_REDIS_PORT', '6379')
-GATEWAY_REDIS_DB = os.getenv('GATEWAY_REDIS_DB', '0')
\ No newline at end of file
+GATEWAY_REDIS_DB = os.getenv('GATEWAY_REDIS_DB', '0')
+
+# Judgement quorum settings
+JUDGEMENT_QUORUM_TTL = int(os.getenv('JUDGEMENT_QUORUM_TTL', '3600'))
+JUDGEMENT_CANCEL_POLL_INTERVAL = float(os.getenv('JUDGEMENT_CANCEL_POLL_INTERVAL', '0.25'))
+
+# LLM provider rate limiting (seconds)
+RATE_LIMIT_QUEUE_TIMEOUT = float(os.getenv('RATE_LIMIT_QUEUE_TIMEOUT', '300'))
+RATE_LIMIT_HEARTBEAT_TTL = int(os.getenv('RATE_LIMIT_HEARTBEAT_TTL', '10'))
+RATE_LIMIT_LEASE_TTL = int(os.getenv('RATE_LIMIT_LEASE_TTL', '900'))
+
+# Hedged first-token requests across providers serving the same model
+LLM_HEDGING_ENABLED = os.getenv('LLM_HEDGING_ENABLED', 'False') == 'True'
+LLM_HEDGE_BUDGET = float(os.getenv('LLM_HEDGE_BUDGET', '0.1'))  # max hedges per eligible request
+LLM_HEDGE_MIN_BURST = int(os.getenv('LLM_HEDGE_MIN_BURST', '2'))  # hedges per minute allowed below the ratio
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '90'))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv('LLM_HEDGE_DEFAULT_DELAY', '2.0'))
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '0.5'))
+LLM_HEDGE_MAX_DELAY = float(os.getenv('LLM_HEDGE_MAX_DELAY', '10.0'))
+
+# Latency-aware routing between providers serving the same model
+LLM_ROUTING_ENABLED = os.getenv('LLM_ROUTING_ENABLED', 'True') == 'True'
+LLM_ROUTER_ALPHA = float(os.getenv('LLM_ROUTER_ALPHA', '0.2'))  # weight of the newest call in the averages
+LLM_ROUTER_DEFAULT_TTFT = float(os.getenv('LLM_ROUTER_DEFAULT_TTFT', '1.0'))  # seconds, for models without calls
+LLM_ROUTER_ERROR_PENALTY = float(os.getenv('LLM_ROUTER_ERROR_PENALTY', '10'))  # score multiplier per unit error rate
+LLM_ROUTER_TIE_TOLERANCE = float(os.getenv('LLM_ROUTER_TIE_TOLERANCE', '0.1'))  # scores this close are ties
+LLM_ROUTER_STICKINESS = float(os.getenv('LLM_ROUTER_STICKINESS', '0.2'))  # improvement needed to switch
+LLM_ROUTER_STATS_TTL = int(os.getenv('LLM_ROUTER_STATS_TTL', '600'))  # seconds
+
+# Per-model call histograms (seconds)
+LLM_STATS_WINDOW = int(os.getenv('LLM_STATS_WINDOW', '60'))
+LLM_STATS_WINDOWS = int(os.getenv('LLM_STATS_WINDOWS', '60'))  # windows kept
+LLM_STATS_HALF_LIFE = float(os.getenv('LLM_STATS_HALF_LIFE', '600'))
+
+# LLM health probes
+LLM_PROBE_TIMEOUT = float(os.getenv('LLM_PROBE_TIMEOUT', '5'))  # seconds
+LLM_PROBE_CONCURRENCY = int(os.getenv('LLM_PROBE_CONCURRENCY', '50'))
+LLM_PROBE_FAILURE_THRESHOLD = int(os.getenv('LLM_PROBE_FAILURE_THRESHOLD', '3'))  # failed probes in a row to degrade
+LLM_PROBE_RETENTION_DAYS = int(os.getenv('LLM_PROBE_RETENTION_DAYS', '7'))
+
+# Mid-stream stall watchdog
+LLM_STREAM_IDLE_TIMEOUT = float(os.getenv('LLM_STREAM_IDLE_TIMEOUT', '30'))
+LLM_STALL_MAX_RESTARTS = int(os.getenv('LLM_STALL_MAX_RESTARTS', '2'))
+
+# Content-addressed payload store for large task arguments
+PAYLOAD_STORE_TTL = int(os.getenv('PAYLOAD_STORE_TTL', '3600'))  # seconds
+PAYLOAD_STORE_MIN_SIZE = int(os.getenv('PAYLOAD_STORE_MIN_SIZE', '4096'))  # characters
+PAYLOAD_STORE_CACHE_SIZE = int(os.getenv('PAYLOAD_STORE_CACHE_SIZE', '64'))  # payloads per worker process
+
+# Longest wait for the agent results of a dispatched gateway request (seconds)
+AGENT_RESULTS_TIMEOUT = int(os.getenv('AGENT_RESULTS_TIMEOUT', '300'))
+
+# Provider batch APIs (seconds)
+LLM_BATCH_QUORUM_TTL = int(os.getenv('LLM_BATCH_QUORUM_TTL', str(48 * 3600)))
+
+# Maximum number of votes accepted by one bulk vote request
+CORE_BULK_VOTE_MAX_SIZE = int(os.getenv('CORE_BULK_VOTE_MAX_SIZE', '5000'))
+
+# Write-behind agent run recorder
+RUN_RECORDER_BATCH_SIZE = int(os.getenv('RUN_RECORDER_BATCH_SIZE', '1000'))
+RUN_RECORDER_MAX_BATCHES = int(os.getenv('RUN_RECORDER_MAX_BATCHES', '20'))  # per flush task run
+
+# AgentRun partitioning and retention (Postgres only)
+AGENT_RUN_PARTITION_PERIOD = os.getenv('AGENT_RUN_PARTITION_PERIOD', 'month')  # 'day' or 'month'
+AGENT_RUN_PARTITIONS_AHEAD = int(os.getenv('AGENT_RUN_PARTITIONS_AHEAD', '3'))
+AGENT_RUN_RETENTION_DAYS = int(os.getenv('AGENT_RUN_RETENTION_DAYS', '180'))  # 0 keeps every partition
+AGENT_RUN_RETENTION_ACTION = os.getenv('AGENT_RUN_RETENTION_ACTION', 'drop')  # 'drop' or 'detach' to archive
+
+# AgentRun export
+AGENT_RUN_EXPORT_CHUNK_SIZE = int(os.getenv('AGENT_RUN_EXPORT_CHUNK_SIZE', '2000'))
+
+# Request tracing, spans are only exported when a path or an OTLP/HTTP endpoint is set
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')  # JSON lines file
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', '')  # e.g. http://collector:4318/v1/traces
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'magi-backend')
+
+# Agent performance rollups (seconds)
+AGENT_STATS_SETTLE_SECONDS = int(os.getenv('AGENT_STATS_SETTLE_SECONDS', '300'))
+AGENT_STATS_WINDOW_SECONDS = int(os.getenv('AGENT_STATS_WINDOW_SECONDS', '3600'))
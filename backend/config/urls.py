@@ -32,7 +32,10 @@ urlpatterns = [
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     # Your API URLs
     path('api/', include('apps.core.urls')),
+    path('api/', include('apps.agents.urls')),
     path('api/llm/', include('apps.llm_providers.urls')),
+    # Prometheus metrics
+    path('', include('django_prometheus.urls')),
 ]
 
 # 添加静态文件路由
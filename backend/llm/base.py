@@ -7,6 +7,8 @@ class BaseProvider(ABC):
     def __init__(self, api_key: str, **kwargs):
         self.api_key = api_key
         self.kwargs = kwargs
+        # Token usage of the last call: input_tokens, cached_input_tokens, output_tokens
+        self.usage: Dict[str, int] = {}
         
     @abstractmethod
     async def generate(self, prompt: str, stream: bool = False, **kwargs) -> Union[str, AsyncIterator[str]]:
@@ -36,6 +38,21 @@ class BaseProvider(ABC):
         """
         pass
 
+    @abstractmethod
+    async def stream_chat(self, system_prompt: str, user_prompt: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Stream a chat response for a system and user prompt.
+        
+        Args:
+            system_prompt: System prompt that defines the context
+            user_prompt: User's input prompt
+            **kwargs: Additional provider-specific parameters
+            
+        Returns:
+            An async iterator of response chunks
+        """
+        pass
+
 class BaseAgent(ABC):
     """Base class for all agents that use LLM providers."""
     
@@ -0,0 +1,306 @@
+"""
+Provider batch APIs for judgements that can wait hours instead of seconds.
+
+Batch jobs are billed at a discount and counted against separate limits, so
+bulk evaluations submitted here do not compete with interactive traffic.
+"""
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .providers.anthropic_provider import AnthropicProvider
+
+OPENAI_API_URL = "https://api.openai.com/v1"
+
+# Normalised batch states
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+FAILED = 'failed'
+EXPIRED = 'expired'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, EXPIRED, CANCELLED)
+
+
+class BatchRequest:
+    """One prompt of a batch job, identified by a caller-chosen id."""
+
+    def __init__(self, custom_id: str, system_prompt: str, user_prompt: str, **params):
+        self.custom_id = custom_id
+        self.system_prompt = system_prompt
+        self.user_prompt = user_prompt
+        self.params = params
+
+
+class BatchResult:
+    """Outcome of one batch request: the response text, or an error."""
+
+    def __init__(self, custom_id: str, text: Optional[str] = None, usage: Optional[Dict[str, int]] = None,
+                 error: Optional[str] = None):
+        self.custom_id = custom_id
+        self.text = text
+        self.usage = usage or {}
+        self.error = error
+
+
+class BaseBatchBackend(ABC):
+    """Submit, poll and collect provider batch jobs."""
+
+    # Provider limits of a single batch job
+    MAX_REQUESTS = 10000
+    MAX_BYTES = 100 * 1024 * 1024
+
+    def __init__(self, api_key: str, model: str, base_url: str = None, timeout: float = 60.0):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.timeout = timeout
+
+    @abstractmethod
+    def submit(self, requests: List[BatchRequest]) -> str:
+        """
+        Submit a batch job.
+
+        Args:
+            requests: Prompts to run, with unique custom ids
+
+        Returns:
+            str: The provider batch id
+        """
+        pass
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Return the normalised state of a batch job."""
+        pass
+
+    @abstractmethod
+    def results(self, batch_id: str) -> List[BatchResult]:
+        """Return the results of a finished batch job."""
+        pass
+
+    def _entry(self, request: BatchRequest) -> Dict[str, Any]:
+        """The request as sent to the provider, used to size the batch."""
+        return {
+            "custom_id": request.custom_id,
+            "system": request.system_prompt,
+            "user": request.user_prompt,
+            "params": request.params,
+        }
+
+    def split(self, requests: List[BatchRequest]) -> List[List[BatchRequest]]:
+        """
+        Split requests into batches within MAX_REQUESTS and MAX_BYTES.
+
+        Args:
+            requests: Prompts to run, with unique custom ids
+
+        Returns:
+            List[List[BatchRequest]]: Batches to submit as separate jobs
+        """
+        batches, batch, size = [], [], 0
+        for request in requests:
+            request_size = len(json.dumps(self._entry(request)).encode()) + 1
+            if batch and (len(batch) >= self.MAX_REQUESTS or size + request_size > self.MAX_BYTES):
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(request)
+            size += request_size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _client(self) -> httpx.Client:
+        return httpx.Client(timeout=self.timeout)
+
+
+class OpenAIBatchBackend(BaseBatchBackend):
+    """OpenAI Batch API: a JSONL input file of chat completion requests."""
+
+    MAX_REQUESTS = 50000
+    # 200 MB input file, with headroom for the multipart encoding
+    MAX_BYTES = 190 * 1024 * 1024
+
+    STATES = {
+        'validating': IN_PROGRESS,
+        'in_progress': IN_PROGRESS,
+        'finalizing': IN_PROGRESS,
+        'cancelling': IN_PROGRESS,
+        'completed': COMPLETED,
+        'failed': FAILED,
+        'expired': EXPIRED,
+        'cancelled': CANCELLED,
+    }
+
+    def __init__(self, api_key: str, model: str, base_url: str = None, **kwargs):
+        super().__init__(api_key, model, (base_url or OPENAI_API_URL).rstrip('/'), **kwargs)
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def _body(self, request: BatchRequest) -> Dict[str, Any]:
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": request.system_prompt},
+                {"role": "user", "content": request.user_prompt}
+            ],
+        }
+        body.update({key: value for key, value in request.params.items() if value is not None})
+        return body
+
+    def _entry(self, request: BatchRequest) -> Dict[str, Any]:
+        return {
+            "custom_id": request.custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": self._body(request),
+        }
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        lines = '\n'.join(json.dumps(self._entry(request)) for request in requests)
+        with self._client() as client:
+            upload = client.post(
+                f"{self.base_url}/files",
+                headers=self._headers(),
+                data={"purpose": "batch"},
+                files={"file": ("batch.jsonl", lines.encode(), "application/jsonl")}
+            )
+            upload.raise_for_status()
+            response = client.post(
+                f"{self.base_url}/batches",
+                headers=self._headers(),
+                json={
+                    "input_file_id": upload.json()["id"],
+                    "endpoint": "/v1/chat/completions",
+                    "completion_window": "24h",
+                }
+            )
+            response.raise_for_status()
+            return response.json()["id"]
+
+    def _batch(self, client: httpx.Client, batch_id: str) -> Dict[str, Any]:
+        response = client.get(f"{self.base_url}/batches/{batch_id}", headers=self._headers())
+        response.raise_for_status()
+        return response.json()
+
+    def status(self, batch_id: str) -> str:
+        with self._client() as client:
+            return self.STATES.get(self._batch(client, batch_id)["status"], IN_PROGRESS)
+
+    def _file_lines(self, client: httpx.Client, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not file_id:
+            return []
+        response = client.get(f"{self.base_url}/files/{file_id}/content", headers=self._headers())
+        response.raise_for_status()
+        return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+    def results(self, batch_id: str) -> List[BatchResult]:
+        results = []
+        with self._client() as client:
+            batch = self._batch(client, batch_id)
+            lines = self._file_lines(client, batch.get("output_file_id")) + \
+                self._file_lines(client, batch.get("error_file_id"))
+        for line in lines:
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            if line.get("error") or response.get("status_code", 500) >= 400:
+                error = line.get("error") or body.get("error") or f"HTTP {response.get('status_code')}"
+                results.append(BatchResult(line["custom_id"], error=json.dumps(error) if isinstance(error, dict) else str(error)))
+                continue
+            usage = body.get("usage") or {}
+            results.append(BatchResult(
+                line["custom_id"],
+                text=body["choices"][0]["message"]["content"] or '',
+                usage={
+                    'input_tokens': usage.get('prompt_tokens', 0),
+                    'cached_input_tokens': (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0),
+                    'output_tokens': usage.get('completion_tokens', 0),
+                }
+            ))
+        return results
+
+
+class AnthropicBatchBackend(BaseBatchBackend):
+    """Anthropic Message Batches API."""
+
+    MAX_REQUESTS = 100000
+    # 256 MB request body
+    MAX_BYTES = 250 * 1024 * 1024
+
+    def __init__(self, api_key: str, model: str, base_url: str = None, cache_prompt: bool = True, **kwargs):
+        # Reuse the streaming provider for headers, request payloads and usage normalisation
+        self.provider = AnthropicProvider(api_key, model=model, base_url=base_url, cache_prompt=cache_prompt)
+        super().__init__(api_key, model, self.provider.messages_url.rsplit('/messages', 1)[0], **kwargs)
+        self.batches_url = f"{self.provider.messages_url}/batches"
+
+    def _entry(self, request: BatchRequest) -> Dict[str, Any]:
+        params = self.provider._payload(request.system_prompt, request.user_prompt, stream=False, **request.params)
+        params.pop('stream')
+        return {"custom_id": request.custom_id, "params": params}
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        batch_requests = [self._entry(request) for request in requests]
+        with self._client() as client:
+            response = client.post(self.batches_url, headers=self.provider._headers(), json={"requests": batch_requests})
+            response.raise_for_status()
+            return response.json()["id"]
+
+    def _batch(self, client: httpx.Client, batch_id: str) -> Dict[str, Any]:
+        response = client.get(f"{self.batches_url}/{batch_id}", headers=self.provider._headers())
+        response.raise_for_status()
+        return response.json()
+
+    def status(self, batch_id: str) -> str:
+        with self._client() as client:
+            # Individual requests may still have errored or expired, see results()
+            return COMPLETED if self._batch(client, batch_id)["processing_status"] == 'ended' else IN_PROGRESS
+
+    def results(self, batch_id: str) -> List[BatchResult]:
+        results = []
+        with self._client() as client:
+            batch = self._batch(client, batch_id)
+            results_url = batch.get("results_url") or f"{self.batches_url}/{batch_id}/results"
+            response = client.get(results_url, headers=self.provider._headers())
+            response.raise_for_status()
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            result = entry.get("result") or {}
+            if result.get("type") != 'succeeded':
+                error = result.get("error") or result.get("type", 'unknown')
+                results.append(BatchResult(entry["custom_id"], error=json.dumps(error) if isinstance(error, dict) else str(error)))
+                continue
+            message = result["message"]
+            self.provider.usage = {}
+            self.provider._record_usage(message.get("usage", {}))
+            results.append(BatchResult(
+                entry["custom_id"],
+                text=''.join(block.get('text', '') for block in message.get('content', []) if block.get('type') == 'text'),
+                usage=dict(self.provider.usage)
+            ))
+        return results
+
+
+def create_batch_backend(provider_type: str, api_key: str, model: str, base_url: str = None, **kwargs) -> BaseBatchBackend:
+    """
+    Create the batch backend for the given provider type.
+
+    Args:
+        provider_type: One of the LLMProvider.PROVIDER_TYPES keys
+        api_key: Provider API key
+        model: API model name
+        base_url: Optional API base URL
+        **kwargs: Additional backend-specific parameters
+
+    Returns:
+        BaseBatchBackend: The batch backend
+    """
+    if provider_type == 'openai':
+        kwargs.pop('cache_prompt', None)
+        return OpenAIBatchBackend(api_key=api_key, model=model, base_url=base_url, **kwargs)
+    elif provider_type == 'anthropic':
+        return AnthropicBatchBackend(api_key=api_key, model=model, base_url=base_url, **kwargs)
+    raise ValueError(f"Batch API not supported for provider type: {provider_type}")
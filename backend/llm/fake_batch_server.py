@@ -0,0 +1,221 @@
+"""
+Local stand-in for the OpenAI and Anthropic batch APIs, used by tests and for
+trying out batch judgements without provider credentials.
+
+Run standalone with ``python -m llm.fake_batch_server --port 8089`` and point
+an LLM provider's base URL at ``http://localhost:8089/v1``.
+"""
+import argparse
+import email
+import email.policy
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_RESPONSE = "Looks fine.\n<decision>POSITIVE</decision>"
+
+
+class FakeBatchServer:
+    """
+    In-memory batch API server.
+
+    Args:
+        responder: Returns the response text for a system and user prompt
+        polls_until_complete: Number of status polls that report a job as still running
+        port: Port to listen on, 0 picks a free one
+    """
+
+    def __init__(self, responder: Optional[Callable[[str, str], str]] = None, polls_until_complete: int = 1,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.responder = responder or (lambda system_prompt, user_prompt: DEFAULT_RESPONSE)
+        self.polls_until_complete = polls_until_complete
+        self.files: Dict[str, str] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'FakeBatchServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _new_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}_{next(self._ids)}"
+
+    def _poll(self, batch: Dict[str, Any]) -> bool:
+        """Count a status poll and return whether the batch is finished."""
+        with self._lock:
+            batch['polls'] += 1
+            return batch['polls'] > self.polls_until_complete
+
+    @staticmethod
+    def _text(content) -> str:
+        if isinstance(content, list):
+            return ''.join(block.get('text', '') for block in content)
+        return content or ''
+
+    # OpenAI Batch API
+
+    def upload_file(self, content: str) -> Dict[str, Any]:
+        file_id = self._new_id('file')
+        self.files[file_id] = content
+        return {"id": file_id, "object": "file", "purpose": "batch"}
+
+    def create_openai_batch(self, input_file_id: str) -> Dict[str, Any]:
+        batch_id = self._new_id('batch')
+        output = []
+        for line in self.files[input_file_id].splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            messages = request['body']['messages']
+            system_prompt = next((self._text(m['content']) for m in messages if m['role'] == 'system'), '')
+            user_prompt = next((self._text(m['content']) for m in messages if m['role'] == 'user'), '')
+            output.append(json.dumps({
+                "id": self._new_id('response'),
+                "custom_id": request['custom_id'],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "choices": [{"index": 0, "message": {
+                            "role": "assistant", "content": self.responder(system_prompt, user_prompt)
+                        }}],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+                    },
+                },
+                "error": None,
+            }))
+        output_file_id = self._new_id('file')
+        self.files[output_file_id] = '\n'.join(output)
+        self.batches[batch_id] = {'kind': 'openai', 'polls': 0, 'output_file_id': output_file_id}
+        return self.openai_batch(batch_id, poll=False)
+
+    def openai_batch(self, batch_id: str, poll: bool = True) -> Dict[str, Any]:
+        batch = self.batches[batch_id]
+        finished = self._poll(batch) if poll else False
+        return {
+            "id": batch_id,
+            "object": "batch",
+            "status": "completed" if finished else "in_progress",
+            "output_file_id": batch['output_file_id'] if finished else None,
+            "error_file_id": None,
+        }
+
+    # Anthropic Message Batches API
+
+    def create_anthropic_batch(self, requests) -> Dict[str, Any]:
+        batch_id = self._new_id('msgbatch')
+        results = []
+        for request in requests:
+            params = request['params']
+            system_prompt = self._text(params.get('system'))
+            user_prompt = self._text(params['messages'][-1]['content'])
+            results.append(json.dumps({
+                "custom_id": request['custom_id'],
+                "result": {"type": "succeeded", "message": {
+                    "content": [{"type": "text", "text": self.responder(system_prompt, user_prompt)}],
+                    "usage": {"input_tokens": 10, "output_tokens": 5},
+                }},
+            }))
+        self.batches[batch_id] = {'kind': 'anthropic', 'polls': 0, 'results': '\n'.join(results)}
+        return self.anthropic_batch(batch_id, poll=False)
+
+    def anthropic_batch(self, batch_id: str, poll: bool = True) -> Dict[str, Any]:
+        finished = self._poll(self.batches[batch_id]) if poll else False
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if finished else "in_progress",
+            "results_url": f"{self.url}/messages/batches/{batch_id}/results" if finished else None,
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def _send(self, status: int, body, content_type: str = 'application/json'):
+                data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _upload(self) -> str:
+                header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+                message = email.message_from_bytes(header + self._body(), policy=email.policy.HTTP)
+                for part in message.iter_parts():
+                    if part.get_param('name', header='content-disposition') == 'file':
+                        return part.get_payload(decode=True).decode()
+                return ''
+
+            def do_POST(self):
+                path = self.path.rstrip('/')
+                try:
+                    if path == '/v1/files':
+                        return self._send(200, server.upload_file(self._upload()))
+                    if path == '/v1/batches':
+                        return self._send(200, server.create_openai_batch(json.loads(self._body())['input_file_id']))
+                    if path == '/v1/messages/batches':
+                        return self._send(200, server.create_anthropic_batch(json.loads(self._body())['requests']))
+                except (KeyError, ValueError) as e:
+                    return self._send(400, {"error": {"message": str(e)}})
+                self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                try:
+                    if parts[:2] == ['v1', 'batches'] and len(parts) == 3:
+                        return self._send(200, server.openai_batch(parts[2]))
+                    if parts[:2] == ['v1', 'files'] and len(parts) == 4 and parts[3] == 'content':
+                        return self._send(200, server.files[parts[2]], 'application/jsonl')
+                    if parts[:3] == ['v1', 'messages', 'batches'] and len(parts) == 4:
+                        return self._send(200, server.anthropic_batch(parts[3]))
+                    if parts[:3] == ['v1', 'messages', 'batches'] and len(parts) == 5 and parts[4] == 'results':
+                        return self._send(200, server.batches[parts[3]]['results'], 'application/jsonl')
+                except KeyError as e:
+                    return self._send(404, {"error": {"message": f"Not found: {e}"}})
+                self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake OpenAI/Anthropic batch API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--polls', type=int, default=1, help='Status polls before a batch completes')
+    args = parser.parse_args()
+
+    fake = FakeBatchServer(polls_until_complete=args.polls, host=args.host, port=args.port)
+    print(f"Fake batch API listening on {fake.url}")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake.httpd.server_close()
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+
+async def _always() -> bool:
+    return True
+
+
+class HedgedStream:
+    """
+    Race a primary stream against a hedge started on an equivalent provider.
+
+    The primary stream is opened immediately. If it has not produced its first
+    chunk within ``hedge_after`` seconds and ``await allow_hedge()`` agrees, the
+    secondary stream is opened as well. Whichever produces a first chunk first
+    is kept and the other one is closed, which cancels its HTTP request.
+
+    After iteration, ``winner`` is ``'primary'`` or ``'secondary'``, ``hedged``
+    tells whether the secondary was started, ``first_chunk_latency`` is the
+    winning stream's time to first chunk measured from its own start and
+    ``first_chunk_at`` the epoch time of that chunk.
+    """
+
+    def __init__(
+        self,
+        primary: Callable[[], AsyncIterator[str]],
+        secondary: Optional[Callable[[], AsyncIterator[str]]],
+        hedge_after: float,
+        allow_hedge: Callable[[], Awaitable[bool]] = _always
+    ):
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_after = hedge_after
+        self.allow_hedge = allow_hedge
+        self.winner: Optional[str] = None
+        self.hedged = False
+        self.first_chunk_latency: Optional[float] = None
+        self.first_chunk_at: Optional[float] = None
+
+    @staticmethod
+    async def _first_chunk(stream: AsyncIterator[str]):
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    @staticmethod
+    async def _close(stream: AsyncIterator[str], pending: Optional[asyncio.Future]):
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except BaseException:
+                pass
+        aclose = getattr(stream, 'aclose', None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
+
+    async def _race(self):
+        """Return (label, stream, first chunk) for the stream that answered first."""
+        primary_stream = self.primary()
+        primary_started = time.monotonic()
+        primary_first = asyncio.ensure_future(self._first_chunk(primary_stream))
+
+        done, _ = await asyncio.wait({primary_first}, timeout=self.hedge_after)
+        try:
+            hedge = not done and self.secondary is not None and await self.allow_hedge()
+        except BaseException:
+            await self._close(primary_stream, primary_first)
+            raise
+        if not hedge:
+            try:
+                chunk = await primary_first
+            except BaseException:
+                await self._close(primary_stream, primary_first)
+                raise
+            self.first_chunk_latency = time.monotonic() - primary_started
+            self.first_chunk_at = time.time()
+            return 'primary', primary_stream, chunk
+
+        self.hedged = True
+        secondary_stream = self.secondary()
+        secondary_started = time.monotonic()
+        secondary_first = asyncio.ensure_future(self._first_chunk(secondary_stream))
+        contenders = {
+            primary_first: ('primary', primary_stream, primary_started),
+            secondary_first: ('secondary', secondary_stream, secondary_started),
+        }
+
+        try:
+            pending = set(contenders)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        # A failed contender only loses, the other one may still answer
+                        error = future.exception()
+                        label, stream, _ = contenders.pop(future)
+                        await self._close(stream, None)
+                        continue
+                    label, stream, started = contenders.pop(future)
+                    self.first_chunk_latency = time.monotonic() - started
+                    self.first_chunk_at = time.time()
+                    for other_future, (_, other_stream, _) in contenders.items():
+                        await self._close(other_stream, other_future)
+                    contenders.clear()
+                    return label, stream, future.result()
+            raise error
+        except BaseException:
+            for future, (_, stream, _) in contenders.items():
+                await self._close(stream, future)
+            raise
+
+    async def __aiter__(self):
+        self.winner, stream, chunk = await self._race()
+        try:
+            if chunk is None:
+                return
+            yield chunk
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await self._close(stream, None)
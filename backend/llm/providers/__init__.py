@@ -1,3 +1,26 @@
 from .openai_provider import OpenAIProvider
+from .anthropic_provider import AnthropicProvider
+from .http_pool import close_http_clients, closing_http_clients
 
-__all__ = ['OpenAIProvider']
+__all__ = ['OpenAIProvider', 'AnthropicProvider', 'create_provider', 'close_http_clients', 'closing_http_clients']
+
+
+def create_provider(provider_type: str, api_key: str, model: str, base_url: str = None, **kwargs):
+    """
+    Create a provider client for the given provider type.
+    
+    Args:
+        provider_type: One of the LLMProvider.PROVIDER_TYPES keys
+        api_key: Provider API key
+        model: API model name
+        base_url: Optional API base URL
+        **kwargs: Additional provider-specific parameters
+        
+    Returns:
+        BaseProvider: The provider client
+    """
+    if provider_type == 'openai':
+        return OpenAIProvider(api_key=api_key, model=model, base_url=base_url, **kwargs)
+    elif provider_type == 'anthropic':
+        return AnthropicProvider(api_key=api_key, model=model, base_url=base_url, **kwargs)
+    raise ValueError(f"Unsupported provider type: {provider_type}")
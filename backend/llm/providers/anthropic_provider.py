@@ -0,0 +1,160 @@
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from ..base import BaseProvider
+from .http_pool import get_http_client
+
+ANTHROPIC_API_URL = "https://api.anthropic.com"
+ANTHROPIC_VERSION = "2023-06-01"
+DEFAULT_MAX_TOKENS = 1024
+
+
+async def iter_sse_events(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Parse server-sent events into their JSON data. The data lines of an event
+    are joined with newlines and the event ends at a blank line, ``event:``,
+    ``id:`` and comment lines are ignored since the JSON carries the type.
+    """
+    data_lines: List[str] = []
+    async for line in lines:
+        if line.startswith('data:'):
+            data = line[5:]
+            data_lines.append(data[1:] if data.startswith(' ') else data)
+        elif not line and data_lines:
+            yield json.loads('\n'.join(data_lines))
+            data_lines = []
+    if data_lines:
+        yield json.loads('\n'.join(data_lines))
+
+
+class AnthropicProvider(BaseProvider):
+    """Anthropic Messages API provider implementation."""
+
+    def __init__(self, api_key: str, model: str = "claude-3-5-sonnet-latest", base_url: str = None,
+                 cache_prompt: bool = True, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.model = model
+        self.base_url = (base_url or ANTHROPIC_API_URL).rstrip('/')
+        # Accept both "https://host" and OpenAI-style "https://host/v1" base URLs
+        if self.base_url.endswith('/v1'):
+            self.messages_url = f"{self.base_url}/messages"
+        else:
+            self.messages_url = f"{self.base_url}/v1/messages"
+        self.cache_prompt = cache_prompt
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "x-api-key": self.api_key,
+            "anthropic-version": ANTHROPIC_VERSION,
+            "content-type": "application/json",
+        }
+
+    def _system_blocks(self, system_prompt: str) -> List[Dict[str, Any]]:
+        """
+        Build the system prompt blocks. The system prompt is the long, static
+        part of every agent request, so it is marked as a cacheable prefix.
+        """
+        block = {"type": "text", "text": system_prompt}
+        if self.cache_prompt:
+            block["cache_control"] = {"type": "ephemeral"}
+        return [block]
+
+    def _payload(self, system_prompt: Optional[str], user_prompt: str, stream: bool, **kwargs) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "max_tokens": kwargs.pop('max_tokens', None) or DEFAULT_MAX_TOKENS,
+            "messages": [{"role": "user", "content": user_prompt}],
+            "stream": stream,
+        }
+        if system_prompt:
+            payload["system"] = self._system_blocks(system_prompt)
+        stop = kwargs.pop('stop', None)
+        if stop:
+            payload["stop_sequences"] = stop if isinstance(stop, list) else [stop]
+        payload.update({key: value for key, value in kwargs.items() if value is not None})
+        return payload
+
+    def _record_usage(self, usage: Dict[str, Any]) -> None:
+        """Normalise Anthropic usage into input (including cached), cached and output tokens."""
+        if 'input_tokens' in usage:
+            cached = usage.get('cache_read_input_tokens') or 0
+            written = usage.get('cache_creation_input_tokens') or 0
+            self.usage['input_tokens'] = usage['input_tokens'] + cached + written
+            self.usage['cached_input_tokens'] = cached
+            self.usage['cache_write_input_tokens'] = written
+        if 'output_tokens' in usage:
+            self.usage['output_tokens'] = usage['output_tokens']
+
+    async def _stream_events(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        self.usage = {}
+        client = get_http_client(self.base_url)
+        async with client.stream("POST", self.messages_url, headers=self._headers(), json=payload) as response:
+            if response.status_code >= 400:
+                body = await response.aread()
+                raise RuntimeError(f"Anthropic API error {response.status_code}: {body.decode(errors='replace')}")
+            async for event in iter_sse_events(response.aiter_lines()):
+                event_type = event.get('type')
+                if event_type == 'message_start':
+                    self._record_usage(event['message'].get('usage', {}))
+                elif event_type == 'content_block_delta':
+                    delta = event.get('delta', {})
+                    if delta.get('type') == 'text_delta' and delta.get('text'):
+                        yield delta['text']
+                elif event_type == 'message_delta':
+                    self._record_usage(event.get('usage', {}))
+                elif event_type == 'error':
+                    raise RuntimeError(f"Anthropic stream error: {event.get('error')}")
+                elif event_type == 'message_stop':
+                    return
+
+    async def generate(self, prompt: str, stream: bool = False, **kwargs) -> Union[str, AsyncIterator[str]]:
+        """
+        Generate response using Anthropic API.
+
+        Args:
+            prompt: Input text prompt
+            stream: Whether to stream the response
+            **kwargs: Additional Anthropic-specific parameters
+
+        Returns:
+            Either a complete response string or an async iterator of response chunks
+        """
+        if stream:
+            return self._stream_events(self._payload(None, prompt, stream=True, **kwargs))
+
+        self.usage = {}
+        client = get_http_client(self.base_url)
+        response = await client.post(
+            self.messages_url,
+            headers=self._headers(),
+            json=self._payload(None, prompt, stream=False, **kwargs)
+        )
+        response.raise_for_status()
+        data = response.json()
+        self._record_usage(data.get('usage', {}))
+        return ''.join(block.get('text', '') for block in data.get('content', []) if block.get('type') == 'text')
+
+    async def embeddings(self, text: str) -> list[float]:
+        """
+        Anthropic does not offer an embeddings endpoint.
+        """
+        raise NotImplementedError("Anthropic does not provide an embeddings API")
+
+    async def stream_chat(self, system_prompt: str, user_prompt: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Stream chat response using Anthropic API.
+
+        The system prompt is sent as a cacheable block, so repeated judgements
+        by the same agent only pay full prompt processing on a cache miss.
+        Token usage is available in ``self.usage`` once the stream ends.
+
+        Args:
+            system_prompt: System prompt that defines the context
+            user_prompt: User's input prompt
+            **kwargs: Additional Anthropic-specific parameters
+
+        Returns:
+            An async iterator of response chunks
+        """
+        async for chunk in self._stream_events(self._payload(system_prompt, user_prompt, stream=True, **kwargs)):
+            yield chunk
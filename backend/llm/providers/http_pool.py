@@ -0,0 +1,59 @@
+"""
+Pooled HTTP clients shared by the provider clients.
+
+A provider client is created per call, since it keeps the usage of that call,
+but the HTTP client underneath is shared: there is one per event loop and base
+URL, so keep-alive connections and TLS sessions are reused across calls
+instead of reopened per request. Whoever owns a loop closes its clients with
+close_http_clients() before the loop itself is closed.
+"""
+import asyncio
+import weakref
+from typing import Awaitable, Dict, TypeVar
+
+import httpx
+
+T = TypeVar('T')
+
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """
+    Return the shared HTTP client for a base URL on the running event loop.
+
+    Args:
+        base_url: API base URL
+
+    Returns:
+        httpx.AsyncClient: Pooled client
+    """
+    clients = _http_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(base_url)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(connect=10.0, read=300.0, write=30.0, pool=30.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+        clients[base_url] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    """Close the pooled HTTP clients of the running event loop."""
+    clients = _http_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+async def closing_http_clients(awaitable: Awaitable[T]) -> T:
+    """
+    Await ``awaitable`` and then close the pooled HTTP clients, for event loops
+    that end with it, e.g. ``asyncio.run(closing_http_clients(main()))``.
+    """
+    try:
+        return await awaitable
+    finally:
+        await close_http_clients()
@@ -1,6 +1,9 @@
 import openai
 from typing import Union, AsyncIterator
 from ..base import BaseProvider
+from .http_pool import get_http_client
+
+OPENAI_API_URL = "https://api.openai.com/v1"
 
 class OpenAIProvider(BaseProvider):
     """OpenAI API provider implementation."""
@@ -8,9 +11,15 @@ class OpenAIProvider(BaseProvider):
     def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", base_url: str = None, **kwargs):
         super().__init__(api_key, **kwargs)
         self.model = model
+        # Share the event loop's pooled connections when created inside one
+        try:
+            http_client = get_http_client(base_url or OPENAI_API_URL)
+        except RuntimeError:
+            http_client = None
         self.client = openai.AsyncOpenAI(
             api_key=api_key,
-            base_url=base_url if base_url else None
+            base_url=base_url if base_url else None,
+            http_client=http_client
         )
         
     async def generate(self, prompt: str, stream: bool = False, **kwargs) -> Union[str, AsyncIterator[str]]:
@@ -80,11 +89,21 @@ class OpenAIProvider(BaseProvider):
             {"role": "user", "content": user_prompt}
         ]
         
+        self.usage = {}
         async for chunk in await self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             stream=True,
+            stream_options={"include_usage": True},
             **kwargs
         ):
-            if chunk.choices[0].delta.content:
+            # The final chunk carries usage and no choices
+            if chunk.usage:
+                details = getattr(chunk.usage, 'prompt_tokens_details', None)
+                self.usage = {
+                    'input_tokens': chunk.usage.prompt_tokens,
+                    'cached_input_tokens': getattr(details, 'cached_tokens', None) or 0,
+                    'output_tokens': chunk.usage.completion_tokens,
+                }
+            if chunk.choices and chunk.choices[0].delta.content:
                 yield chunk.choices[0].delta.content
@@ -0,0 +1,35 @@
+import asyncio
+from typing import AsyncIterator
+
+
+class StreamStalled(Exception):
+    """Raised when a provider stream produces no chunk within the idle timeout."""
+
+
+async def idle_watchdog(stream: AsyncIterator[str], timeout: float) -> AsyncIterator[str]:
+    """
+    Relay a stream, failing with StreamStalled if the gap before any chunk
+    exceeds ``timeout`` seconds. The stalled stream is closed, which cancels
+    the underlying HTTP request.
+    
+    Args:
+        stream: The provider stream
+        timeout: Maximum idle seconds between chunks
+    """
+    iterator = stream.__aiter__()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise StreamStalled(f"No chunk received for {timeout}s")
+            yield chunk
+    finally:
+        aclose = getattr(iterator, 'aclose', None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
@@ -1,17 +1,70 @@
 from celery import shared_task
-from typing import Dict, List
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+import asyncio
 import json
 import redis
 import logging
+import os
+import threading
+import time
+import uuid
 from datetime import datetime
-from collections import defaultdict
 from django.conf import settings
+from utils.voting import JudgementQuorum, parse_decision, NEGATIVE
+from utils.rate_limiter import RateLimitTimeout, rate_limiter, estimate_tokens
+from utils.llm_stats import (
+    HedgeBudget, record_llm_call, record_llm_error, record_prompt_cache
+)
+from utils import metrics
+from utils.deadlines import DEADLINE_FIELD, expired, remaining, shed
+from utils.model_router import model_router
+from utils.payload_store import PayloadMissing, payload_store
+from utils.stream_protocol import DeltaStream, stream_ids, stream_open
+from utils.tracing import current_traceparent, record_span, span, start_span
+from llm.hedging import HedgedStream
+from llm.watchdog import StreamStalled, idle_watchdog
+from llm.providers import create_provider
 
 logger = logging.getLogger(__name__)
 
 # Redis connection
 redis_client = redis.Redis(host=settings.GATEWAY_REDIS_HOST, port=settings.GATEWAY_REDIS_PORT, db=settings.GATEWAY_REDIS_DB)
 
+hedge_budget = HedgeBudget(settings.LLM_HEDGE_BUDGET, settings.LLM_HEDGE_MIN_BURST)
+
+_worker_loops = threading.local()
+
+
+def worker_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop of the current worker thread. It is kept across tasks, so the
+    provider HTTP clients pooled on it reuse their connections from one task
+    to the next. A forked worker process creates its own.
+    """
+    loop = getattr(_worker_loops, 'loop', None)
+    if loop is None or loop.is_closed() or _worker_loops.pid != os.getpid():
+        loop = asyncio.new_event_loop()
+        _worker_loops.loop, _worker_loops.pid = loop, os.getpid()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def build_llm_client(llm_model, llm_params: Dict, cache_prompt: Optional[bool] = None):
+    """
+    Create the provider client serving an LLM model. Providers that support
+    prompt caching keep their default unless ``cache_prompt`` overrides it.
+    """
+    provider = llm_model.provider
+    if provider.provider_type == 'anthropic' and cache_prompt is not None:
+        llm_params = {**llm_params, 'cache_prompt': cache_prompt}
+    return create_provider(
+        provider.provider_type,
+        api_key=provider.api_key,
+        model=llm_model.model_name,
+        base_url=provider.base_url,
+        **llm_params
+    )
+
 
 def handle_get_voters(session_id: str, message: Dict):
     try:
@@ -79,6 +132,20 @@ def process_request(session_id: str, message: Dict):
         request_type = message.get('type')
         logger.info(f"Request type: {request_type}")
         
+        # Drop requests that waited in the broker past their client's deadline
+        deadline = message.get(DEADLINE_FIELD)
+        if expired(deadline):
+            shed('dispatch', session_id, message.get('request_id'), deadline)
+            response = {
+                "type": "agent_judgement_response",
+                "session_id": session_id,
+                "request_id": message.get('request_id'),
+                "status": "expired",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+            redis_client.publish(f"gateway:responses:{session_id}", json.dumps(response))
+            return response
+        
         if request_type == "get_voters":
             return handle_get_voters(session_id, message)
         elif request_type == "agent_judgement":
@@ -101,6 +168,15 @@ def process_request(session_id: str, message: Dict):
         raise
 
 
+def is_valid_agent_id(agent_id) -> bool:
+    """Whether an agent id from a gateway message is a well-formed UUID."""
+    try:
+        uuid.UUID(str(agent_id))
+    except ValueError:
+        return False
+    return True
+
+
 def handle_agent_judgement(session_id: str, message: Dict):
     try:
         # Extract request data
@@ -109,11 +185,43 @@ def handle_agent_judgement(session_id: str, message: Dict):
         if not agents_data:
             raise ValueError("No agents provided in message")
 
-        # Create subtasks for each agent
+        # Report malformed agent ids per agent instead of failing the whole request
+        agent_ids = []
         for agent_data in agents_data:
             agent_id = agent_data.get('agent_id')
             if not agent_id:
                 continue
+            if not is_valid_agent_id(agent_id):
+                logger.error(f"Invalid agent id {agent_id!r} in request {request_id} for session {session_id}")
+                redis_client.publish(f"gateway:responses:{session_id}", json.dumps(
+                    agent_message(session_id, request_id, str(agent_id), "error", error=f"Invalid agent id {agent_id}")
+                ))
+                continue
+            agent_ids.append(agent_id)
+        if not agent_ids:
+            raise ValueError("No valid agents provided in message")
+        agents_data = [agent_data for agent_data in agents_data if agent_data.get('agent_id') in agent_ids]
+
+        # Open the weighted tally so agents can stop as soon as the verdict is fixed
+        from apps.agents.models import Agent
+        with span('db.agent_weights', agents=len(agent_ids)):
+            weights = dict(Agent.objects.filter(id__in=agent_ids).values_list('id', 'weight'))
+        quorum = JudgementQuorum(redis_client, session_id, request_id, ttl=settings.JUDGEMENT_QUORUM_TTL)
+        quorum.open(sum(weights.values()))
+
+        # Declare the delta streams before any agent starts streaming
+        streams = stream_ids(redis_client, session_id, message, agent_ids)
+        if streams:
+            redis_client.publish(f"gateway:responses:{session_id}", stream_open(session_id, request_id, streams))
+        
+        # Store the submission once, subtasks only carry its reference
+        message = payload_store.detach(message, 'request')
+        
+        # Create subtasks for each agent
+        for agent_data in agents_data:
+            agent_id = agent_data['agent_id']
+            if streams:
+                agent_data = {**agent_data, 'stream_id': streams[agent_id]}
                 
             # Queue agent-specific task
             agent_task.delay(
@@ -143,113 +251,261 @@ def handle_agent_judgement(session_id: str, message: Dict):
         redis_client.publish(f"gateway:responses:{session_id}", json.dumps(error_message))
         raise
 
-@shared_task(name='tasks.agent_task')
-def agent_task(session_id: str, request_id: str, agent_id: str, agent_data: Dict, message: Dict):
+def agent_message(session_id: str, request_id: str, agent_id: str, status: str, **fields) -> Dict:
+    """Build an agent_response message for the gateway."""
+    message = {
+        "type": "agent_response",
+        "session_id": session_id,
+        "status": status,
+        "request_id": request_id,
+        "agent_id": agent_id,
+        **fields,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    # Lets the gateway time the send of traced requests, streamed chunks are not timed
+    traceparent = current_traceparent() if status != "streaming" else None
+    if traceparent:
+        message["traceparent"] = traceparent
+    return message
+
+
+async def judge_with_agent(agent, alternates: List, session_id: str, request_id: str, user_request: str,
+                           publish: Callable[[Union[Dict, str]], Awaitable[None]],
+                           stream_id: Optional[int] = None, deadline: Optional[float] = None) -> Dict:
     """
-    Individual agent task that processes the request using LLM and publishes results
+    Run one agent on a judgement request and stream its output to the gateway.
+    
+    Shared by the Celery agent task and the asyncio judgement service. The agent
+    must be loaded with its LLM model and provider, and ``alternates`` are the
+    equivalent models used for routing, hedging and restarts after a stall, so
+    no database query is made here.
     
     Args:
+        agent: The judging agent
+        alternates: Other models serving the agent's model, highest priority first
         session_id: Session identifier
         request_id: Request identifier
-        agent_id: Agent identifier
-        agent_data: Agent configuration data
-        message: Original request message
+        user_request: The request to judge
+        publish: Coroutine sending a message, or an already encoded frame, to the session's gateway channel
+        stream_id: Stream id declared in the request's stream_open frame when the
+            session negotiated delta frames, None to stream full messages
+        deadline: The client's deadline in epoch milliseconds. Past it the agent
+            is skipped, or its stream is cut off
+    
+    Returns:
+        Dict: Summary of the run
+    
+    Both paths may run many agents on one event loop, so the synchronous Redis
+    calls made here (recorder, router, stats, quorum) run in worker threads.
     """
+    from apps.agents.recorder import run_recorder
+    
+    agent_id = str(agent.id)
+    run_id = None
+    # Model that served the run, which routing and hedging can move off the agent's own
+    run_model = {}
+    delta = DeltaStream(stream_id) if stream_id is not None else None
+    quorum = JudgementQuorum(redis_client, session_id, request_id, ttl=settings.JUDGEMENT_QUORUM_TTL)
+    judge_span = start_span('agent.judge', agent_id=agent_id)
+    if judge_span is not None:
+        judge_span.activate()
     try:
-        logger.info(f"Agent {agent_id} processing request for session {session_id}")
-        
-        # Get agent from database
-        from apps.agents.models import Agent
-        try:
-            agent = Agent.objects.get(id=agent_id)
-        except Agent.DoesNotExist:
-            raise ValueError(f"Agent {agent_id} not found in database")
+        if expired(deadline):
+            await asyncio.to_thread(shed, 'agent', session_id, request_id, deadline)
+            await publish(agent_message(session_id, request_id, agent_id, "expired"))
+            return {
+                "status": "expired",
+                "agent_id": agent_id,
+                "session_id": session_id,
+                "request_id": request_id,
+                "timestamp": datetime.utcnow().isoformat()
+            }
         
-        # Get user request from message
-        user_request = message.get('request', '')
-        logger.info(f"message: {message}")
         if not user_request:
             raise ValueError("No user request provided in message")
             
         # Prepare prompts
-        system_prompt = agent.system_prompt
-        user_prompt = agent.user_prompt_template.format_map(defaultdict(str, {"user_request": user_request}))
+        system_prompt, user_prompt = agent.build_prompts(user_request)
+        run_id = await asyncio.to_thread(run_recorder.start, agent_id, session_id, request_id, {"request": user_request})
+        
+        # Pick the provider with the best live latency and error scores
+        llm_model, *alternates = await asyncio.to_thread(model_router.rank, agent.llm_model, alternates)
+        llm_params = agent.get_llm_parameters()
+        estimated_tokens = estimate_tokens(system_prompt, user_prompt, max_tokens=llm_params.get('max_tokens'))
+        hedge_model = alternates[0] if settings.LLM_HEDGING_ENABLED and alternates else None
+        
+        # Stream intermediate status
+        await publish(agent_message(session_id, request_id, agent_id, "processing"))
+        
+        def open_stream(candidate, acquired: Dict[str, float], hedge: bool = False):
+            async def stream():
+                # Wait for cluster-wide provider capacity, a hedge never queues
+                async with rate_limiter.slot(candidate, estimated_tokens, timeout=0 if hedge else None) as lease:
+                    # Provider latency is timed from here, local queueing is not the provider's
+                    acquired['secondary' if hedge else 'primary'] = time.time()
+                    llm_client = build_llm_client(candidate, llm_params)
+                    output = []
+                    provider_stream = llm_client.stream_chat(
+                        system_prompt=system_prompt,
+                        user_prompt=user_prompt,
+                        **llm_params
+                    )
+                    async for chunk in idle_watchdog(provider_stream, candidate.get_stream_idle_timeout()):
+                        output.append(chunk)
+                        yield chunk
+                    usage = llm_client.usage
+                    run_usage.update(usage)
+                    await asyncio.to_thread(record_prompt_cache, agent, usage)
+                    if usage:
+                        lease.actual_tokens = usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
+                    else:
+                        lease.actual_tokens = estimate_tokens(system_prompt, user_prompt, ''.join(output))
+            return stream
+        
+        chunks = []
+        run_usage = {}
+        
+        def record_failure(failed_model, stalled: bool):
+            if stalled:
+                metrics.incr('llm_stream_stalls_total', model=failed_model.model_name,
+                             provider=failed_model.provider.name)
+            record_llm_error(failed_model)
+            model_router.observe(failed_model, error=True)
         
-        # Initialize LLM client based on agent's model and provider
-        llm_model = agent.llm_model
-        provider = llm_model.provider
+        def record_success(served_by, duration: float, ttft: Optional[float], output_tokens: int):
+            record_llm_call(served_by, duration, ttft=ttft, output_tokens=output_tokens)
+            model_router.observe(served_by, ttft=ttft)
         
-        if provider.provider_type == 'openai':
-            from llm.providers.openai_provider import OpenAIProvider
-            llm_client = OpenAIProvider(
-                api_key=provider.api_key,
-                model=llm_model.model_name,
-                base_url=provider.base_url,
-                **agent.get_llm_parameters()
+        async def stream_once(primary_model, secondary_model):
+            run_model['id'] = str(primary_model.id)
+            hedge_after = 0
+            if secondary_model is not None:
+                await asyncio.to_thread(hedge_budget.record_request)
+                hedge_after = await asyncio.to_thread(model_router.hedge_delay, primary_model)
+            acquired = {}
+            stream = HedgedStream(
+                open_stream(primary_model, acquired),
+                open_stream(secondary_model, acquired, hedge=True) if secondary_model is not None else None,
+                hedge_after=hedge_after,
+                allow_hedge=lambda: asyncio.to_thread(hedge_budget.try_spend)
             )
-        elif provider.provider_type == 'anthropic':
-            from llm.providers.anthropic_provider import AnthropicProvider
-            llm_client = AnthropicProvider(
-                api_key=provider.api_key,
-                model=llm_model.model_name,
-                base_url=provider.base_url,
-                **agent.get_llm_parameters()
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    if delta is not None:
+                        await publish(delta.frame(chunk))
+                    else:
+                        await publish(agent_message(session_id, request_id, agent_id, "streaming", content=chunk))
+            except RateLimitTimeout:
+                # Our own capacity limit, not a provider failure
+                raise
+            except Exception as e:
+                failed_model = secondary_model if stream.winner == 'secondary' else primary_model
+                run_model['id'] = str(failed_model.id)
+                await asyncio.to_thread(record_failure, failed_model, isinstance(e, StreamStalled))
+                raise
+            
+            served_by = secondary_model if stream.winner == 'secondary' else primary_model
+            run_model['id'] = str(served_by.id)
+            opened_at = acquired[stream.winner]
+            ttft = stream.first_chunk_at - opened_at if stream.first_chunk_at is not None else None
+            await asyncio.to_thread(
+                record_success,
+                served_by,
+                time.time() - opened_at,
+                ttft,
+                run_usage.get('output_tokens') or len(''.join(chunks)) // 4
             )
-        else:
-            raise ValueError(f"Unsupported provider type: {provider.provider_type}")
-        
-        # Stream intermediate status
-        intermediate_result = {
-            "type": "agent_response",
-            "session_id": session_id,
-            "status": "processing",
-            "request_id": request_id,
-            "agent_id": agent_id,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        redis_client.publish(f"gateway:responses:{session_id}", json.dumps(intermediate_result))
+            if ttft is not None:
+                record_span('llm.first_token', opened_at, stream.first_chunk_at,
+                            model=served_by.model_name, provider=served_by.provider.name)
+            record_span('llm.stream', opened_at, time.time(), model=served_by.model_name,
+                        provider=served_by.provider.name, hedged=stream.hedged)
+            if stream.hedged:
+                outcome = 'won' if stream.winner == 'secondary' else 'lost'
+                await asyncio.to_thread(metrics.incr, 'llm_hedge_total', model=primary_model.model_name, outcome=outcome)
         
-        # Stream LLM response
-        llm_params = agent.get_llm_parameters()
+        async def process_stream():
+            # Restart stalled streams, moving to an alternate provider when there is one
+            fallbacks = alternates + [llm_model]
+            primary_model, secondary_model = llm_model, hedge_model
+            restarts = 0
+            while True:
+                try:
+                    await stream_once(primary_model, secondary_model)
+                    return
+                except StreamStalled as e:
+                    if restarts >= settings.LLM_STALL_MAX_RESTARTS:
+                        raise
+                    primary_model, secondary_model = fallbacks[restarts % len(fallbacks)], None
+                    restarts += 1
+                    logger.warning(f"Agent {agent_id} stream stalled ({str(e)}), restarting on {primary_model.provider.name}")
+                    
+                    chunks.clear()
+                    await publish(agent_message(
+                        session_id, request_id, agent_id, "restarted", attempt=restarts, reason=str(e)
+                    ))
         
-        # Create event loop for async operations
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Stop streaming once the other agents have already fixed the verdict
+        async def watch_quorum(stream_task):
+            while not stream_task.done():
+                if await asyncio.to_thread(quorum.is_cancelled):
+                    stream_task.cancel()
+                    return
+                await asyncio.sleep(settings.JUDGEMENT_CANCEL_POLL_INTERVAL)
         
+        stream_task = asyncio.ensure_future(process_stream())
+        watcher = asyncio.ensure_future(watch_quorum(stream_task))
+        # Cut the stream off at the client's deadline
+        time_left = remaining(deadline)
+        deadline_timer = (
+            asyncio.get_running_loop().call_later(max(time_left, 0), stream_task.cancel)
+            if time_left is not None else None
+        )
         try:
-            # Run stream_chat in the event loop
-            async def process_stream():
-                async for chunk in llm_client.stream_chat(
-                    system_prompt=system_prompt,
-                    user_prompt=user_prompt,
-                    **llm_params
-                ):
-                    response = {
-                        "type": "agent_response",
-                        "session_id": session_id,
-                        "status": "streaming",
-                        "request_id": request_id,
-                        "agent_id": agent_id,
-                        "content": chunk,
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-                    redis_client.publish(f"gateway:responses:{session_id}", json.dumps(response))
-                    
-            loop.run_until_complete(process_stream())
+            await stream_task
+            completed = True
+        except asyncio.CancelledError:
+            # Only the quorum watcher and the deadline timer cancel the stream, anything else propagates
+            if not stream_task.cancelled() or asyncio.current_task().cancelling():
+                raise
+            completed = False
         finally:
-            loop.close()
+            watcher.cancel()
+            if deadline_timer is not None:
+                deadline_timer.cancel()
+        
+        if delta is not None:
+            await publish(delta.close())
+        if not completed:
+            status = "expired" if expired(deadline) else "cancelled"
+            if status == "expired":
+                await asyncio.to_thread(shed, 'stream', session_id, request_id, deadline)
+            await publish(agent_message(session_id, request_id, agent_id, status))
+            await asyncio.to_thread(
+                run_recorder.finish, run_id,
+                response_data={"status": status, "content": ''.join(chunks), "model_id": run_model.get('id')}
+            )
+            logger.info(f"Agent {agent_id} {status} for session {session_id}")
+            return {
+                "status": status,
+                "agent_id": agent_id,
+                "session_id": session_id,
+                "request_id": request_id,
+                "timestamp": datetime.utcnow().isoformat()
+            }
         
         # Send completion message
-        final_result = {
-            "type": "agent_response",
-            "session_id": session_id,
+        decision = parse_decision(''.join(chunks))
+        await publish(agent_message(session_id, request_id, agent_id, "completed", decision=decision))
+        await asyncio.to_thread(run_recorder.finish, run_id, response_data={
             "status": "completed",
-            "request_id": request_id,
-            "agent_id": agent_id,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        redis_client.publish(f"gateway:responses:{session_id}", json.dumps(final_result))
+            "content": ''.join(chunks),
+            "decision": decision,
+            "usage": run_usage,
+            "model_id": run_model['id']
+        })
+        await asyncio.to_thread(record_agent_vote, quorum, session_id, request_id, decision, agent.weight)
         
         return {
             "status": "success",
@@ -261,14 +517,101 @@ def agent_task(session_id: str, request_id: str, agent_id: str, agent_data: Dict
         
     except Exception as e:
         logger.error(f"Error in agent {agent_id} for session {session_id}: {str(e)}")
-        error_message = {
-            "type": "agent_response",
+        if delta is not None and not delta.closed:
+            await publish(delta.close())
+        await publish(agent_message(session_id, request_id, agent_id, "error", error=str(e)))
+        if run_id is not None:
+            await asyncio.to_thread(
+                run_recorder.finish, run_id,
+                response_data={"model_id": run_model['id']} if run_model else None, error=str(e)
+            )
+        # A failed agent still counts towards the quorum so the verdict is always published
+        await asyncio.to_thread(record_agent_vote, quorum, session_id, request_id, NEGATIVE, agent.weight)
+        if judge_span is not None:
+            judge_span.attributes['error'] = str(e)
+        raise
+    finally:
+        if judge_span is not None:
+            judge_span.end()
+
+
+@shared_task(name='tasks.agent_task')
+def agent_task(session_id: str, request_id: str, agent_id: str, agent_data: Dict, message: Dict):
+    """
+    Individual agent task that processes the request using LLM and publishes results
+    
+    Args:
+        session_id: Session identifier
+        request_id: Request identifier
+        agent_id: Agent identifier
+        agent_data: Agent configuration data
+        message: Original request message
+    """
+    logger.info(f"Agent {agent_id} processing request for session {session_id}")
+    channel = f"gateway:responses:{session_id}"
+    
+    async def publish(response: Union[Dict, str]):
+        redis_client.publish(channel, response if isinstance(response, str) else json.dumps(response))
+    
+    # Skip the database and the LLM when the task waited in the broker past the deadline
+    deadline = message.get(DEADLINE_FIELD)
+    if expired(deadline):
+        shed('agent', session_id, request_id, deadline)
+        redis_client.publish(channel, json.dumps(agent_message(session_id, request_id, agent_id, "expired")))
+        return {"status": "expired", "agent_id": agent_id, "session_id": session_id, "request_id": request_id}
+    
+    # Get agent from database
+    from apps.agents.models import Agent
+    with span('db.agent_load', agent_id=agent_id):
+        try:
+            agent = Agent.objects.select_related('llm_model__provider').get(id=agent_id)
+        except Agent.DoesNotExist:
+            error = f"Agent {agent_id} not found in database"
+            logger.error(f"Error in agent {agent_id} for session {session_id}: {error}")
+            redis_client.publish(channel, json.dumps(agent_message(session_id, request_id, agent_id, "error", error=error)))
+            raise ValueError(error)
+        
+        # Providers serving the same model, used for hedging and for restarts after a stall
+        alternates = list(agent.llm_model.equivalents())
+    try:
+        user_request = payload_store.attach(message, 'request').get('request', '')
+    except PayloadMissing:
+        # Judged as an empty request, so the agent still reports an error and votes
+        logger.error(f"Request payload for {request_id} expired before agent {agent_id} started")
+        user_request = ''
+    
+    return worker_loop().run_until_complete(
+        judge_with_agent(
+            agent, alternates, session_id, request_id, user_request, publish, agent_data.get('stream_id'),
+            deadline=deadline
+        )
+    )
+
+
+def record_agent_vote(quorum: JudgementQuorum, session_id: str, request_id: str, decision: str, weight: float):
+    """
+    Add an agent's decision to the request tally and publish the verdict
+    as soon as the outstanding agents can no longer change it.
+    """
+    try:
+        verdict, distribution, decided = quorum.record(decision, weight)
+    except Exception as e:
+        logger.error(f"Error recording vote for session {session_id}: {str(e)}")
+        return
+    
+    if decided:
+        verdict_message = {
+            "type": "agent_judgement_verdict",
             "session_id": session_id,
-            "status": "error",
+            "status": "completed",
             "request_id": request_id,
-            "agent_id": agent_id,
-            "error": str(e),
+            "verdict": verdict,
+            "accepted": verdict == "POSITIVE",
+            "vote_distribution": distribution,
             "timestamp": datetime.utcnow().isoformat()
         }
-        redis_client.publish(f"gateway:responses:{session_id}", json.dumps(error_message))
-        raise
\ No newline at end of file
+        traceparent = current_traceparent()
+        if traceparent:
+            verdict_message["traceparent"] = traceparent
+        redis_client.publish(f"gateway:responses:{session_id}", json.dumps(verdict_message))
+        logger.info(f"Verdict {verdict} reached for request {request_id} in session {session_id}")
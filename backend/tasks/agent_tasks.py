@@ -4,16 +4,27 @@ Agent task implementation for processing user requests.
 from typing import Dict, Any
 from celery import shared_task, current_task
 from celery.utils.log import get_task_logger
-from django.utils import timezone
-from apps.agents.models import Agent, AgentRun
+from apps.agents.models import Agent
+from apps.agents.recorder import run_recorder
 from utils.redis_channels import RedisChannels
+from utils.payload_store import payload_store
 from utils.redis_client import redis_client
+from utils.voting import POSITIVE, NEGATIVE
+from .aggregation import record_agent_result
 import json
 from datetime import datetime
 
 logger = get_task_logger(__name__)
 
-@shared_task(name="tasks.process_agent_task")
+def push_agent_result(session_id: str, request_id: str, agent_id: str, vote: str,
+                      confidence: float = 1.0, status: str = "processed") -> None:
+    """
+    Push an agent's result onto the request's agent results stream and
+    publish the verdict so far.
+    """
+    record_agent_result(session_id, request_id, agent_id, vote, confidence, status)
+
+@shared_task(name="tasks.process_agent_task", ignore_result=True)
 def process_agent_task(session_id: str, request_id: str, request_data: Dict[str, Any], agent_id: str) -> Dict[str, Any]:
     """
     Process a user request using a specific agent.
@@ -27,17 +38,16 @@ def process_agent_task(session_id: str, request_id: str, request_data: Dict[str,
     Returns:
         Dict[str, Any]: The processing result
     """
+    run_id = None
     try:
+        # Fetch a submission the dispatcher moved to the payload store
+        request_data = payload_store.attach(request_data, 'user_request')
+        
         # Get the agent
         agent = Agent.objects.get(id=agent_id)
         
-        # Create agent run record
-        agent_run = AgentRun.objects.create(
-            agent=agent,
-            session_id=session_id,
-            request_id=request_id,
-            request_data=request_data
-        )
+        # Record the run start, written to the database in bulk later
+        run_id = run_recorder.start(agent.id, session_id, request_id, request_data)
         
         logger.info(f"Processing agent task for session {session_id} with agent {agent.name}")
         
@@ -104,10 +114,14 @@ def process_agent_task(session_id: str, request_id: str, request_data: Dict[str,
         # Publish final result
         redis_client.publish(f"gateway:responses:{session_id}", json.dumps(final_result))
         
-        # Update agent run record
-        agent_run.response_data = final_result
-        agent_run.completed_at = timezone.now()
-        agent_run.save()
+        # Record the vote and publish the verdict so far
+        push_agent_result(
+            session_id, request_id, str(agent.id),
+            POSITIVE if processed_result['accepted'] else NEGATIVE, confidence
+        )
+        
+        # Record the run outcome
+        run_recorder.finish(run_id, response_data=final_result)
         
         logger.info(f"Agent {agent.name} completed processing for session {session_id}")
         return final_result
@@ -128,11 +142,15 @@ def process_agent_task(session_id: str, request_id: str, request_data: Dict[str,
             "timestamp": datetime.utcnow().isoformat()
         }
         redis_client.publish(f"gateway:responses:{session_id}", json.dumps(error_message))
+        # Failed agents vote NEGATIVE so the verdict does not wait for them
+        push_agent_result(session_id, request_id, agent_id, NEGATIVE, status="error")
         raise
         
     except Exception as e:
         error_msg = f"Error in agent task: {str(e)}"
         logger.error(error_msg)
+        if run_id is not None:
+            run_recorder.finish(run_id, error=error_msg)
         error_message = {
             "type": "agent_judgement_response",
             "session_id": session_id,
@@ -146,6 +164,8 @@ def process_agent_task(session_id: str, request_id: str, request_data: Dict[str,
             "timestamp": datetime.utcnow().isoformat()
         }
         redis_client.publish(f"gateway:responses:{session_id}", json.dumps(error_message))
+        # Failed agents vote NEGATIVE so the verdict does not wait for them
+        push_agent_result(session_id, request_id, agent_id, NEGATIVE, status="error")
         raise
 
 def process_intermediate_result(result: Dict[str, Any]) -> Dict[str, Any]:
@@ -0,0 +1,190 @@
+"""
+Aggregation of agent results into a weighted verdict.
+
+Agent tasks append their results to a per-request Redis stream and add them
+to a running tally in the same script call, then publish a provisional
+result. The agent whose result completes the set publishes the final
+verdict, the only time the stream is read. A delayed
+``finalize_agent_results`` task publishes a timeout verdict if some agents
+never answer. No worker waits on the stream, so aggregation never holds a
+worker slot that the agent tasks need.
+"""
+import json
+from typing import Any, Dict, List
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+
+from utils.redis_channels import RedisChannels
+from utils.redis_client import redis_client
+from utils.voting import WeightedTally
+
+logger = get_task_logger(__name__)
+
+
+def publish_result(session_id: str, result: Dict[str, Any]) -> None:
+    """Append a result to the session's result stream, JSON encoding nested values."""
+    redis_client.client.xadd(
+        RedisChannels.result_stream(session_id),
+        {
+            key: value if isinstance(value, (str, int, float)) else json.dumps(value)
+            for key, value in result.items()
+        },
+        maxlen=1000
+    )
+
+
+# KEYS[1] = result stream, KEYS[2] = agent weights, KEYS[3] = running tally,
+# KEYS[4] = agents already counted, KEYS[5] = final result claim
+# ARGV[1] = agent id, ARGV[2] = vote, ARGV[3] = confidence, ARGV[4] = status,
+# ARGV[5] = ttl in seconds
+# Returns false for results that are not counted, else {claimed final, tally}
+RECORD_RESULT_SCRIPT = """
+local weight = redis.call('HGET', KEYS[2], ARGV[1])
+if not weight or redis.call('EXISTS', KEYS[5]) == 1 then
+    return false
+end
+if redis.call('SADD', KEYS[4], ARGV[1]) == 0 then
+    return false
+end
+redis.call('XADD', KEYS[1], '*', 'agent_id', ARGV[1], 'vote', ARGV[2], 'confidence', ARGV[3], 'status', ARGV[4])
+redis.call('HINCRBYFLOAT', KEYS[3], 'vote:' .. ARGV[2], tonumber(weight) * tonumber(ARGV[3]))
+redis.call('HINCRBYFLOAT', KEYS[3], 'remaining', -tonumber(weight))
+local received = redis.call('HINCRBY', KEYS[3], 'received', 1)
+local ttl = tonumber(ARGV[5])
+for i = 1, 4 do
+    redis.call('EXPIRE', KEYS[i], ttl)
+end
+local claimed = 0
+if received >= tonumber(redis.call('HGET', KEYS[3], 'expected')) then
+    if redis.call('SET', KEYS[5], 1, 'NX', 'EX', ttl) then
+        claimed = 1
+    end
+end
+return {claimed, redis.call('HGETALL', KEYS[3])}
+"""
+
+_record_result = redis_client.client.register_script(RECORD_RESULT_SCRIPT)
+
+
+def _keys(session_id: str, request_id: str) -> List[str]:
+    """Result stream, weights, tally, counted agents and final claim of a request."""
+    stream = RedisChannels.agent_results_stream(session_id, request_id)
+    return [stream, f"{stream}:weights", f"{stream}:tally", f"{stream}:counted", f"{stream}:final"]
+
+
+def _tally(state: Dict[str, str]) -> WeightedTally:
+    """Rebuild the running tally kept in Redis."""
+    tally = WeightedTally(float(state['total']))
+    tally.remaining_weight = float(state['remaining'])
+    tally.received = int(state['received'])
+    tally.distribution = {
+        field[len('vote:'):]: float(score) for field, score in state.items() if field.startswith('vote:')
+    }
+    return tally
+
+
+def open_agent_results(session_id: str, request_id: str, weights: Dict[str, float]) -> None:
+    """
+    Register the agents dispatched for a request and schedule the timeout
+    verdict. Must be called before the agent tasks are queued.
+
+    Args:
+        session_id: The unique session identifier
+        request_id: The unique request identifier
+        weights: Voting weight of every dispatched agent, keyed by agent id
+    """
+    stream, weights_key, tally_key, counted_key, final_key = _keys(session_id, request_id)
+    total = sum(weights.values())
+    ttl = settings.AGENT_RESULTS_TIMEOUT * 2
+    pipe = redis_client.client.pipeline()
+    pipe.delete(stream, weights_key, tally_key, counted_key, final_key)
+    pipe.hset(weights_key, mapping=weights)
+    pipe.hset(tally_key, mapping={'total': total, 'remaining': total, 'expected': len(weights), 'received': 0})
+    pipe.expire(weights_key, ttl)
+    pipe.expire(tally_key, ttl)
+    pipe.execute()
+    finalize_agent_results.apply_async((session_id, request_id), countdown=settings.AGENT_RESULTS_TIMEOUT)
+
+
+def record_agent_result(session_id: str, request_id: str, agent_id: str, vote: str,
+                        confidence: float = 1.0, status: str = "processed") -> None:
+    """
+    Count an agent's result in the running tally and publish the verdict so far.
+
+    The stream append and the tally update are one script call, so each result
+    costs one round trip whatever the number of agents. Results of unknown
+    agents, repeated results of retried tasks and results arriving after the
+    final verdict are ignored. The result that completes the set publishes the
+    final verdict.
+    """
+    keys = _keys(session_id, request_id)
+    result = _record_result(
+        keys=keys, args=[agent_id, vote, confidence, status, settings.AGENT_RESULTS_TIMEOUT * 2],
+        client=redis_client.client
+    )
+    if not result:
+        return
+    claimed, state = result
+    state = dict(zip(state[::2], state[1::2]))
+    tally = _tally(state)
+    publish_result(session_id, {
+        'status': 'provisional',
+        'request_id': request_id,
+        'received': tally.received,
+        'expected': int(state['expected']),
+        'leading_vote': tally.leader() or '',
+        'verdict': tally.verdict() or '',
+        'vote_distribution': tally.distribution
+    })
+    if int(claimed):
+        _publish_final(session_id, request_id)
+
+
+def _publish_final(session_id: str, request_id: str) -> None:
+    """Publish the final verdict, reading the result stream once."""
+    stream, weights_key, tally_key, counted_key, _ = _keys(session_id, request_id)
+    pipe = redis_client.client.pipeline()
+    pipe.hgetall(weights_key)
+    pipe.hgetall(tally_key)
+    pipe.xrange(stream)
+    weights, state, entries = pipe.execute()
+    if not weights:
+        return
+    tally = _tally(state)
+    agent_results = [fields for _, fields in entries]
+    missing = set(weights) - {fields['agent_id'] for fields in agent_results}
+
+    publish_result(session_id, {
+        'status': 'completed' if not missing else 'timeout',
+        'request_id': request_id,
+        'agent_results': agent_results,
+        'aggregated_result': {
+            'winning_vote': tally.leader(),
+            'vote_distribution': tally.distribution,
+            'missing_agents': sorted(missing)
+        }
+    })
+    redis_client.client.delete(stream, weights_key, tally_key, counted_key)
+    logger.info(f"Published aggregated results for session {session_id}, request {request_id}")
+
+
+@shared_task(name="tasks.finalize_agent_results", ignore_result=True)
+def finalize_agent_results(session_id: str, request_id: str) -> None:
+    """
+    Publish the verdict of a request whose agents did not all answer within
+    AGENT_RESULTS_TIMEOUT. Does nothing if the verdict was already published.
+    """
+    try:
+        final_key = _keys(session_id, request_id)[-1]
+        # Claimed already when every agent answered in time
+        if redis_client.client.set(final_key, 1, nx=True, ex=settings.AGENT_RESULTS_TIMEOUT * 2):
+            _publish_final(session_id, request_id)
+    except Exception as e:
+        logger.error(f"Error finalizing agent results: {str(e)}")
+        publish_result(session_id, {
+            'status': 'error',
+            'error': str(e)
+        })
+        raise
@@ -0,0 +1,195 @@
+"""
+Batch execution of judgements through provider batch APIs.
+
+Judgements submitted here are not latency sensitive: their prompts are packed
+into provider batch jobs, and the ``tasks.poll_batch_jobs`` beat task fans the
+results back into AgentRun rows and the session result stream once a job ends.
+"""
+import json
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from apps.agents.models import AgentRun, BatchJob
+from llm.batch import COMPLETED, IN_PROGRESS, BatchRequest, create_batch_backend
+from tasks.agent_dispatcher import record_agent_vote, redis_client
+from utils.voting import NEGATIVE, JudgementQuorum, parse_decision
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_backend(llm_model):
+    """Create the batch backend serving an LLM model."""
+    provider = llm_model.provider
+    return create_batch_backend(
+        provider.provider_type,
+        api_key=provider.api_key,
+        model=llm_model.model_name,
+        base_url=provider.base_url
+    )
+
+
+def submit_batch_judgement(requests: Iterable[Tuple[str, str]], agents: List, session_id: Optional[str] = None) -> List[BatchJob]:
+    """
+    Submit judgements of many requests by many agents as provider batch jobs.
+
+    Each LLM model gets one job per batch within its provider's size limits.
+    Results and verdicts are published on the session's response channel as
+    the jobs complete.
+
+    Args:
+        requests: (request_id, user request) pairs
+        agents: Agents to run, with ``llm_model__provider`` preloaded
+        session_id: Session receiving the results, a new one by default
+
+    Returns:
+        List[BatchJob]: The submitted batch jobs
+    """
+    session_id = session_id or str(uuid.uuid4())
+    requests = list(requests)
+    total_weight = sum(agent.weight for agent in agents)
+    for request_id, _ in requests:
+        quorum = JudgementQuorum(redis_client, session_id, request_id, ttl=settings.LLM_BATCH_QUORUM_TTL)
+        quorum.open(total_weight)
+
+    groups = defaultdict(list)
+    for agent in agents:
+        groups[agent.llm_model_id].append(agent)
+
+    jobs = []
+    for group in groups.values():
+        llm_model = group[0].llm_model
+        backend = get_batch_backend(llm_model)
+        runs, batch_requests = {}, []
+        for agent in group:
+            llm_params = agent.get_llm_parameters()
+            for request_id, user_request in requests:
+                system_prompt, user_prompt = agent.build_prompts(user_request)
+                run = AgentRun(
+                    agent=agent,
+                    session_id=session_id,
+                    request_id=request_id,
+                    request_data={"request_id": request_id, "request": user_request, "mode": "batch"}
+                )
+                runs[str(run.id)] = run
+                batch_requests.append(BatchRequest(str(run.id), system_prompt, user_prompt, **llm_params))
+
+        # One job per batch within the provider's size limits
+        for chunk in backend.split(batch_requests):
+            provider_batch_id = backend.submit(chunk)
+            job = BatchJob.objects.create(
+                llm_model=llm_model,
+                provider_batch_id=provider_batch_id,
+                request_count=len(chunk)
+            )
+            chunk_runs = [runs[request.custom_id] for request in chunk]
+            for run in chunk_runs:
+                run.batch_job = job
+            AgentRun.objects.bulk_create(chunk_runs)
+            logger.info(f"Submitted batch {provider_batch_id} with {len(chunk)} prompts for session {session_id}")
+            jobs.append(job)
+    return jobs
+
+
+def collect_batch_results(job: BatchJob, results, missing_error: str = "Missing from batch results") -> None:
+    """
+    Store the results of a finished batch job.
+
+    Runs without a result are recorded as errors so that every request
+    still reaches a verdict. Runs stored by an earlier attempt are kept.
+    """
+    results = {result.custom_id: result for result in results}
+    runs = list(job.runs.filter(completed_at__isnull=True))
+    now = timezone.now()
+    for run in runs:
+        result = results.get(str(run.id))
+        if result is None or result.error:
+            run.error = result.error if result else missing_error
+        else:
+            run.response_data = {"content": result.text, "decision": parse_decision(result.text), "usage": result.usage}
+        run.completed_at = now
+    AgentRun.objects.bulk_update(runs, ['response_data', 'error', 'completed_at'], batch_size=500)
+
+
+def publish_batch_results(job: BatchJob) -> None:
+    """
+    Publish the stored runs of a batch job and record their votes.
+
+    Runs are published in id order and counted in ``published_runs``, so an
+    attempt that fails part way is resumed by the next one without losing or
+    repeating a vote.
+    """
+    runs = job.runs.select_related('agent').filter(completed_at__isnull=False).order_by('id')
+    for run in runs[job.published_runs:]:
+        if run.error:
+            decision = NEGATIVE
+            message = {"status": "error", "error": run.error}
+        else:
+            decision = run.response_data['decision']
+            message = {"status": "completed", "content": run.response_data['content'], "decision": decision}
+        session_id = str(run.session_id)
+        request_id = run.request_id
+        redis_client.publish(f"gateway:responses:{session_id}", json.dumps({
+            "type": "agent_response",
+            "session_id": session_id,
+            "request_id": request_id,
+            "agent_id": str(run.agent_id),
+            **message,
+            "timestamp": datetime.utcnow().isoformat()
+        }))
+        quorum = JudgementQuorum(redis_client, session_id, request_id, ttl=settings.LLM_BATCH_QUORUM_TTL)
+        record_agent_vote(quorum, session_id, request_id, decision, run.agent.weight)
+        job.published_runs += 1
+        job.save(update_fields=['published_runs'])
+
+
+@shared_task(name='tasks.poll_batch_jobs')
+def poll_batch_jobs():
+    """
+    Check submitted batch jobs and collect the ones that have finished.
+
+    A job whose collection fails goes back to ``submitted``, and the next poll
+    publishes its remaining runs.
+    """
+    finished = 0
+    for job in BatchJob.objects.filter(status='submitted').select_related('llm_model__provider'):
+        backend = get_batch_backend(job.llm_model)
+        try:
+            state = backend.status(job.provider_batch_id)
+        except Exception as e:
+            logger.error(f"Error polling batch {job.provider_batch_id}: {str(e)}")
+            continue
+        if state == IN_PROGRESS:
+            continue
+
+        # Claim the job so that overlapping polls do not publish results twice
+        if not BatchJob.objects.filter(id=job.id, status='submitted').update(status='collecting'):
+            continue
+        try:
+            error = None if state == COMPLETED else f"Batch {state}"
+            # Results are only fetched until every run is stored
+            if job.runs.filter(completed_at__isnull=True).exists():
+                if state == COMPLETED:
+                    collect_batch_results(job, backend.results(job.provider_batch_id))
+                else:
+                    collect_batch_results(job, [], missing_error=error)
+            publish_batch_results(job)
+        except Exception as e:
+            logger.error(f"Error collecting batch {job.provider_batch_id}, retrying on the next poll: {str(e)}")
+            job.status = 'submitted'
+            job.error = str(e)
+            job.save(update_fields=['status', 'error'])
+            continue
+        job.status = state
+        job.error = error
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'completed_at'])
+        finished += 1
+
+    return {"finished": finished}
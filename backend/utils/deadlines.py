@@ -0,0 +1,47 @@
+"""
+Client deadlines of gateway requests.
+
+The gateway stores a request's deadline in its ``deadline`` field as Unix
+epoch milliseconds, from the frame's ``deadline_ms`` budget or the appid
+default. Workers drop work whose deadline has already passed, instead of
+judging a request whose client has given up, and cut LLM streams off at the
+deadline. Dropped and cut off work is counted in ``magi_tasks_shed_total``.
+"""
+import logging
+import time
+from typing import Optional
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_FIELD = 'deadline'
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left before a deadline, None when the request has none."""
+    if deadline is None:
+        return None
+    return float(deadline) / 1000 - time.time()
+
+
+def expired(deadline: Optional[float]) -> bool:
+    left = remaining(deadline)
+    return left is not None and left <= 0
+
+
+def shed(stage: str, session_id: str, request_id: Optional[str], deadline: float) -> None:
+    """
+    Count work dropped at ``stage`` because its deadline passed.
+
+    Args:
+        stage: Where the work was dropped, e.g. 'dispatch', 'agent' or 'stream'
+        session_id: Session identifier
+        request_id: Request identifier
+        deadline: The missed deadline in epoch milliseconds
+    """
+    metrics.incr('tasks_shed_total', stage=stage)
+    logger.info(
+        f"Shed {stage} work for request {request_id} in session {session_id}, "
+        f"{-remaining(deadline):.3f}s past its deadline"
+    )
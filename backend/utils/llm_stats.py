@@ -0,0 +1,240 @@
+"""
+Live LLM latency statistics shared by all workers.
+"""
+import logging
+import math
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Sequence
+
+from django.conf import settings
+
+from utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Prompt cache counters per agent
+PROMPT_CACHE_KEY = "llmstats:prompt_cache:{agent_id}"
+
+# Histograms of real LLM calls per model, one hash per time window holding
+# ``calls``, ``errors`` and ``{metric}:{bucket}`` counts
+CALL_HISTOGRAM_KEY = "llmstats:calls:{model_id}:{window}"
+CALL_METRICS = ('ttft_ms', 'duration_ms', 'tokens_per_second')
+
+# Log-spaced buckets, each 5% wider than the previous one, so percentiles are
+# within 5% of the true value at any magnitude (as with HDR histograms)
+BUCKET_GROWTH = 1.05
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+
+# Per-minute counters of hedge-eligible requests and started hedges
+HEDGE_BUDGET_KEY = "llmstats:hedge_budget:{window}"
+
+# KEYS[1] = budget window hash, ARGV[1] = max hedge ratio, ARGV[2] = ttl,
+# ARGV[3] = hedges allowed per window regardless of the ratio
+# Returns 1 if a hedge may be started
+TRY_HEDGE_SCRIPT = """
+local requests = tonumber(redis.call('HGET', KEYS[1], 'requests') or '0')
+local hedges = tonumber(redis.call('HGET', KEYS[1], 'hedges') or '0')
+if hedges + 1 <= math.max(tonumber(ARGV[1]) * requests, tonumber(ARGV[3])) then
+    redis.call('HINCRBY', KEYS[1], 'hedges', 1)
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+    return 1
+end
+return 0
+"""
+
+_try_hedge = redis_client.client.register_script(TRY_HEDGE_SCRIPT)
+
+
+def bucket_index(value: float) -> int:
+    """Histogram bucket holding a positive value."""
+    return math.ceil(math.log(max(value, 1e-3)) / _LOG_GROWTH)
+
+
+def bucket_value(index: int) -> float:
+    """Geometric midpoint of a bucket."""
+    return BUCKET_GROWTH ** (index - 0.5)
+
+
+def _window() -> int:
+    return int(time.time() // settings.LLM_STATS_WINDOW)
+
+
+def _record_call(llm_model, fields: Dict[str, int]) -> None:
+    key = CALL_HISTOGRAM_KEY.format(model_id=llm_model.id, window=_window())
+    pipe = redis_client.client.pipeline()
+    for field, amount in fields.items():
+        pipe.hincrby(key, field, amount)
+    pipe.expire(key, settings.LLM_STATS_WINDOW * settings.LLM_STATS_WINDOWS)
+    pipe.execute()
+
+
+def record_llm_call(llm_model, duration: float, ttft: Optional[float] = None,
+                    output_tokens: Optional[int] = None) -> None:
+    """
+    Record a completed LLM call in the model's histograms.
+
+    Args:
+        llm_model: The LLM model that served the call
+        duration: Seconds from the request to the last token
+        ttft: Seconds to the first token
+        output_tokens: Generated tokens, used for the generation rate
+    """
+    values = {'duration_ms': duration * 1000}
+    if ttft is not None:
+        values['ttft_ms'] = ttft * 1000
+        if output_tokens and duration > ttft:
+            values['tokens_per_second'] = output_tokens / (duration - ttft)
+    fields = {'calls': 1}
+    for metric, value in values.items():
+        fields[f"{metric}:{bucket_index(value)}"] = 1
+    try:
+        _record_call(llm_model, fields)
+    except Exception as e:
+        logger.error(f"Error recording LLM call for model {llm_model.id}: {str(e)}")
+
+
+def record_llm_error(llm_model) -> None:
+    """Record a failed LLM call."""
+    try:
+        _record_call(llm_model, {'calls': 1, 'errors': 1})
+    except Exception as e:
+        logger.error(f"Error recording LLM error for model {llm_model.id}: {str(e)}")
+
+
+def _weighted_percentile(buckets: Dict[int, float], percentile: float) -> Optional[float]:
+    total = sum(buckets.values())
+    if not total:
+        return None
+    rank = total * percentile / 100
+    seen = 0.0
+    for index in sorted(buckets):
+        seen += buckets[index]
+        if seen >= rank:
+            return bucket_value(index)
+    return bucket_value(max(buckets))
+
+
+def llm_call_stats(llm_models: Iterable, percentiles: Sequence[float] = (50, 95, 99)) -> Dict[str, Dict]:
+    """
+    Time-decayed call statistics of LLM models, keyed by model id.
+
+    Counts of older windows are weighted down by half every LLM_STATS_HALF_LIFE
+    seconds, so the percentiles follow the recent traffic.
+
+    Returns:
+        Dict: Per model ``calls`` and ``errors`` (decayed counts), ``error_rate``
+        and, for each metric, a ``{"p50": value, ...}`` dict (None without samples)
+    """
+    llm_models = list(llm_models)
+    current = _window()
+    windows = range(current, current - settings.LLM_STATS_WINDOWS, -1)
+    pipe = redis_client.client.pipeline()
+    for llm_model in llm_models:
+        for window in windows:
+            pipe.hgetall(CALL_HISTOGRAM_KEY.format(model_id=llm_model.id, window=window))
+    results = iter(pipe.execute())
+
+    stats = {}
+    for llm_model in llm_models:
+        counts = defaultdict(float)
+        buckets = {metric: defaultdict(float) for metric in CALL_METRICS}
+        for window in windows:
+            weight = 0.5 ** ((current - window) * settings.LLM_STATS_WINDOW / settings.LLM_STATS_HALF_LIFE)
+            for field, count in next(results).items():
+                metric, _, index = field.partition(':')
+                if index:
+                    buckets[metric][int(index)] += int(count) * weight
+                else:
+                    counts[metric] += int(count) * weight
+        model_stats = {
+            'calls': round(counts['calls'], 2),
+            'errors': round(counts['errors'], 2),
+            'error_rate': counts['errors'] / counts['calls'] if counts['calls'] else 0.0
+        }
+        for metric in CALL_METRICS:
+            model_stats[metric] = {}
+            for percentile in percentiles:
+                value = _weighted_percentile(buckets[metric], percentile)
+                model_stats[metric][f"p{percentile:g}"] = round(value, 1) if value is not None else None
+        stats[str(llm_model.id)] = model_stats
+    return stats
+
+
+def record_prompt_cache(agent, usage: Dict[str, int]) -> None:
+    """
+    Accumulate provider-reported prompt cache usage for an agent.
+    
+    Args:
+        agent: The agent that made the call
+        usage: Normalised provider usage (input_tokens, cached_input_tokens, ...)
+    """
+    if not usage or 'input_tokens' not in usage:
+        return
+    cached = usage.get('cached_input_tokens', 0)
+    key = PROMPT_CACHE_KEY.format(agent_id=agent.id)
+    try:
+        pipe = redis_client.client.pipeline()
+        pipe.hincrby(key, 'requests', 1)
+        pipe.hincrby(key, 'hits', 1 if cached else 0)
+        pipe.hincrby(key, 'input_tokens', usage['input_tokens'])
+        pipe.hincrby(key, 'cached_input_tokens', cached)
+        pipe.hincrby(key, 'cache_write_input_tokens', usage.get('cache_write_input_tokens', 0))
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error recording prompt cache usage for agent {agent.id}: {str(e)}")
+
+
+def prompt_cache_stats(agent_id) -> Dict[str, float]:
+    """
+    Return the prompt cache counters and hit rates of an agent, zero when
+    they cannot be read.
+    """
+    try:
+        raw = redis_client.client.hgetall(PROMPT_CACHE_KEY.format(agent_id=agent_id))
+    except Exception as e:
+        logger.error(f"Error reading prompt cache usage for agent {agent_id}: {str(e)}")
+        raw = {}
+    stats = {field: int(raw.get(field, 0)) for field in (
+        'requests', 'hits', 'input_tokens', 'cached_input_tokens', 'cache_write_input_tokens'
+    )}
+    stats['hit_rate'] = stats['hits'] / stats['requests'] if stats['requests'] else 0.0
+    stats['cached_token_ratio'] = (
+        stats['cached_input_tokens'] / stats['input_tokens'] if stats['input_tokens'] else 0.0
+    )
+    return stats
+
+
+class HedgeBudget:
+    """
+    Caps hedged requests to a fraction of hedge-eligible requests per minute.
+    The first ``burst`` hedges of a minute are always allowed, so that low
+    traffic can hedge at all.
+    """
+
+    def __init__(self, ratio: float, burst: int = 0):
+        self.ratio = ratio
+        self.burst = burst
+
+    @staticmethod
+    def _key() -> str:
+        return HEDGE_BUDGET_KEY.format(window=int(time.time() // 60))
+
+    def record_request(self) -> None:
+        """Count a request that could be hedged."""
+        key = self._key()
+        try:
+            pipe = redis_client.client.pipeline()
+            pipe.hincrby(key, 'requests', 1)
+            pipe.expire(key, 120)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Error recording hedge budget request: {str(e)}")
+
+    def try_spend(self) -> bool:
+        """Reserve one hedge if the budget for the current minute allows it."""
+        try:
+            return bool(_try_hedge(keys=[self._key()], args=[self.ratio, 120, self.burst]))
+        except Exception as e:
+            logger.error(f"Error checking hedge budget: {str(e)}")
+            return False
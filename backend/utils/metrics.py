@@ -0,0 +1,100 @@
+"""
+Cluster-wide metrics exported through the Django Prometheus endpoint.
+
+Celery workers run in many processes on many hosts, so they cannot expose a
+process-local Prometheus registry. Instead they increment counters in a Redis
+hash, and the collector registered here reads that hash (plus any gauge
+sources, such as rate limiter saturation) at scrape time.
+"""
+import logging
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+from utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+METRICS_COUNTERS_KEY = "metrics:counters"
+
+# A gauge source returns (name, documentation, [(labels, value), ...]) tuples
+GaugeSource = Callable[[], Iterable[Tuple[str, str, List[Tuple[Dict[str, str], float]]]]]
+
+_gauge_sources: List[GaugeSource] = []
+_registered = False
+
+
+def _encode_field(name: str, labels: Dict[str, str]) -> str:
+    label_str = ','.join(f"{key}={value}" for key, value in sorted(labels.items()))
+    return f"{name}|{label_str}"
+
+
+def _decode_field(field: str) -> Tuple[str, Dict[str, str]]:
+    name, _, label_str = field.partition('|')
+    labels = dict(item.split('=', 1) for item in label_str.split(',') if item)
+    return name, labels
+
+
+def incr(name: str, amount: float = 1, **labels) -> None:
+    """
+    Increment a cluster-wide counter.
+
+    Args:
+        name: Metric name without the ``magi_`` prefix
+        amount: Increment value
+        **labels: Metric labels
+    """
+    try:
+        redis_client.client.hincrbyfloat(METRICS_COUNTERS_KEY, _encode_field(name, labels), amount)
+    except Exception as e:
+        logger.error(f"Error incrementing metric {name}: {str(e)}")
+
+
+def register_gauge_source(source: GaugeSource) -> None:
+    """Register a callable that produces gauges at scrape time."""
+    if source not in _gauge_sources:
+        _gauge_sources.append(source)
+
+
+class RedisMetricsCollector:
+    """Prometheus collector reading counters and gauges from shared state."""
+
+    def describe(self):
+        # Metric names are only known at scrape time, skip collecting on registration
+        return []
+
+    def collect(self):
+        try:
+            counters = redis_client.client.hgetall(METRICS_COUNTERS_KEY)
+        except Exception as e:
+            logger.error(f"Error reading metrics from Redis: {str(e)}")
+            counters = {}
+
+        families: Dict[Tuple[str, tuple], CounterMetricFamily] = {}
+        for field, value in counters.items():
+            name, labels = _decode_field(field)
+            family = families.get((name, tuple(sorted(labels))))
+            if family is None:
+                family = CounterMetricFamily(f"magi_{name}", name.replace('_', ' '), labels=sorted(labels))
+                families[(name, tuple(sorted(labels)))] = family
+            family.add_metric([labels[key] for key in sorted(labels)], float(value))
+        yield from families.values()
+
+        for source in _gauge_sources:
+            try:
+                for name, documentation, samples in source():
+                    label_names = sorted(samples[0][0]) if samples else []
+                    gauge = GaugeMetricFamily(f"magi_{name}", documentation, labels=label_names)
+                    for labels, value in samples:
+                        gauge.add_metric([labels[key] for key in label_names], value)
+                    yield gauge
+            except Exception as e:
+                logger.error(f"Error collecting gauges from {source}: {str(e)}")
+
+
+def register_collector() -> None:
+    """Register the Redis collector with the default Prometheus registry once."""
+    global _registered
+    if not _registered:
+        REGISTRY.register(RedisMetricsCollector())
+        _registered = True
@@ -0,0 +1,164 @@
+"""
+Latency-aware routing between providers serving the same model.
+
+The router keeps an exponentially weighted moving average of time to first
+token, its variance and the error rate of every LLM model in Redis, updated
+in O(1) from the calls it routes. Each call goes to the candidate with the
+lowest expected latency, the TTFT average inflated by its error rate.
+Candidates within LLM_ROUTER_TIE_TOLERANCE of the best score are ties, broken
+by provider priority and then in favour of the agent's configured model. A
+configured model marked degraded by the health probes goes last. A process
+keeps routing a model to its previous choice until another candidate is
+better by more than LLM_ROUTER_STICKINESS, so traffic does not flap between
+providers with similar scores.
+
+The same averages set the hedge delay: a hedge is started once the primary
+provider is slower than the LLM_HEDGE_PERCENTILE of its time to first token,
+estimated from the mean and standard deviation.
+
+Averages expire LLM_ROUTER_STATS_TTL seconds after the last call, so a
+provider that was avoided while slow gets traffic again later.
+"""
+import logging
+import math
+import threading
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+ROUTER_STATS_KEY = "llmrouter:{model_id}"
+
+# TTFT samples needed before the hedge delay follows the model's own latency
+HEDGE_MIN_SAMPLES = 20
+
+# KEYS[1] = model stats hash, ARGV[1] = alpha, ARGV[2] = ttft seconds or '',
+# ARGV[3] = 1 for an error else 0, ARGV[4] = ttl
+OBSERVE_SCRIPT = """
+local alpha = tonumber(ARGV[1])
+local error_rate = tonumber(redis.call('HGET', KEYS[1], 'error_rate') or '0')
+redis.call('HSET', KEYS[1], 'error_rate', error_rate + alpha * (tonumber(ARGV[3]) - error_rate))
+if ARGV[2] ~= '' then
+    local sample = tonumber(ARGV[2])
+    local ttft = tonumber(redis.call('HGET', KEYS[1], 'ttft') or ARGV[2])
+    local variance = tonumber(redis.call('HGET', KEYS[1], 'ttft_var') or '0')
+    local diff = sample - ttft
+    redis.call('HSET', KEYS[1], 'ttft', ttft + alpha * diff,
+               'ttft_var', (1 - alpha) * (variance + alpha * diff * diff))
+    redis.call('HINCRBY', KEYS[1], 'samples', 1)
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return 1
+"""
+
+
+class ModelRouter:
+    """
+    Order the models able to serve an agent's call by their live scores.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or redis_client.client
+        self._observe = self.client.register_script(OBSERVE_SCRIPT)
+        # Last choice per configured model id, for stickiness
+        self._chosen: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def score(stats: Dict[str, str]) -> float:
+        """Expected seconds to first token, higher for models that fail often."""
+        ttft = float(stats.get('ttft', settings.LLM_ROUTER_DEFAULT_TTFT))
+        error_rate = float(stats.get('error_rate', 0))
+        return ttft * (1 + settings.LLM_ROUTER_ERROR_PENALTY * error_rate)
+
+    def scores(self, llm_models: List) -> Dict[str, float]:
+        """Score of every model by id, unknown models get the default score."""
+        try:
+            pipe = self.client.pipeline()
+            for llm_model in llm_models:
+                pipe.hgetall(ROUTER_STATS_KEY.format(model_id=llm_model.id))
+            results = pipe.execute()
+        except Exception as e:
+            logger.error(f"Error reading routing scores: {str(e)}")
+            results = [{} for _ in llm_models]
+        return {str(llm_model.id): self.score(stats) for llm_model, stats in zip(llm_models, results)}
+
+    def rank(self, llm_model, alternates: List) -> List:
+        """
+        Return the agent's model and its alternates, the model to call first
+        followed by the others from best to worst score.
+
+        Args:
+            llm_model: The agent's configured model
+            alternates: Other models serving the same API model
+        """
+        candidates = [llm_model] + list(alternates)
+        # A model degraded by the health probes is only used when nothing else is available
+        degraded = []
+        if llm_model.is_degraded and alternates:
+            candidates, degraded = list(alternates), [llm_model]
+        if len(candidates) == 1 or not settings.LLM_ROUTING_ENABLED:
+            return candidates + degraded
+
+        scores = self.scores(candidates)
+        best = min(scores.values())
+        # Stable sort, so the configured model wins ties of equal priority
+        ties = sorted(
+            (candidate for candidate in candidates
+             if scores[str(candidate.id)] <= best * (1 + settings.LLM_ROUTER_TIE_TOLERANCE)),
+            key=lambda candidate: -candidate.provider.priority
+        )
+        chosen = ties[0]
+
+        key = str(llm_model.id)
+        with self._lock:
+            previous = self._chosen.get(key)
+            if previous in scores and previous != str(chosen.id) and (
+                scores[previous] <= scores[str(chosen.id)] * (1 + settings.LLM_ROUTER_STICKINESS)
+            ):
+                chosen = next(candidate for candidate in candidates if str(candidate.id) == previous)
+            self._chosen[key] = str(chosen.id)
+
+        others = sorted(
+            (candidate for candidate in candidates if candidate is not chosen),
+            key=lambda candidate: (scores[str(candidate.id)], -candidate.provider.priority)
+        )
+        return [chosen] + others + degraded
+
+    def hedge_delay(self, llm_model) -> float:
+        """
+        Seconds to wait for the model's first token before hedging, the
+        LLM_HEDGE_PERCENTILE of its time to first token.
+        """
+        try:
+            stats = self.client.hgetall(ROUTER_STATS_KEY.format(model_id=llm_model.id))
+        except Exception as e:
+            logger.error(f"Error reading TTFT for model {llm_model.id}: {str(e)}")
+            stats = {}
+        if int(stats.get('samples', 0)) < HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        z = NormalDist().inv_cdf(settings.LLM_HEDGE_PERCENTILE / 100)
+        delay = float(stats['ttft']) + z * math.sqrt(float(stats['ttft_var']))
+        return min(max(delay, settings.LLM_HEDGE_MIN_DELAY), settings.LLM_HEDGE_MAX_DELAY)
+
+    def observe(self, llm_model, ttft: Optional[float] = None, error: bool = False) -> None:
+        """Fold the outcome of a call into the model's moving averages."""
+        try:
+            self._observe(
+                keys=[ROUTER_STATS_KEY.format(model_id=llm_model.id)],
+                args=[
+                    settings.LLM_ROUTER_ALPHA,
+                    '' if ttft is None else round(ttft, 4),
+                    1 if error else 0,
+                    settings.LLM_ROUTER_STATS_TTL
+                ]
+            )
+        except Exception as e:
+            logger.error(f"Error updating routing stats for model {llm_model.id}: {str(e)}")
+
+
+model_router = ModelRouter()
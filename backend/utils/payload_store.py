@@ -0,0 +1,112 @@
+"""
+Content-addressed store for large task payloads.
+
+A dispatcher stores a payload once in Redis under its SHA-256 digest and
+passes only the reference to its subtasks, instead of copying the payload
+into every task message. Workers fetch it on first use and keep recently used
+payloads in a process-local LRU, so agents of one request sharing a worker
+read it from Redis once.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_KEY = "payload:{digest}"
+
+# Message field holding the reference of a payload moved out of the message
+REF_SUFFIX = '_ref'
+
+
+class PayloadMissing(KeyError):
+    """The payload expired or was never stored."""
+
+
+class PayloadStore:
+    """
+    Store payloads in Redis by content hash, with a local LRU for reads.
+    """
+
+    def __init__(self, client=None, ttl: Optional[int] = None, cache_size: Optional[int] = None):
+        self.client = client or redis_client.client
+        self.ttl = ttl or settings.PAYLOAD_STORE_TTL
+        self.cache_size = settings.PAYLOAD_STORE_CACHE_SIZE if cache_size is None else cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, ref: str, payload: str) -> None:
+        with self._lock:
+            self._cache[ref] = payload
+            self._cache.move_to_end(ref)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def put(self, payload: str) -> str:
+        """
+        Store a payload, or extend the TTL of an identical one already stored.
+
+        Returns:
+            str: The payload reference (its SHA-256 hex digest)
+        """
+        ref = hashlib.sha256(payload.encode()).hexdigest()
+        # Identical content under the same key, so overwriting is safe and,
+        # unlike SET NX followed by EXPIRE, cannot race with the key expiring
+        self.client.set(PAYLOAD_KEY.format(digest=ref), payload, ex=self.ttl)
+        self._remember(ref, payload)
+        return ref
+
+    def get(self, ref: str) -> str:
+        """
+        Fetch a payload by reference.
+
+        Raises:
+            PayloadMissing: If the payload expired or was never stored
+        """
+        with self._lock:
+            payload = self._cache.get(ref)
+            if payload is not None:
+                self._cache.move_to_end(ref)
+                return payload
+        payload = self.client.get(PAYLOAD_KEY.format(digest=ref))
+        if payload is None:
+            raise PayloadMissing(ref)
+        if isinstance(payload, bytes):
+            payload = payload.decode()
+        self._remember(ref, payload)
+        return payload
+
+    def detach(self, message: Dict[str, Any], field: str) -> Dict[str, Any]:
+        """
+        Return a copy of ``message`` with ``field`` replaced by a reference,
+        when the field is at least PAYLOAD_STORE_MIN_SIZE characters long.
+        """
+        value = message.get(field)
+        if not isinstance(value, str) or len(value) < settings.PAYLOAD_STORE_MIN_SIZE:
+            return message
+        detached = {key: item for key, item in message.items() if key != field}
+        detached[field + REF_SUFFIX] = self.put(value)
+        return detached
+
+    def attach(self, message: Dict[str, Any], field: str) -> Dict[str, Any]:
+        """
+        Return a copy of ``message`` with a detached ``field`` fetched back.
+
+        Raises:
+            PayloadMissing: If the payload expired or was never stored
+        """
+        ref = message.get(field + REF_SUFFIX)
+        if ref is None:
+            return message
+        attached = {key: item for key, item in message.items() if key != field + REF_SUFFIX}
+        attached[field] = self.get(ref)
+        return attached
+
+
+payload_store = PayloadStore()
@@ -0,0 +1,302 @@
+"""
+Cluster-wide capacity control for LLM providers.
+
+Every Celery worker calls the provider APIs independently, so limits have to
+be enforced in Redis rather than per process. A call acquires capacity on two
+scopes, its provider and its model, each of which may define:
+
+- requests per minute and tokens per minute, as token buckets
+- max concurrent streams, as a semaphore of leases with an expiry
+
+Callers wait in a FIFO queue per model, so a burst of judgements is served in
+arrival order instead of failing with 429 errors. The queue belongs to the
+narrowest scope, so a call waiting for a saturated model never holds up the
+other models of its provider, which only compete for the provider's capacity.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from utils import metrics
+from utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = model wait queue, KEYS[2] = waiter heartbeats,
+# then three keys per scope: rpm bucket, tpm bucket, stream semaphore
+# ARGV[1] = now (ms), ARGV[2] = ticket, ARGV[3] = heartbeat ttl (ms),
+# ARGV[4] = lease ttl (ms), ARGV[5] = estimated tokens,
+# then three limits per scope: rpm, tpm, max streams (0 means unlimited)
+# Returns {granted, reason, retry_after_ms}
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local ticket = ARGV[2]
+local cost = tonumber(ARGV[5])
+
+-- Forget waiters that stopped polling, they must not block the queue
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, waiter in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], waiter)
+    redis.call('ZREM', KEYS[2], waiter)
+end
+
+if not redis.call('ZSCORE', KEYS[1], ticket) then
+    redis.call('ZADD', KEYS[1], now, ticket)
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), ticket)
+redis.call('PEXPIRE', KEYS[1], 600000)
+redis.call('PEXPIRE', KEYS[2], 600000)
+
+local head = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+if head ~= ticket then
+    return {0, 'queued', 50}
+end
+
+local function refill(key, capacity)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, tokens + (now - ts) * capacity / 60000)
+end
+
+local scopes = (#KEYS - 2) / 3
+local levels = {}
+for i = 0, scopes - 1 do
+    local rpm = tonumber(ARGV[6 + i * 3])
+    local tpm = tonumber(ARGV[7 + i * 3])
+    local streams = tonumber(ARGV[8 + i * 3])
+    local rpm_key, tpm_key, sem_key = KEYS[3 + i * 3], KEYS[4 + i * 3], KEYS[5 + i * 3]
+
+    if streams > 0 then
+        redis.call('ZREMRANGEBYSCORE', sem_key, '-inf', now)
+        if redis.call('ZCARD', sem_key) >= streams then
+            return {0, 'concurrency', 100}
+        end
+    end
+    if rpm > 0 then
+        local tokens = refill(rpm_key, rpm)
+        if tokens < 1 then
+            return {0, 'requests', math.ceil((1 - tokens) * 60000 / rpm)}
+        end
+        levels[rpm_key] = tokens - 1
+    end
+    if tpm > 0 then
+        local needed = math.min(cost, tpm)
+        local tokens = refill(tpm_key, tpm)
+        if tokens < needed then
+            return {0, 'tokens', math.ceil((needed - tokens) * 60000 / tpm)}
+        end
+        levels[tpm_key] = tokens - needed
+    end
+end
+
+for key, tokens in pairs(levels) do
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, 120000)
+end
+for i = 0, scopes - 1 do
+    if tonumber(ARGV[8 + i * 3]) > 0 then
+        redis.call('ZADD', KEYS[5 + i * 3], now + tonumber(ARGV[4]), ticket)
+        redis.call('PEXPIRE', KEYS[5 + i * 3], tonumber(ARGV[4]))
+    end
+end
+redis.call('ZREM', KEYS[1], ticket)
+redis.call('ZREM', KEYS[2], ticket)
+return {1, 'ok', 0}
+"""
+
+# KEYS = tpm bucket and semaphore per scope
+# ARGV[1] = ticket, ARGV[2] = token correction (actual - estimated)
+RELEASE_SCRIPT = """
+local correction = tonumber(ARGV[2])
+for i = 1, #KEYS, 2 do
+    redis.call('ZREM', KEYS[i + 1], ARGV[1])
+    if correction ~= 0 and redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('HINCRBYFLOAT', KEYS[i], 'tokens', -correction)
+    end
+end
+return 1
+"""
+
+# KEYS[1] = wait queue, KEYS[2] = waiter heartbeats, ARGV[1] = ticket
+ABANDON_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+
+class RateLimitTimeout(Exception):
+    """Raised when capacity could not be acquired within the queue timeout."""
+
+
+def _scope_key(scope: str, kind: str) -> str:
+    return f"ratelimit:{scope}:{kind}"
+
+
+def estimate_tokens(*texts: str, max_tokens: Optional[int] = None) -> int:
+    """Rough token estimate (four characters per token) used for TPM accounting."""
+    prompt_tokens = sum(len(text or '') for text in texts) // 4
+    return prompt_tokens + (max_tokens or 0)
+
+
+class Lease:
+    """Capacity held by one LLM call until it is released."""
+
+    def __init__(self, ticket: str, scopes: List[str], estimated_tokens: int):
+        self.ticket = ticket
+        self.scopes = scopes
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+        self.waited = 0.0
+
+
+class ProviderRateLimiter:
+    """
+    Acquire and release provider capacity through atomic Redis scripts.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or redis_client.client
+        self._acquire = self.client.register_script(ACQUIRE_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+        self._abandon = self.client.register_script(ABANDON_SCRIPT)
+
+    @staticmethod
+    def scopes_for(llm_model) -> List[Dict[str, Any]]:
+        """Return the limited scopes (provider, then model) of an LLM model."""
+        provider = llm_model.provider
+        return [
+            {
+                'scope': f"provider:{provider.id}",
+                'rpm': provider.requests_per_minute or 0,
+                'tpm': provider.tokens_per_minute or 0,
+                'streams': provider.max_concurrent_streams or 0,
+            },
+            {
+                'scope': f"model:{llm_model.id}",
+                'rpm': llm_model.requests_per_minute or 0,
+                'tpm': llm_model.tokens_per_minute or 0,
+                'streams': llm_model.max_concurrent_streams or 0,
+            },
+        ]
+
+    async def acquire(self, llm_model, estimated_tokens: int = 0, timeout: Optional[float] = None) -> Lease:
+        """
+        Wait in the model's queue until every scope has capacity.
+
+        Args:
+            llm_model: The LLMModel (with its provider) about to be called
+            estimated_tokens: Expected prompt plus completion tokens
+            timeout: Maximum seconds to wait, defaults to RATE_LIMIT_QUEUE_TIMEOUT
+
+        Returns:
+            Lease: The acquired capacity, to be passed to release()
+        """
+        timeout = settings.RATE_LIMIT_QUEUE_TIMEOUT if timeout is None else timeout
+        scopes = self.scopes_for(llm_model)
+        provider_scope, queue_scope = scopes[0]['scope'], scopes[-1]['scope']
+        ticket = uuid.uuid4().hex
+        keys = [_scope_key(queue_scope, 'queue'), _scope_key(queue_scope, 'waiters')]
+        args = [0, ticket, settings.RATE_LIMIT_HEARTBEAT_TTL * 1000, settings.RATE_LIMIT_LEASE_TTL * 1000, estimated_tokens]
+        for scope in scopes:
+            keys += [_scope_key(scope['scope'], 'rpm'), _scope_key(scope['scope'], 'tpm'), _scope_key(scope['scope'], 'streams')]
+            args += [scope['rpm'], scope['tpm'], scope['streams']]
+
+        started = time.monotonic()
+        throttled_reason = None
+        try:
+            while True:
+                args[0] = int(time.time() * 1000)
+                # Off the event loop, which may be serving many other calls
+                granted, reason, retry_after = await asyncio.to_thread(self._acquire, keys=keys, args=args)
+                if int(granted):
+                    break
+                if throttled_reason is None:
+                    throttled_reason = reason
+                    await asyncio.to_thread(
+                        metrics.incr, 'llm_rate_limit_throttled_total', provider=provider_scope, reason=reason
+                    )
+                if time.monotonic() - started > timeout:
+                    raise RateLimitTimeout(
+                        f"No capacity on {llm_model.provider.name} after {timeout}s ({reason})"
+                    )
+                await asyncio.sleep(min(int(retry_after), 1000) / 1000)
+        except BaseException:
+            await asyncio.to_thread(
+                self._give_up, keys[:2], Lease(ticket, [scope['scope'] for scope in scopes], estimated_tokens)
+            )
+            raise
+
+        lease = Lease(ticket, [scope['scope'] for scope in scopes], estimated_tokens)
+        lease.waited = time.monotonic() - started
+        if throttled_reason:
+            await asyncio.to_thread(
+                metrics.incr, 'llm_rate_limit_wait_seconds_total', lease.waited, provider=provider_scope
+            )
+        return lease
+
+    def _give_up(self, queue_keys: List[str], lease: Lease) -> None:
+        # Leave the queue, and return the lease in case a cancelled call was
+        # granted while its script ran in a worker thread
+        self._abandon(keys=queue_keys, args=[lease.ticket])
+        self.release(lease)
+
+    def release(self, lease: Lease) -> None:
+        """Return concurrency and correct the token bucket with the actual usage."""
+        keys = []
+        for scope in lease.scopes:
+            keys += [_scope_key(scope, 'tpm'), _scope_key(scope, 'streams')]
+        correction = 0
+        if lease.actual_tokens is not None:
+            correction = lease.actual_tokens - lease.estimated_tokens
+        try:
+            self._release(keys=keys, args=[lease.ticket, correction])
+        except Exception as e:
+            logger.error(f"Error releasing rate limit lease {lease.ticket}: {str(e)}")
+
+    @asynccontextmanager
+    async def slot(self, llm_model, estimated_tokens: int = 0, timeout: Optional[float] = None):
+        """Hold provider capacity for the duration of the block."""
+        lease = await self.acquire(llm_model, estimated_tokens, timeout)
+        try:
+            yield lease
+        finally:
+            await asyncio.to_thread(self.release, lease)
+
+
+def saturation_metrics():
+    """
+    Gauge source reporting in-flight streams, stream limits and queue depth
+    for every active provider and model.
+    """
+    from apps.llm_providers.models import LLMModel
+
+    now = int(time.time() * 1000)
+    in_flight, limits, queued = [], [], []
+    models = LLMModel.objects.filter(is_active=True, provider__is_active=True).select_related('provider')
+    seen = set()
+    for llm_model in models:
+        for scope in ProviderRateLimiter.scopes_for(llm_model):
+            if scope['scope'] in seen:
+                continue
+            seen.add(scope['scope'])
+            labels = {'scope': scope['scope']}
+            in_flight.append((labels, redis_client.client.zcount(_scope_key(scope['scope'], 'streams'), now, '+inf')))
+            limits.append((labels, scope['streams']))
+            if scope['scope'].startswith('model:'):
+                queued.append((labels, redis_client.client.zcard(_scope_key(scope['scope'], 'queue'))))
+    return [
+        ('llm_streams_in_flight', 'LLM streams currently holding a concurrency lease', in_flight),
+        ('llm_streams_limit', 'Configured max concurrent streams, 0 means unlimited', limits),
+        ('llm_rate_limit_queue_depth', 'Calls waiting in the model queue for capacity', queued),
+    ]
+
+
+# Shared limiter instance
+rate_limiter = ProviderRateLimiter()
@@ -17,6 +17,9 @@ class RedisChannels:
     # Results stream template, will be formatted with session_id
     RESULTS_STREAM = "session:results:{session_id}"
     
+    # Per-request stream of individual agent results, tallied by tasks.aggregation
+    AGENT_RESULTS_STREAM = "session:agent_results:{session_id}:{request_id}"
+    
     @classmethod
     def agent_task_stream(cls, session_id: str) -> str:
         """
@@ -42,3 +45,17 @@ class RedisChannels:
             str: The formatted stream name
         """
         return cls.RESULTS_STREAM.format(session_id=session_id)
+    
+    @classmethod
+    def agent_results_stream(cls, session_id: str, request_id: str) -> str:
+        """
+        Get the agent results stream name for a specific request.
+        
+        Args:
+            session_id: The unique session identifier
+            request_id: The unique request identifier
+            
+        Returns:
+            str: The formatted stream name
+        """
+        return cls.AGENT_RESULTS_STREAM.format(session_id=session_id, request_id=request_id)
@@ -0,0 +1,36 @@
+"""
+Fast JSON rendering for large list responses.
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+_encoder = encoders.JSONEncoder()
+
+
+def json_dumps(data) -> bytes:
+    """Compact JSON encoding of API data, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_encoder.default, option=orjson.OPT_UTC_Z)
+    return json.dumps(data, cls=encoders.JSONEncoder, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Render JSON with orjson, which serialises UUIDs and datetimes natively.
+
+    Falls back to the standard DRF renderer when orjson is not installed or
+    when indented output is requested, e.g. by the browsable API.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return json_dumps(data)
@@ -0,0 +1,80 @@
+"""
+Compact delta frames for streamed agent output.
+
+Sessions that negotiate the ``delta`` stream format receive one
+``stream_open`` frame declaring a numeric stream id per agent, then a
+``{"s": stream id, "q": sequence, "d": text}`` frame per chunk instead of the
+full agent_response envelope, and a ``stream_close`` frame per stream. The
+gateway forwards delta frames to the client without decoding them.
+
+Delta frames carry no request id, so stream ids are allocated from a counter
+per session and are never reused by another request of the session, even
+while several requests stream at once.
+"""
+import json
+from datetime import datetime
+from typing import Dict, Optional
+
+STREAM_FORMAT_JSON = 'json'
+STREAM_FORMAT_DELTA = 'delta'
+
+STREAM_COUNTER_KEY = "session:stream_ids:{session_id}"
+# Kept for a day after the session's last request
+STREAM_COUNTER_TTL = 24 * 3600
+
+
+def stream_ids(client, session_id: str, message: Dict, agent_ids) -> Optional[Dict[str, int]]:
+    """
+    Allocate a stream id for every agent of a request, unique within the session.
+
+    Args:
+        client: Redis client holding the session's stream id counter
+        session_id: Session identifier
+        message: The request message
+        agent_ids: Agents streaming their output
+
+    Returns:
+        Optional[Dict[str, int]]: Stream id per agent id, None when the session streams full messages
+    """
+    if message.get('stream_format') != STREAM_FORMAT_DELTA:
+        return None
+    agent_ids = list(agent_ids)
+    if not agent_ids:
+        return {}
+    key = STREAM_COUNTER_KEY.format(session_id=session_id)
+    pipe = client.pipeline()
+    pipe.incrby(key, len(agent_ids))
+    pipe.expire(key, STREAM_COUNTER_TTL)
+    last, _ = pipe.execute()
+    first = int(last) - len(agent_ids) + 1
+    return {agent_id: stream_id for stream_id, agent_id in enumerate(agent_ids, start=first)}
+
+
+def stream_open(session_id: str, request_id: str, streams: Dict[str, int]) -> str:
+    return json.dumps({
+        "type": "stream_open",
+        "session_id": session_id,
+        "request_id": request_id,
+        "streams": [{"s": stream_id, "agent_id": agent_id} for agent_id, stream_id in streams.items()],
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+class DeltaStream:
+    """Encoder for the delta frames of one stream, with the fixed prefix encoded once."""
+
+    def __init__(self, stream_id: int):
+        self.stream_id = stream_id
+        self.seq = 0
+        self.closed = False
+        self._prefix = f'{{"s":{stream_id},"q":'
+
+    def frame(self, text: str) -> str:
+        frame = f'{self._prefix}{self.seq},"d":{json.dumps(text)}}}'
+        self.seq += 1
+        return frame
+
+    def close(self) -> str:
+        """Closing frame, ``n`` is the number of delta frames sent."""
+        self.closed = True
+        return f'{{"type":"stream_close","s":{self.stream_id},"n":{self.seq}}}'
@@ -0,0 +1,67 @@
+"""
+Request tracing across the gateway, the Redis channels and Celery.
+
+The gateway starts a trace for sampled requests and sends its context in the
+``traceparent`` field (W3C format) of the Redis message. Backend hops open
+spans under that context, and Celery carries it to subtasks in the
+``traceparent`` task header together with the publish time, from which the
+queue wait is recorded when a worker picks the task up.
+
+Spans are recorded and exported by the magi_spans package, shared with
+the gateway. Queue wait spans compare wall clocks of two hosts, so they are
+only as accurate as the hosts' clock synchronisation.
+"""
+import time
+from typing import Dict
+
+import magi_spans as spans
+from django.conf import settings
+from magi_spans import (  # noqa: F401
+    TRACEPARENT_FIELD, Span, SpanContext, SpanExporter, current_traceparent, get_exporter, parse_traceparent,
+    record_span, span, start_span, to_otlp,
+)
+
+PUBLISHED_AT_HEADER = 'trace_published_at'
+
+spans.configure(settings)
+
+
+# Celery propagation
+
+_task_spans: Dict[str, Span] = {}
+
+
+def _inject_task_headers(headers=None, **kwargs) -> None:
+    traceparent = current_traceparent()
+    if traceparent and headers is not None:
+        headers[TRACEPARENT_FIELD] = traceparent
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def _start_task_span(task_id=None, task=None, **kwargs) -> None:
+    traceparent = task.request.get(TRACEPARENT_FIELD)
+    if not traceparent:
+        return
+    published_at = task.request.get(PUBLISHED_AT_HEADER)
+    if published_at:
+        record_span('celery.queue_wait', float(published_at), time.time(), traceparent, task=task.name)
+    task_span = start_span(f'celery.task:{task.name}', traceparent)
+    if task_span is not None:
+        task_span.activate()
+        _task_spans[task_id] = task_span
+
+
+def _end_task_span(task_id=None, state=None, **kwargs) -> None:
+    task_span = _task_spans.pop(task_id, None)
+    if task_span is not None:
+        task_span.attributes['state'] = state
+        task_span.end()
+
+
+def connect_celery_signals() -> None:
+    """Carry trace context through task headers and time queue wait and execution."""
+    from celery.signals import before_task_publish, task_postrun, task_prerun
+
+    before_task_publish.connect(_inject_task_headers, weak=False)
+    task_prerun.connect(_start_task_span, weak=False)
+    task_postrun.connect(_end_task_span, weak=False)
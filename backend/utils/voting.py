@@ -0,0 +1,158 @@
+"""
+Weighted voting helpers shared by the judgement dispatchers.
+
+A judgement is accepted when the POSITIVE weight is a strict majority of the
+total weight, which generalises the "two of three" rule used by the MAGI demo.
+Agents that finish without an explicit decision count as NEGATIVE.
+"""
+import re
+from typing import Dict, Optional, Tuple
+
+POSITIVE = 'POSITIVE'
+NEGATIVE = 'NEGATIVE'
+
+DECISION_PATTERN = re.compile(r"<decision>\s*(POSITIVE|NEGATIVE)\s*</decision>", re.IGNORECASE)
+
+# Tally hash and cancellation flag for one judgement request
+JUDGEMENT_TALLY_KEY = "judgement:{session_id}:{request_id}:tally"
+JUDGEMENT_CANCEL_KEY = "judgement:{session_id}:{request_id}:cancelled"
+
+# KEYS[1] = tally hash, KEYS[2] = cancellation flag
+# ARGV[1] = decision, ARGV[2] = agent weight, ARGV[3] = ttl in seconds
+# Returns {verdict, positive, negative, newly_decided}
+RECORD_VOTE_SCRIPT = """
+local total = redis.call('HGET', KEYS[1], 'total')
+if not total then
+    return false
+end
+total = tonumber(total)
+redis.call('HINCRBYFLOAT', KEYS[1], ARGV[1], ARGV[2])
+local positive = tonumber(redis.call('HGET', KEYS[1], 'POSITIVE') or '0')
+local negative = tonumber(redis.call('HGET', KEYS[1], 'NEGATIVE') or '0')
+local verdict = false
+if positive * 2 > total then
+    verdict = 'POSITIVE'
+elseif negative * 2 >= total then
+    verdict = 'NEGATIVE'
+end
+local decided = 0
+if verdict and redis.call('HSETNX', KEYS[1], 'verdict', verdict) == 1 then
+    redis.call('SET', KEYS[2], verdict, 'EX', tonumber(ARGV[3]))
+    decided = 1
+end
+verdict = redis.call('HGET', KEYS[1], 'verdict') or ''
+return {verdict, tostring(positive), tostring(negative), decided}
+"""
+
+
+def parse_decision(text: str) -> str:
+    """
+    Extract the agent's decision from its response text.
+
+    Args:
+        text: The full response text of the agent
+
+    Returns:
+        str: POSITIVE or NEGATIVE, defaulting to NEGATIVE when no tag is found
+    """
+    match = DECISION_PATTERN.search(text or '')
+    return match.group(1).upper() if match else NEGATIVE
+
+
+def decide(tally: Dict[str, float], total_weight: float) -> Optional[str]:
+    """
+    Return the verdict if the outstanding weight can no longer change it.
+
+    Args:
+        tally: Accumulated weight per decision
+        total_weight: Weight of every agent taking part in the judgement
+
+    Returns:
+        Optional[str]: The verdict, or None while it is still open
+    """
+    if tally.get(POSITIVE, 0.0) * 2 > total_weight:
+        return POSITIVE
+    if tally.get(NEGATIVE, 0.0) * 2 >= total_weight:
+        return NEGATIVE
+    return None
+
+
+class JudgementQuorum:
+    """
+    Cluster-wide weighted tally for one judgement request, kept in Redis so
+    that independent agent tasks can detect the moment the verdict is fixed.
+    """
+
+    def __init__(self, client, session_id: str, request_id: str, ttl: int = 3600):
+        self.client = client
+        self.ttl = ttl
+        self.tally_key = JUDGEMENT_TALLY_KEY.format(session_id=session_id, request_id=request_id)
+        self.cancel_key = JUDGEMENT_CANCEL_KEY.format(session_id=session_id, request_id=request_id)
+        self._record_vote = client.register_script(RECORD_VOTE_SCRIPT)
+
+    def open(self, total_weight: float) -> None:
+        """Initialise the tally before any agent task is queued."""
+        pipe = self.client.pipeline()
+        pipe.delete(self.tally_key, self.cancel_key)
+        pipe.hset(self.tally_key, 'total', total_weight)
+        pipe.expire(self.tally_key, self.ttl)
+        pipe.execute()
+
+    def record(self, decision: str, weight: float) -> Tuple[Optional[str], Dict[str, float], bool]:
+        """
+        Add an agent's weighted vote to the tally.
+
+        Returns:
+            Tuple of (verdict or None, vote distribution, whether this vote decided it)
+        """
+        result = self._record_vote(keys=[self.tally_key, self.cancel_key], args=[decision, weight, self.ttl])
+        if not result:
+            return None, {}, False
+        verdict, positive, negative, decided = (
+            value.decode() if isinstance(value, bytes) else value for value in result
+        )
+        distribution = {POSITIVE: float(positive), NEGATIVE: float(negative)}
+        return verdict or None, distribution, bool(int(decided))
+
+    def is_cancelled(self) -> bool:
+        """Whether the verdict is already fixed and remaining streams should stop."""
+        return bool(self.client.exists(self.cancel_key))
+
+
+class WeightedTally:
+    """
+    In-process tally of ``weight * confidence`` per vote, for a single
+    consumer that sees every agent result of a judgement. Each result costs
+    O(1) work regardless of the number of agents.
+    """
+
+    def __init__(self, total_weight: float):
+        self.total_weight = total_weight
+        self.remaining_weight = total_weight
+        self.distribution: Dict[str, float] = {}
+        self.received = 0
+
+    def add(self, vote: str, weight: float, confidence: float = 1.0) -> None:
+        """Add one agent result; ``weight`` is the agent's full voting weight."""
+        self.distribution[vote] = self.distribution.get(vote, 0.0) + weight * confidence
+        self.remaining_weight -= weight
+        self.received += 1
+
+    def leader(self) -> Optional[str]:
+        """The vote with the highest score so far."""
+        if not self.distribution:
+            return None
+        return max(self.distribution.items(), key=lambda item: item[1])[0]
+
+    def verdict(self) -> Optional[str]:
+        """
+        The leading vote once the outstanding agents can no longer overtake it,
+        otherwise None.
+        """
+        leader = self.leader()
+        if leader is None:
+            return None
+        runner_up = max((score for vote, score in self.distribution.items() if vote != leader), default=0.0)
+        if self.distribution[leader] > runner_up + max(self.remaining_weight, 0.0):
+            return leader
+        return None
@@ -39,6 +39,25 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Request tracing, spans are only exported when a path or an OTLP/HTTP endpoint is set
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0"))  # share of requests traced
+    TRACE_EXPORT_PATH: str = os.getenv("TRACE_EXPORT_PATH", "")  # JSON lines file
+    TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT", "")  # e.g. http://collector:4318/v1/traces
+    TRACE_SERVICE_NAME: str = os.getenv("TRACE_SERVICE_NAME", "magi-gateway")
+    
+    # Judgement deadlines (milliseconds), used when an agent_judgement frame has no deadline_ms.
+    # DEADLINE_APPID_DEFAULTS overrides the default per appid as "appid=ms,appid=ms", 0 means no deadline
+    DEADLINE_DEFAULT_MS: int = int(os.getenv("DEADLINE_DEFAULT_MS", "0"))
+    DEADLINE_APPID_DEFAULTS: str = os.getenv("DEADLINE_APPID_DEFAULTS", "")
+    
+    def get_deadline_default_ms(self, appid: str) -> int:
+        """Get the default judgement deadline of an appid"""
+        for item in self.DEADLINE_APPID_DEFAULTS.split(","):
+            name, _, value = item.partition("=")
+            if name.strip() == appid and value.strip():
+                return int(value)
+        return self.DEADLINE_DEFAULT_MS
+    
     # Backend service configurations
     BACKEND_URL: str = os.getenv("BACKEND_URL", "http://backend:8000")
 
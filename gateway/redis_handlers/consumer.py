@@ -6,9 +6,15 @@ from redis.asyncio import Redis
 from websocket_manager import ConnectionManager
 from .producer import get_redis_connection
 from config import settings
+from utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
+RESPONSES_PREFIX = "gateway:responses:"
+
+# Delta frames of streamed agent output start with their stream id
+DELTA_FRAME_PREFIX = '{"s":'
+
 class RedisConsumer:
     def __init__(self, connection_manager: ConnectionManager):
         self.connection_manager = connection_manager
@@ -46,6 +52,25 @@ class RedisConsumer:
             
         await self.connection_manager.send_message(session_id, message)
         logger.debug(f"Processed message for session {session_id}")
+
+    async def handle_raw(self, channel: str, data: str):
+        """Route a raw pub/sub payload, forwarding delta frames without decoding them"""
+        session_id = channel[len(RESPONSES_PREFIX):] if channel.startswith(RESPONSES_PREFIX) else None
+        if session_id and data.startswith(DELTA_FRAME_PREFIX):
+            await self.connection_manager.send_text(session_id, data)
+            return
+
+        message_data = json.loads(data)
+        # Frames such as stream_close only carry the session in their channel
+        if session_id and not message_data.get("session_id"):
+            message_data["session_id"] = session_id
+        # Final responses carry the request's trace context, streaming chunks are not timed
+        traceparent = message_data.get("traceparent")
+        if not traceparent or message_data.get("status") == "streaming":
+            await self.process_message(message_data)
+            return
+        with span("gateway.send", traceparent, type=message_data.get("type"), status=message_data.get("status")):
+            await self.process_message(message_data)
     
     async def consume_messages(self):
         """Start consuming messages from Redis queues"""
@@ -77,8 +102,7 @@ class RedisConsumer:
                     if not data:
                         continue
                         
-                    message_data = json.loads(data)
-                    await self.process_message(message_data)
+                    await self.handle_raw(channel, data)
                     
                 except json.JSONDecodeError:
                     logger.error(f"Failed to decode message: {message}")
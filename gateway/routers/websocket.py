@@ -3,17 +3,22 @@ from typing import Optional
 import json
 import logging
 from utils.auth import verify_appid_token, generate_session_id
+from utils.deadlines import resolve_deadline
 from app_state import manager
 from redis_handlers.producer import send_to_redis
+from utils.tracing import span, start_trace
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+STREAM_FORMATS = ("json", "delta")
+
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
     appid: str = Query(...),
-    token: str = Query(...)
+    token: str = Query(...),
+    stream_format: str = Query("json")
 ):
     """WebSocket endpoint with appid + token authentication"""
     
@@ -22,6 +27,10 @@ async def websocket_endpoint(
         logger.warning(f"Authentication failed for appid: {appid}")
         await websocket.close(code=4001, reason="Invalid credentials")
         return
+
+    if stream_format not in STREAM_FORMATS:
+        await websocket.close(code=4002, reason="Unsupported stream format")
+        return
     
     # Generate session ID for this connection
     session_id = generate_session_id(appid)
@@ -34,7 +43,8 @@ async def websocket_endpoint(
         # Send connection confirmation
         await websocket.send_json({
             "type": "connection_established",
-            "session_id": session_id
+            "session_id": session_id,
+            "stream_format": stream_format
         })
 
         while True:
@@ -63,15 +73,32 @@ async def websocket_endpoint(
                     })
                     continue
 
-                # Add session_id to message
-                data["session_id"] = session_id
-                
-                # Send to Redis for processing
-                await send_to_redis(data)
-                await websocket.send_json({
-                    "type": "message_received",
-                    "message_type": message_type
-                })
+                # The backend sheds judgements still queued or running past their deadline
+                if message_type == "agent_judgement":
+                    try:
+                        deadline = resolve_deadline(appid, data.pop("deadline_ms", None))
+                    except ValueError as e:
+                        await websocket.send_json({
+                            "error": str(e)
+                        })
+                        continue
+                    if deadline is not None:
+                        data["deadline"] = deadline
+
+                with start_trace("gateway.request", type=message_type, session_id=session_id) as request_span:
+                    # Add session_id, the negotiated stream format and the trace context to message
+                    data["session_id"] = session_id
+                    data["stream_format"] = stream_format
+                    if request_span is not None:
+                        data["traceparent"] = request_span.context.traceparent
+                    
+                    # Send to Redis for processing
+                    with span("gateway.redis_publish"):
+                        await send_to_redis(data)
+                    await websocket.send_json({
+                        "type": "message_received",
+                        "message_type": message_type
+                    })
 
             except WebSocketDisconnect:
                 logger.info(f"WebSocket disconnected: {session_id}")
@@ -0,0 +1,24 @@
+import time
+import pytest
+from config import settings
+from utils.deadlines import resolve_deadline
+
+@pytest.fixture
+def appid_defaults(monkeypatch):
+    monkeypatch.setattr(settings, "DEADLINE_DEFAULT_MS", 0)
+    monkeypatch.setattr(settings, "DEADLINE_APPID_DEFAULTS", "slow_app=30000, fast_app=2000")
+
+def test_frame_deadline_is_made_absolute(appid_defaults):
+    now_ms = int(time.time() * 1000)
+    deadline = resolve_deadline("fast_app", 5000)
+    assert now_ms + 5000 <= deadline <= now_ms + 5100
+
+def test_appid_default_deadline(appid_defaults):
+    now_ms = int(time.time() * 1000)
+    assert now_ms + 2000 <= resolve_deadline("fast_app") <= now_ms + 2100
+    assert resolve_deadline("other_app") is None
+
+@pytest.mark.parametrize("deadline_ms", [0, -5, "100", True])
+def test_invalid_deadline_is_rejected(appid_defaults, deadline_ms):
+    with pytest.raises(ValueError):
+        resolve_deadline("fast_app", deadline_ms)
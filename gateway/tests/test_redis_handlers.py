@@ -118,4 +118,28 @@ async def test_redis_consumer_start_consuming(mock_redis, mock_websocket_manager
             "queue_control",
         ],
         timeout=1
-    )
\ No newline at end of file
+    )
+
+@pytest.mark.asyncio
+async def test_redis_consumer_forwards_delta_frames(mock_websocket_manager):
+    """Delta frames are sent to the channel's session without decoding"""
+    mock_websocket_manager.send_text = AsyncMock()
+    consumer = RedisConsumer(mock_websocket_manager)
+    frame = '{"s":2,"q":0,"d":"The code"}'
+
+    await consumer.handle_raw("gateway:responses:test-session", frame)
+
+    mock_websocket_manager.send_text.assert_awaited_once_with("test-session", frame)
+    mock_websocket_manager.send_message.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_redis_consumer_stream_close_uses_channel_session(mock_websocket_manager):
+    """Messages without a session_id are routed by their channel"""
+    consumer = RedisConsumer(mock_websocket_manager)
+
+    await consumer.handle_raw("gateway:responses:test-session", '{"type":"stream_close","s":2,"n":5}')
+
+    mock_websocket_manager.send_message.assert_awaited_once_with(
+        "test-session",
+        {"type": "stream_close", "s": 2, "n": 5, "session_id": "test-session"}
+    )
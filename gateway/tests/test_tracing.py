@@ -0,0 +1,80 @@
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import magi_spans as spans
+import pytest
+from config import settings
+from redis_handlers.consumer import RedisConsumer
+from utils import tracing
+
+TRACEPARENT = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+
+@pytest.fixture
+def exporter(mocker):
+    exporter = MagicMock(service="magi-gateway")
+    mocker.patch.object(spans, "get_exporter", return_value=exporter)
+    return exporter
+
+def exported(exporter):
+    return [call.args[0] for call in exporter.export.call_args_list]
+
+def test_span_format(exporter):
+    tracing.record_span("gateway.send", 100.0, 100.25, TRACEPARENT, type="agent_judgement")
+    span = exported(exporter)[0]
+    assert len(span.pop("span_id")) == 16
+    assert span == {
+        "trace_id": "a" * 32,
+        "parent_id": "b" * 16,
+        "name": "gateway.send",
+        "service": "magi-gateway",
+        "start": 100.0,
+        "duration_ms": 250.0,
+        "attributes": {"type": "agent_judgement"},
+    }
+
+    span["span_id"] = "c" * 16
+    otlp = tracing.to_otlp([span], "magi-gateway")["resourceSpans"][0]
+    assert otlp["resource"]["attributes"][0]["value"]["stringValue"] == "magi-gateway"
+    assert otlp["scopeSpans"][0]["spans"] == [{
+        "traceId": "a" * 32,
+        "spanId": "c" * 16,
+        "parentSpanId": "b" * 16,
+        "name": "gateway.send",
+        "kind": 1,
+        "startTimeUnixNano": "100000000000",
+        "endTimeUnixNano": "100250000000",
+        "attributes": [{"key": "type", "value": {"stringValue": "agent_judgement"}}],
+    }]
+
+def test_start_trace_is_sampled(exporter, monkeypatch):
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0)
+    with tracing.start_trace("gateway.request") as root:
+        assert root is None
+
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1)
+    with tracing.start_trace("gateway.request", type="agent_judgement") as root:
+        assert tracing.current_traceparent() == root.context.traceparent
+        with tracing.span("gateway.redis_publish"):
+            pass
+    assert tracing.current_traceparent() is None
+    publish, request = exported(exporter)
+    assert request["parent_id"] is None
+    assert publish["parent_id"] == request["span_id"]
+    assert publish["trace_id"] == request["trace_id"]
+
+@pytest.mark.asyncio
+async def test_only_final_responses_are_timed(exporter):
+    manager = MagicMock()
+    manager.send_message = AsyncMock()
+    consumer = RedisConsumer(manager)
+    channel = "gateway:responses:test-session"
+
+    await consumer.handle_raw(channel, json.dumps({"type": "agent_judgement", "status": "streaming", "traceparent": TRACEPARENT}))
+    await consumer.handle_raw(channel, json.dumps({"type": "agent_judgement", "status": "completed"}))
+    assert exported(exporter) == []
+
+    await consumer.handle_raw(channel, json.dumps({"type": "agent_judgement", "status": "completed", "traceparent": TRACEPARENT}))
+    send, = exported(exporter)
+    assert send["name"] == "gateway.send"
+    assert send["attributes"] == {"type": "agent_judgement", "status": "completed"}
+    assert manager.send_message.await_count == 3
@@ -0,0 +1,20 @@
+import time
+from typing import Any, Optional
+from config import settings
+
+
+def resolve_deadline(appid: str, deadline_ms: Any = None) -> Optional[int]:
+    """
+    Turn a frame's deadline_ms budget, or the appid default, into an absolute
+    deadline in Unix epoch milliseconds. Returns None when there is no deadline.
+
+    Raises:
+        ValueError: If deadline_ms is not a positive number of milliseconds
+    """
+    if deadline_ms is None:
+        deadline_ms = settings.get_deadline_default_ms(appid)
+        if not deadline_ms:
+            return None
+    elif isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or deadline_ms <= 0:
+        raise ValueError("deadline_ms must be a positive number of milliseconds")
+    return int(time.time() * 1000 + deadline_ms)
@@ -0,0 +1,36 @@
+"""
+Request tracing from the WebSocket endpoint through the backend.
+
+Sampled requests start a trace when the gateway receives them, and its context
+is added to the Redis message as a W3C ``traceparent`` field so backend hops
+record their spans in the same trace. Backend responses that carry the field
+back are timed until they are sent to the client.
+
+Spans are recorded and exported by the magi_spans package, shared with
+the backend. Requests are only traced when TRACE_SAMPLE_RATE is above zero.
+"""
+import random
+import secrets
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import magi_spans as spans
+from magi_spans import (  # noqa: F401
+    TRACEPARENT_FIELD, Span, SpanContext, SpanExporter, current_traceparent, get_exporter, parse_traceparent,
+    record_span, span, start_span, to_otlp,
+)
+
+from config import settings
+
+spans.configure(settings)
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Start a new trace for a sampled request, a no-op for the others."""
+    if spans.get_exporter() is None or random.random() >= settings.TRACE_SAMPLE_RATE:
+        yield None
+        return
+    # A root span has an empty parent id
+    with Span(name, SpanContext(secrets.token_hex(16), ''), **attributes) as root:
+        yield root
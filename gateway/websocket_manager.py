@@ -70,6 +70,16 @@ class ConnectionManager:
                 logger.error(f"Error sending message to {session_id}: {str(e)}")
                 await self.disconnect(session_id)
     
+    async def send_text(self, session_id: str, text: str):
+        """Send an already encoded frame to a specific client"""
+        if session_id in self.active_connections:
+            websocket = self.active_connections[session_id]
+            try:
+                await websocket.send_text(text)
+            except Exception as e:
+                logger.error(f"Error sending message to {session_id}: {str(e)}")
+                await self.disconnect(session_id)
+    
     async def handle_message(self, session_id: str, message: dict):
         """Handle incoming message from client"""
         try:
@@ -0,0 +1,280 @@
+"""
+Spans and their export, shared by the gateway and the backend.
+
+Both service images install this package. Service specific tracing
+(sampling, Celery propagation) lives in each service's utils/tracing.py.
+
+Finished spans are exported from a background thread, as JSON lines to
+TRACE_EXPORT_PATH and/or as OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT. Nothing is
+recorded when neither is set or ``configure()`` was not called.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_FIELD = 'traceparent'
+
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 1.0  # seconds
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Parse a W3C traceparent value, None when missing or malformed."""
+    if not value:
+        return None
+    parts = value.split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return SpanContext(parts[1], parts[2])
+
+
+_current: ContextVar[Optional[SpanContext]] = ContextVar('trace_context', default=None)
+
+
+def current_traceparent() -> Optional[str]:
+    """Traceparent of the active span, to pass on to the next hop."""
+    context = _current.get()
+    return context.traceparent if context is not None else None
+
+
+class SpanExporter:
+    """
+    Export finished spans in batches from a daemon thread, so recording a span
+    never blocks on I/O. The thread is started lazily in each process, which
+    keeps it alive in forked workers.
+    """
+
+    def __init__(self, path: Optional[str] = None, otlp_endpoint: Optional[str] = None, service: str = 'magi'):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint
+        self.service = service
+        self._queue: queue.Queue = queue.Queue(maxsize=100000)
+        self._pid = None
+        self._lock = threading.Lock()
+        # Held while a batch is between the queue and the file, so flush() sees every span
+        self._write_lock = threading.Lock()
+
+    def export(self, span: Dict) -> None:
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            logger.warning("Trace export queue is full, dropping span")
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=100000)
+            threading.Thread(target=self._run, name='trace-exporter', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            with self._write_lock:
+                batch = self._drain(block=True)
+                if batch:
+                    self._write(batch)
+
+    def _drain(self, block: bool) -> List[Dict]:
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=EXPORT_INTERVAL))
+            while len(batch) < EXPORT_BATCH_SIZE:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def flush(self) -> None:
+        """Write out queued spans from the calling thread."""
+        with self._write_lock:
+            batch = self._drain(block=False)
+            while batch:
+                self._write(batch)
+                batch = self._drain(block=False)
+
+    def _write(self, batch: List[Dict]) -> None:
+        if self.path:
+            try:
+                with open(self.path, 'a') as f:
+                    f.writelines(json.dumps(span) + '\n' for span in batch)
+            except OSError as e:
+                logger.error(f"Error writing traces to {self.path}: {str(e)}")
+        if self.otlp_endpoint:
+            try:
+                request = urllib.request.Request(
+                    self.otlp_endpoint,
+                    data=json.dumps(to_otlp(batch, self.service)).encode(),
+                    headers={'Content-Type': 'application/json'}
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+            except Exception as e:
+                logger.error(f"Error exporting traces to {self.otlp_endpoint}: {str(e)}")
+
+
+def to_otlp(spans: List[Dict], service: str) -> Dict:
+    """Encode spans as an OTLP/HTTP JSON ExportTraceServiceRequest."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+            "scopeSpans": [{
+                "scope": {"name": "magi"},
+                "spans": [
+                    {
+                        "traceId": span['trace_id'],
+                        "spanId": span['span_id'],
+                        "parentSpanId": span['parent_id'] or '',
+                        "name": span['name'],
+                        "kind": 1,
+                        "startTimeUnixNano": str(int(span['start'] * 1e9)),
+                        "endTimeUnixNano": str(int((span['start'] + span['duration_ms'] / 1000) * 1e9)),
+                        "attributes": [
+                            {"key": key, "value": {"stringValue": str(value)}}
+                            for key, value in span['attributes'].items()
+                        ]
+                    }
+                    for span in spans
+                ]
+            }]
+        }]
+    }
+
+
+_settings = None
+_exporter: Optional[SpanExporter] = None
+_exporter_loaded = False
+
+
+def configure(settings) -> None:
+    """
+    Set the settings object the exporter is built from on first use. It must
+    provide TRACE_EXPORT_PATH, TRACE_OTLP_ENDPOINT and TRACE_SERVICE_NAME.
+    """
+    global _settings, _exporter, _exporter_loaded
+    _settings = settings
+    _exporter, _exporter_loaded = None, False
+
+
+def get_exporter() -> Optional[SpanExporter]:
+    """The configured exporter, None when tracing export is disabled."""
+    global _exporter, _exporter_loaded
+    if not _exporter_loaded:
+        if _settings is not None and (_settings.TRACE_EXPORT_PATH or _settings.TRACE_OTLP_ENDPOINT):
+            _exporter = SpanExporter(_settings.TRACE_EXPORT_PATH, _settings.TRACE_OTLP_ENDPOINT,
+                                     _settings.TRACE_SERVICE_NAME)
+            atexit.register(_exporter.flush)
+        _exporter_loaded = True
+    return _exporter
+
+
+class Span:
+    """
+    A timed operation of a trace. Use as a context manager, or call
+    ``activate()`` and ``end()`` when the span starts and ends in different
+    callbacks.
+    """
+
+    def __init__(self, name: str, parent: SpanContext, **attributes):
+        self.name = name
+        self.context = SpanContext(parent.trace_id, secrets.token_hex(8))
+        self.parent_id = parent.span_id
+        self.attributes = attributes
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = None
+
+    def activate(self) -> None:
+        """Make this span the parent of spans opened in the current context."""
+        self._token = _current.set(self.context)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        if error is not None:
+            self.attributes['error'] = f"{type(error).__name__}: {error}"
+        export_span(self.name, self.context, self.parent_id, self.start,
+                    (time.perf_counter() - self._started) * 1000, self.attributes)
+
+    def __enter__(self) -> 'Span':
+        self.activate()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end(exc)
+
+
+def start_span(name: str, parent: Union[SpanContext, str, None] = None, **attributes) -> Optional[Span]:
+    """
+    Start a span under ``parent`` (a context or traceparent value), or under
+    the active span. Returns None when the request is not traced.
+    """
+    if isinstance(parent, str):
+        parent = parse_traceparent(parent)
+    parent = parent or _current.get()
+    if parent is None:
+        return None
+    return Span(name, parent, **attributes)
+
+
+@contextmanager
+def span(name: str, parent: Union[SpanContext, str, None] = None, **attributes) -> Iterator[Optional[Span]]:
+    """Context manager form of ``start_span``, a no-op for untraced requests."""
+    current = start_span(name, parent, **attributes)
+    if current is None:
+        yield None
+        return
+    with current:
+        yield current
+
+
+def record_span(name: str, start: float, end: float, parent: Union[SpanContext, str, None] = None,
+                **attributes) -> None:
+    """Record a span measured elsewhere, from epoch timestamps."""
+    if isinstance(parent, str):
+        parent = parse_traceparent(parent)
+    parent = parent or _current.get()
+    if parent is None:
+        return
+    export_span(name, SpanContext(parent.trace_id, secrets.token_hex(8)), parent.span_id, start,
+                max(end - start, 0) * 1000, attributes)
+
+
+def export_span(name: str, context: SpanContext, parent_id: Optional[str], start: float, duration_ms: float,
+                attributes: Dict) -> None:
+    exporter = get_exporter()
+    if exporter is None:
+        return
+    exporter.export({
+        "trace_id": context.trace_id,
+        "span_id": context.span_id,
+        "parent_id": parent_id or None,
+        "name": name,
+        "service": exporter.service,
+        "start": start,
+        "duration_ms": round(duration_ms, 3),
+        "attributes": attributes
+    })